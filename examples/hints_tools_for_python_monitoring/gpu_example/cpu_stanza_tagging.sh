@@ -1,4 +1,4 @@
 #!/bin/bash
 
-python cpu_stanza_tagging.py ./alice-in-wonderland.txt ./output.tsv 50 $1
-python cpu_stanza_tagging.py ./alice-in-wonderland.txt ./output.tsv 300 $1
\ No newline at end of file
+python cpu_stanza_tagging.py ./alice-in-wonderland.txt ./output.tsv 50 $1 --offline
+python cpu_stanza_tagging.py ./alice-in-wonderland.txt ./output.tsv 300 $1 --offline
\ No newline at end of file
@@ -1,38 +1,25 @@
 import argparse
-import logging
-from pathlib import Path
 from resource import getrusage, RUSAGE_SELF
-import sys
 
-import stanza
-
-def file_path(argument_str: str) -> Path:
-    '''
-    :param argument_str: String from a given argument.
-    :returns: Converts argument String to Path type.
-    '''
-    return Path(argument_str).resolve()
+from hec_tagging import download_stanza_models, file_path, get_stdout_logger
 
 if __name__ == '__main__':
     program_description = ('Downloads the stanza tokenizer and NER model to '
-                           'the directory given in the first argument.')
+                           'the directory given in the first argument. Also '
+                           'writes a manifest of the model files so that the '
+                           'tagging scripts can check the models exist without '
+                           'downloading them again.')
     parser = argparse.ArgumentParser(description=program_description)
     parser.add_argument('stanza_model_directory', type=file_path, 
                         help='Directory to store the pre-trained stanza models.')
     args = parser.parse_args()
 
     stanza_processes = 'tokenize,ner'
-    stanza.download("en", dir=str(args.stanza_model_directory), 
-                    processors=stanza_processes)
+    download_stanza_models(args.stanza_model_directory, 'en', stanza_processes)
 
     # logs to stdout
-    logger = logging.getLogger(__name__)
-    logger.setLevel(logging.INFO)
-    stdout_handler = logging.StreamHandler(stream=sys.stdout)
-    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    stdout_handler.setFormatter(formatter)
-    logger.addHandler(stdout_handler)
+    logger = get_stdout_logger(__name__)
 
     # Amount of RAM being used before script. (1024**2) converts it to GB from KB
     ram_memory_end = getrusage(RUSAGE_SELF).ru_maxrss / (1024**2)
-    logger.info(f'Peak RAM memory used {ram_memory_end:.4f}GB')
\ No newline at end of file
+    logger.info(f'Peak RAM memory used {ram_memory_end:.4f}GB')
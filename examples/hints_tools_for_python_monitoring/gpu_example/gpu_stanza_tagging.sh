@@ -1,4 +1,4 @@
 #!/bin/bash
 
-python gpu_stanza_tagging.py ./alice-in-wonderland.txt ./output.tsv 50 $1
-python gpu_stanza_tagging.py ./alice-in-wonderland.txt ./output.tsv 300 $1
\ No newline at end of file
+python gpu_stanza_tagging.py ./alice-in-wonderland.txt ./output.tsv 50 $1 --offline
+python gpu_stanza_tagging.py ./alice-in-wonderland.txt ./output.tsv 300 $1 --offline
\ No newline at end of file
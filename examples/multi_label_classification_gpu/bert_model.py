@@ -156,6 +156,27 @@ def train(model: torch.nn.Module, train_dataloader: DataLoader,
     avg_loss = avg_loss / count
     print(f'Average loss across epoch: {avg_loss}')
 
+def predict(model: torch.nn.Module, dataloader: DataLoader, device: str
+            ) -> Tuple[torch.Tensor, torch.Tensor]:
+    '''
+    :returns: A tuple of length 2. 1. The probability of each label for each 
+              sample, 2. The one hot encoded gold labels of each sample.
+    '''
+    model.eval()
+    probabilities: List[torch.Tensor] = []
+    gold_labels: List[torch.Tensor] = []
+    with torch.no_grad():
+        for data in dataloader:
+            input_ids = data['input_ids'].to(device)
+            attention_mask = data['attention_mask'].to(device)
+            token_type_ids = None
+            if 'token_type_ids' in data:
+                token_type_ids = data['token_type_ids'].to(device)
+            logits = model(input_ids, attention_mask, token_type_ids)
+            probabilities.append(torch.sigmoid(logits).cpu())
+            gold_labels.append(data['labels'])
+    return torch.cat(probabilities), torch.cat(gold_labels)
+
 def resolved_path(fp: str) -> Path:
     return Path(fp).resolve()
 
@@ -175,8 +196,25 @@ if __name__ == '__main__':
                         type=int, default=16)
     parser.add_argument('--transformer-model', help='Name of transformer model to use', 
                         type=str, default='bert-base-uncased')
+    parser.add_argument('--telemetry-interval', help=('Sample the RAM, CPU time, storage I/O, and '
+                                                      'GPU memory (with --cuda) every this many '
+                                                      'seconds, writing the samples to '
+                                                      '{save_fp}.telemetry.jsonl'),
+                        type=float, default=None)
+    parser.add_argument('--quantize', help=('After training, quantize the model to int8 for CPU '
+                                            'inference, compare it to the fp32 model on the test '
+                                            'dataset, and save it to {save_fp} with an .int8 '
+                                            'suffix before the file extension'),
+                        action='store_true')
     args = parser.parse_args()
 
+    sampler = None
+    if args.telemetry_interval is not None:
+        from hec_tagging.telemetry import TelemetrySampler, telemetry_fp
+        sampler = TelemetrySampler(telemetry_fp(args.save_fp), args.telemetry_interval,
+                                   use_gpu=args.cuda)
+        sampler.start()
+
     transformer_model_name = args.transformer_model
     tokenizer = AutoTokenizer.from_pretrained(transformer_model_name, use_fast=True)
     label_mapper, label_binarizer = label_mapper_binarizer(args.label_fp)
@@ -214,3 +252,45 @@ if __name__ == '__main__':
     t = time.time()
     torch.save(transformer_model, args.save_fp)
     print(f'Time to save model: {time.time() - t}')
+
+    if args.quantize:
+        from sklearn.metrics import f1_score
+        from hec_tagging.quantization import model_bytes, quantize_model
+
+        # Dynamic quantization only runs on the CPU, thus both models are
+        # compared on the CPU.
+        transformer_model.to('cpu')
+        t = time.time()
+        fp32_probabilities, gold_labels = predict(transformer_model, test_dataloader, 'cpu')
+        fp32_time = time.time() - t
+        fp32_model_bytes = model_bytes(transformer_model)
+
+        quantized_model = quantize_model(transformer_model.eval())
+        t = time.time()
+        int8_probabilities, _ = predict(quantized_model, test_dataloader, 'cpu')
+        int8_time = time.time() - t
+        int8_model_bytes = model_bytes(quantized_model)
+
+        fp32_predictions = (fp32_probabilities > 0.5).int()
+        int8_predictions = (int8_probabilities > 0.5).int()
+        agreement = (fp32_predictions == int8_predictions).float().mean().item()
+        fp32_f1 = f1_score(gold_labels.int().numpy(), fp32_predictions.numpy(), 
+                           average='micro', zero_division=0)
+        int8_f1 = f1_score(gold_labels.int().numpy(), int8_predictions.numpy(), 
+                           average='micro', zero_division=0)
+        print(f'Label agreement of the int8 and fp32 models on the test dataset: {agreement:.4f}')
+        print(f'Test micro F1, fp32: {fp32_f1:.4f}, int8: {int8_f1:.4f}')
+        print(f'Test time, fp32: {fp32_time:.4f}s, int8: {int8_time:.4f}s, '
+              f'speedup: {fp32_time / int8_time:.2f}x')
+        print(f'Model size, fp32: {fp32_model_bytes / (1024**3):.4f}GB, '
+              f'int8: {int8_model_bytes / (1024**3):.4f}GB')
+
+        quantized_fp = save_fp.with_name(f'{save_fp.stem}.int8{save_fp.suffix}')
+        torch.save(quantized_model, quantized_fp)
+        print(f'Saved the int8 model to: {quantized_fp}')
+
+    if sampler is not None:
+        sampler.stop()
+        print(f'Peak sampled RAM memory used: {sampler.peak_rss:.4f}GB')
+        if args.cuda:
+            print(f'Peak sampled GPU memory used: {sampler.peak_gpu_memory:.4f}GB')
@@ -0,0 +1,161 @@
+import json
+from pathlib import Path
+import time
+from typing import Dict, List, Optional, Tuple
+
+import torch
+from transformers import AutoTokenizer, PreTrainedTokenizerFast
+
+# The model saved by `bert_model.py` was pickled from its `__main__` module,
+# thus the class has to be in this script's `__main__` module to load it.
+from bert_model import TransformerModel, label_mapper_binarizer, resolved_path
+from predict_exported import EXPORT_CONFIG_NAME, TOKENIZER_NAME, ExportedModel
+
+EXPORT_FORMATS = ('torchscript', 'onnx')
+# Name of the model file within an export directory of each format.
+MODEL_NAMES = {'torchscript': 'model.pt', 'onnx': 'model.onnx'}
+
+# Texts of different lengths to compare the exported model to the model with.
+CHECK_TEXTS = ['Thank you so much, this made my day!',
+               'I am not sure what to think about [NAME] leaving the team, it is '
+               'a shame but maybe it is for the best in the long run.',
+               'Wow',
+               'This is the worst thing I have read all week, why would anyone '
+               'think that this is a good idea? I am honestly disappointed and '
+               'a little angry that it got this far without anyone saying no.']
+
+class ProbabilityModel(torch.nn.Module):
+    '''
+    The model without dropout whose output is the probability of each label,
+    thus the exported graph does not need any post processing other than a
+    threshold.
+    '''
+
+    def __init__(self, model: TransformerModel) -> None:
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids: torch.Tensor, attention_mask: torch.Tensor,
+                token_type_ids: Optional[torch.Tensor] = None) -> torch.Tensor:
+        return torch.sigmoid(self.model(input_ids, attention_mask, token_type_ids))
+
+def _model_inputs(tokenizer: PreTrainedTokenizerFast, texts: List[str],
+                  max_length: int, pad_to_max_length: bool
+                  ) -> Tuple[List[str], Tuple[torch.Tensor, ...]]:
+    '''
+    :returns: A tuple of length 2. 1. The names of the model inputs that the
+              tokenizer creates, `token_type_ids` is not created for models
+              like RoBERTa, 2. The model inputs in that order.
+    '''
+    padding = 'max_length' if pad_to_max_length else True
+    tokenized_texts = tokenizer(texts, padding=padding, truncation=True,
+                                max_length=max_length, return_tensors='pt')
+    input_names = [name for name in ('input_ids', 'attention_mask', 'token_type_ids')
+                   if name in tokenized_texts]
+    return input_names, tuple(tokenized_texts[name] for name in input_names)
+
+def export_model(model: TransformerModel, tokenizer: PreTrainedTokenizerFast,
+                 label_mapper: Dict[int, str], export_dir: Path,
+                 export_format: str = 'torchscript', max_length: int = 512) -> Path:
+    '''
+    Writes the model as a TorchScript graph, traced, or an ONNX graph to the
+    export directory, with the tokenizer as a single `tokenizer.json` file
+    of the `tokenizers` library, and a `config.json` file of the labels and
+    how to tokenize the texts, thus the model can be used by
+    `predict_exported.py` without the `transformers` library or this
+    model's Python code.
+
+    :param model: The trained model, on the CPU.
+    :param tokenizer: The fast tokenizer of the model's transformer.
+    :param label_mapper: The label of each label index.
+    :param export_dir: Directory to write the files too, created if it does
+                       not exist.
+    :param export_format: One of `EXPORT_FORMATS`.
+    :param max_length: Maximum number of tokens of a text, longer texts are
+                       truncated.
+    :returns: File path to the exported model.
+    :raises ValueError: If the export format is not known.
+    '''
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f'Unknown export format: {export_format}, the known '
+                         f'formats are: {EXPORT_FORMATS}')
+    export_dir.mkdir(parents=True, exist_ok=True)
+    probability_model = ProbabilityModel(model).eval()
+    # Traced at the maximum length, thus nothing that depends on the number
+    # of tokens is fixed to a length smaller than that of a text.
+    input_names, example_inputs = _model_inputs(tokenizer, CHECK_TEXTS[:2],
+                                                max_length, pad_to_max_length=True)
+    model_fp = Path(export_dir, MODEL_NAMES[export_format])
+    with torch.no_grad():
+        if export_format == 'torchscript':
+            traced_model = torch.jit.trace(probability_model, example_inputs)
+            torch.jit.save(traced_model, str(model_fp))
+        else:
+            dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names}
+            dynamic_axes['probabilities'] = {0: 'batch'}
+            torch.onnx.export(probability_model, example_inputs, str(model_fp),
+                              input_names=input_names, output_names=['probabilities'],
+                              dynamic_axes=dynamic_axes, opset_version=11)
+
+    tokenizer.backend_tokenizer.save(str(Path(export_dir, TOKENIZER_NAME)))
+    export_config = {'format': export_format,
+                     'model_file': model_fp.name,
+                     'input_names': input_names,
+                     'max_length': max_length,
+                     'pad_token': tokenizer.pad_token,
+                     'pad_id': tokenizer.pad_token_id,
+                     'labels': [label_mapper[index] for index in range(len(label_mapper))]}
+    with Path(export_dir, EXPORT_CONFIG_NAME).open('w') as config_file:
+        json.dump(export_config, config_file, indent=2)
+    return model_fp
+
+def check_export(model: TransformerModel, tokenizer: PreTrainedTokenizerFast,
+                 export_dir: Path) -> float:
+    '''
+    :param model: The model that was exported, on the CPU.
+    :param tokenizer: The fast tokenizer of the model's transformer.
+    :param export_dir: Directory the model was exported to.
+    :returns: The largest absolute difference between the label
+              probabilities of the model and the exported model on
+              `CHECK_TEXTS`, padded to the longest of the texts rather than
+              the length the model was traced at.
+    '''
+    exported_model = ExportedModel(export_dir)
+    _, inputs = _model_inputs(tokenizer, CHECK_TEXTS, exported_model.max_length,
+                              pad_to_max_length=False)
+    with torch.no_grad():
+        probabilities = ProbabilityModel(model).eval()(*inputs).numpy()
+    exported_probabilities = exported_model.predict(CHECK_TEXTS)
+    return float(abs(probabilities - exported_probabilities).max())
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description=('Export a model trained by bert_model.py to '
+                                                  'TorchScript or ONNX, for predict_exported.py'))
+    parser.add_argument('model_fp', help='File path to the model saved by bert_model.py',
+                        type=resolved_path)
+    parser.add_argument('label_fp', help='File path to the labels file', type=resolved_path)
+    parser.add_argument('export_dir', help='Directory to export the model too',
+                        type=resolved_path)
+    parser.add_argument('--transformer-model', help=('Name of transformer model that the '
+                                                     'model was trained from'),
+                        type=str, default='bert-base-uncased')
+    parser.add_argument('--export-format', help='Format of the exported model',
+                        choices=EXPORT_FORMATS, default='torchscript')
+    parser.add_argument('--max-length', help='Maximum number of tokens of a text',
+                        type=int, default=512)
+    args = parser.parse_args()
+
+    tokenizer = AutoTokenizer.from_pretrained(args.transformer_model, use_fast=True)
+    label_mapper, _ = label_mapper_binarizer(args.label_fp)
+    transformer_model = torch.load(args.model_fp, map_location='cpu')
+
+    t = time.time()
+    model_fp = export_model(transformer_model, tokenizer, label_mapper, args.export_dir,
+                            args.export_format, args.max_length)
+    print(f'Time to export the model: {time.time() - t}')
+    print(f'Exported the model to: {model_fp}')
+
+    difference = check_export(transformer_model, tokenizer, args.export_dir)
+    print(f'Largest difference between the label probabilities of the model and '
+          f'the exported model: {difference:.6f}')
@@ -0,0 +1,125 @@
+import json
+from pathlib import Path
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from tokenizers import Tokenizer
+
+# Names of the files within an export directory, see `export_model.py`.
+EXPORT_CONFIG_NAME = 'config.json'
+TOKENIZER_NAME = 'tokenizer.json'
+
+class ExportedModel():
+    '''
+    A model exported by `export_model.py` with its tokenizer and labels. Only
+    the `tokenizers` library and PyTorch, for TorchScript, or ONNX Runtime,
+    for ONNX, are imported, thus it loads far quicker than the model saved
+    by `bert_model.py`, which requires the `transformers` library.
+    '''
+
+    def __init__(self, export_dir: Path, number_threads: Optional[int] = None) -> None:
+        '''
+        :param export_dir: Directory the model was exported to.
+        :param number_threads: Number of CPU threads used to run the model,
+                               the default of PyTorch or ONNX Runtime if
+                               None.
+        :raises ValueError: If the format of the exported model is not
+                            known.
+        '''
+        with Path(export_dir, EXPORT_CONFIG_NAME).open('r') as config_file:
+            config: Dict[str, Any] = json.load(config_file)
+        self.export_format: str = config['format']
+        self.input_names: List[str] = config['input_names']
+        self.max_length: int = config['max_length']
+        self.labels: List[str] = config['labels']
+
+        self.tokenizer = Tokenizer.from_file(str(Path(export_dir, TOKENIZER_NAME)))
+        self.tokenizer.enable_truncation(max_length=self.max_length)
+        self.tokenizer.enable_padding(pad_id=config['pad_id'], pad_token=config['pad_token'])
+
+        model_fp = Path(export_dir, config['model_file'])
+        if self.export_format == 'torchscript':
+            import torch
+            if number_threads is not None:
+                torch.set_num_threads(number_threads)
+            self.model = torch.jit.load(str(model_fp), map_location='cpu')
+            self.model.eval()
+        elif self.export_format == 'onnx':
+            import onnxruntime
+            session_options = onnxruntime.SessionOptions()
+            if number_threads is not None:
+                session_options.intra_op_num_threads = number_threads
+            self.model = onnxruntime.InferenceSession(str(model_fp), session_options)
+        else:
+            raise ValueError(f'Unknown export format: {self.export_format}')
+
+    def _encode(self, texts: List[str]) -> Dict[str, np.ndarray]:
+        encodings = self.tokenizer.encode_batch(texts)
+        inputs = {'input_ids': [encoding.ids for encoding in encodings],
+                  'attention_mask': [encoding.attention_mask for encoding in encodings],
+                  'token_type_ids': [encoding.type_ids for encoding in encodings]}
+        return {name: np.array(inputs[name], dtype=np.int64) for name in self.input_names}
+
+    def predict(self, texts: List[str]) -> np.ndarray:
+        '''
+        :param texts: A batch of texts.
+        :returns: The probability of each label, in the order of `labels`,
+                  for each text, shape (number of texts, number of labels).
+        '''
+        inputs = self._encode(texts)
+        if self.export_format == 'onnx':
+            return self.model.run(None, inputs)[0]
+        import torch
+        # `inference_mode` is quicker than `no_grad` but requires PyTorch 1.9.
+        with getattr(torch, 'inference_mode', torch.no_grad)():
+            probabilities = self.model(*(torch.from_numpy(inputs[name])
+                                         for name in self.input_names))
+        return probabilities.numpy()
+
+    def predict_labels(self, texts: List[str], threshold: float = 0.5) -> List[List[str]]:
+        '''
+        :param texts: A batch of texts.
+        :param threshold: The probability above which a label is predicted.
+        :returns: The labels predicted for each text.
+        '''
+        return [[self.labels[index] for index in np.flatnonzero(text_probabilities > threshold)]
+                for text_probabilities in self.predict(texts)]
+
+def resolved_path(fp: str) -> Path:
+    return Path(fp).resolve()
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description=('Predict the labels of each line of a text '
+                                                  'file with a model exported by export_model.py, '
+                                                  'writing a TSV file with the columns: '
+                                                  '{line number}\t{comma separated labels}'))
+    parser.add_argument('export_dir', help='Directory the model was exported to',
+                        type=resolved_path)
+    parser.add_argument('text_fp', help='File path to the texts, one text per line',
+                        type=resolved_path)
+    parser.add_argument('output_fp', help='File path to write the predicted labels too',
+                        type=resolved_path)
+    parser.add_argument('--batch-size', help='Batch size', type=int, default=32)
+    parser.add_argument('--threshold', help='Probability above which a label is predicted',
+                        type=float, default=0.5)
+    parser.add_argument('--threads', help='Number of CPU threads used to run the model',
+                        type=int, default=None)
+    args = parser.parse_args()
+
+    t = time.time()
+    exported_model = ExportedModel(args.export_dir, args.threads)
+    print(f'Time to load the model: {time.time() - t}')
+
+    with args.text_fp.open('r') as text_file:
+        texts = [line.strip() for line in text_file]
+
+    t = time.time()
+    with args.output_fp.open('w') as output_file:
+        for batch_start in range(0, len(texts), args.batch_size):
+            batch = texts[batch_start:batch_start + args.batch_size]
+            batch_labels = exported_model.predict_labels(batch, args.threshold)
+            for line_number, labels in enumerate(batch_labels, batch_start):
+                output_file.write(f'{line_number}\t{",".join(labels)}\n')
+    print(f'Time to predict the labels of {len(texts)} texts: {time.time() - t}')
@@ -0,0 +1,296 @@
+import csv
+from itertools import islice
+from pathlib import Path
+from resource import getrusage, RUSAGE_SELF
+import sys
+import time
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import torch
+
+from predict_exported import ExportedModel, resolved_path
+
+OUTPUT_FORMATS = ('parquet', 'tsv')
+
+class SavedModel():
+    '''
+    A model saved by `bert_model.py`, which requires the `transformers`
+    library, with the same `labels` and `predict` as
+    `predict_exported.ExportedModel`.
+    '''
+
+    def __init__(self, model_fp: Path, label_fp: Path, transformer_name: str,
+                 device: str = 'cpu', max_length: int = 512) -> None:
+        '''
+        :param model_fp: File path to the model saved by `bert_model.py`.
+        :param label_fp: File path to the labels file.
+        :param transformer_name: Name of transformer model that the model
+                                 was trained from, for its tokenizer.
+        :param device: Device to run the model on, e.g. `cuda`.
+        :param max_length: Maximum number of tokens of a text, longer texts
+                           are truncated.
+        '''
+        from transformers import AutoTokenizer
+        from bert_model import TransformerModel, label_mapper_binarizer
+
+        # The model was pickled from the `__main__` module of `bert_model.py`.
+        setattr(sys.modules['__main__'], 'TransformerModel', TransformerModel)
+        self.model = torch.load(model_fp, map_location=device)
+        self.model.eval()
+        self.device = device
+        self.max_length = max_length
+        self.tokenizer = AutoTokenizer.from_pretrained(transformer_name, use_fast=True)
+        label_mapper, _ = label_mapper_binarizer(label_fp)
+        self.labels = [label_mapper[index] for index in range(len(label_mapper))]
+
+    def predict(self, texts: List[str]) -> np.ndarray:
+        '''
+        :param texts: A batch of texts.
+        :returns: The probability of each label, in the order of `labels`,
+                  for each text, shape (number of texts, number of labels).
+        '''
+        tokenized_texts = self.tokenizer(texts, padding=True, truncation=True,
+                                         max_length=self.max_length, return_tensors='pt')
+        input_ids = tokenized_texts['input_ids'].to(self.device)
+        attention_mask = tokenized_texts['attention_mask'].to(self.device)
+        token_type_ids = None
+        if 'token_type_ids' in tokenized_texts:
+            token_type_ids = tokenized_texts['token_type_ids'].to(self.device)
+        # `inference_mode` is quicker than `no_grad` but requires PyTorch 1.9.
+        with getattr(torch, 'inference_mode', torch.no_grad)():
+            logits = self.model(input_ids, attention_mask, token_type_ids)
+            probabilities = torch.sigmoid(logits).float().cpu()
+        return probabilities.numpy()
+
+def yield_texts(input_fp: Path) -> Iterator[Tuple[str, str]]:
+    '''
+    :param input_fp: File path to a TSV file of the GoEmotions data, a
+                     `.tsv` file whose first column is the text and third
+                     column, if it has one, is the ID of the text, else a text
+                     file of one text per line.
+    :returns: The ID and text of each text, read one line at a time. The ID
+              is the line number, from 0, when the file does not have IDs.
+    '''
+    with input_fp.open('r', newline='') as input_file:
+        if input_fp.suffix == '.tsv':
+            for line_number, line in enumerate(csv.reader(input_file, delimiter='\t')):
+                _id = line[2].strip() if len(line) > 2 else str(line_number)
+                yield _id, line[0].strip()
+        else:
+            for line_number, text in enumerate(input_file):
+                yield str(line_number), text.strip()
+
+def predict_sorted(model: Any, texts: Iterable[Tuple[str, str]], batch_size: int,
+                   sort_batches: int = 100) -> Iterator[Tuple[List[str], np.ndarray]]:
+    '''
+    Predicts the label probabilities of the texts `batch_size * sort_batches`
+    texts at a time. Each of those windows of texts is sorted by length
+    before being split into batches, thus the texts in a batch are of a
+    similar length and little of the batch is padding, and then put back in
+    the order they were in.
+
+    :param model: A `SavedModel` or `predict_exported.ExportedModel`.
+    :param texts: The ID and text of each text, see `yield_texts`.
+    :param batch_size: Number of texts given to the model at a time.
+    :param sort_batches: Number of batches in a window of sorted texts.
+    :returns: The IDs and the label probabilities of each window of texts,
+              in the order they were given.
+    '''
+    text_iterator = iter(texts)
+    while True:
+        window = list(islice(text_iterator, batch_size * sort_batches))
+        if not window:
+            return
+        # Number of characters is used as the length, which orders the texts
+        # close to their number of tokens without tokenizing them twice.
+        window_order = sorted(range(len(window)), key=lambda index: len(window[index][1]))
+        probabilities = np.empty((len(window), len(model.labels)), dtype=np.float32)
+        for batch_start in range(0, len(window_order), batch_size):
+            batch_indexes = window_order[batch_start:batch_start + batch_size]
+            probabilities[batch_indexes] = model.predict([window[index][1]
+                                                          for index in batch_indexes])
+        yield [_id for _id, _ in window], probabilities
+
+class PredictionWriter():
+    '''
+    Writes either the probability of each label for each text, one column
+    per label, or the labels whose probability is above a threshold, one
+    column of comma separated labels, when `threshold` is not None.
+    '''
+
+    def __init__(self, output_fp: Path, labels: List[str],
+                 threshold: Optional[float] = None) -> None:
+        '''
+        :param output_fp: File path to write the predictions too.
+        :param labels: The label of each label index.
+        :param threshold: The probability above which a label is predicted,
+                          the probabilities are written if None.
+        '''
+        self.output_fp = output_fp
+        self.labels = labels
+        self.threshold = threshold
+
+    def _thresholded_labels(self, probabilities: np.ndarray) -> List[List[str]]:
+        return [[self.labels[index]
+                 for index in np.flatnonzero(text_probabilities > self.threshold)]
+                for text_probabilities in probabilities]
+
+    def write(self, ids: List[str], probabilities: np.ndarray) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        raise NotImplementedError
+
+    def __enter__(self) -> 'PredictionWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+class TSVPredictionWriter(PredictionWriter):
+    '''
+    Writes a TSV file with a header, of the columns `id` and then either a
+    column of the probabilities of each label or a `labels` column.
+    '''
+
+    def __init__(self, output_fp: Path, labels: List[str],
+                 threshold: Optional[float] = None) -> None:
+        super().__init__(output_fp, labels, threshold)
+        self._output_file = output_fp.open('w', newline='')
+        self._tsv_writer = csv.writer(self._output_file, delimiter='\t')
+        header = ['id', 'labels'] if threshold is not None else ['id', *labels]
+        self._tsv_writer.writerow(header)
+
+    def write(self, ids: List[str], probabilities: np.ndarray) -> None:
+        if self.threshold is not None:
+            rows = zip(ids, (','.join(labels)
+                             for labels in self._thresholded_labels(probabilities)))
+            self._tsv_writer.writerows(rows)
+            return
+        self._tsv_writer.writerows([_id, *(f'{probability:.4f}'
+                                           for probability in text_probabilities)]
+                                   for _id, text_probabilities in zip(ids, probabilities))
+
+    def close(self) -> None:
+        self._output_file.close()
+
+class ParquetPredictionWriter(PredictionWriter):
+    '''
+    Writes a Parquet file, requires `pyarrow`, of the columns `id` and then
+    either a float32 column of the probabilities of each label or a `labels`
+    column of the list of labels of each text. Each call to `write` is a
+    row group.
+    '''
+
+    def __init__(self, output_fp: Path, labels: List[str],
+                 threshold: Optional[float] = None) -> None:
+        super().__init__(output_fp, labels, threshold)
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._pa = pa
+        fields = [('id', pa.string())]
+        if threshold is not None:
+            fields.append(('labels', pa.list_(pa.string())))
+        else:
+            fields.extend((label, pa.float32()) for label in labels)
+        self.schema = pa.schema(fields)
+        self._parquet_writer = pq.ParquetWriter(str(output_fp), self.schema)
+
+    def write(self, ids: List[str], probabilities: np.ndarray) -> None:
+        pa = self._pa
+        arrays = [pa.array(ids, pa.string())]
+        if self.threshold is not None:
+            arrays.append(pa.array(self._thresholded_labels(probabilities),
+                                   pa.list_(pa.string())))
+        else:
+            arrays.extend(pa.array(np.ascontiguousarray(probabilities[:, index]), pa.float32())
+                          for index in range(len(self.labels)))
+        self._parquet_writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self) -> None:
+        self._parquet_writer.close()
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description=('Predict the labels of a TSV file of the '
+                                                  'GoEmotions data, or a text file of one text '
+                                                  'per line, with a model saved by bert_model.py '
+                                                  'or exported by export_model.py'))
+    parser.add_argument('model_fp', help=('File path to the model saved by bert_model.py, or '
+                                          'the directory exported by export_model.py'),
+                        type=resolved_path)
+    parser.add_argument('input_fp', help=('File path to the texts, a .tsv file of the '
+                                          'GoEmotions data or a text file of one text per line'),
+                        type=resolved_path)
+    parser.add_argument('output_fp', help='File path to write the predictions too',
+                        type=resolved_path)
+    parser.add_argument('--label-fp', help=('File path to the labels file, required for a '
+                                            'model saved by bert_model.py'),
+                        type=resolved_path, default=None)
+    parser.add_argument('--transformer-model', help=('Name of transformer model that the '
+                                                     'model saved by bert_model.py was '
+                                                     'trained from'),
+                        type=str, default='bert-base-uncased')
+    parser.add_argument('--cuda', help='Whether or not to use CUDA GPU device, saved models only',
+                        action='store_true')
+    parser.add_argument('--batch-size', help='Batch size', type=int, default=32)
+    parser.add_argument('--sort-batches', help=('Number of batches of texts that are sorted by '
+                                                'length at a time'),
+                        type=int, default=100)
+    parser.add_argument('--threshold', help=('Write the labels whose probability is above this '
+                                             'threshold rather than the probability of each '
+                                             'label'),
+                        type=float, default=None)
+    parser.add_argument('--output-format', help='Format of the output file',
+                        choices=OUTPUT_FORMATS, default='parquet')
+    parser.add_argument('--telemetry-interval', help=('Sample the RAM, CPU time, storage I/O, and '
+                                                      'GPU memory (with --cuda) every this many '
+                                                      'seconds, writing the samples to '
+                                                      '{output_fp}.telemetry.jsonl'),
+                        type=float, default=None)
+    args = parser.parse_args()
+
+    sampler = None
+    if args.telemetry_interval is not None:
+        from hec_tagging.telemetry import TelemetrySampler, telemetry_fp
+        sampler = TelemetrySampler(telemetry_fp(args.output_fp), args.telemetry_interval,
+                                   use_gpu=args.cuda)
+        sampler.start()
+
+    t = time.time()
+    model: Any
+    if args.model_fp.is_dir():
+        model = ExportedModel(args.model_fp)
+    else:
+        if args.label_fp is None:
+            parser.error('--label-fp is required for a model saved by bert_model.py')
+        model = SavedModel(args.model_fp, args.label_fp, args.transformer_model,
+                           'cuda' if args.cuda else 'cpu')
+    print(f'Time to load the model: {time.time() - t}')
+
+    writer_class = ParquetPredictionWriter
+    if args.output_format == 'tsv':
+        writer_class = TSVPredictionWriter
+    number_texts = 0
+    t = time.time()
+    with writer_class(args.output_fp, model.labels, args.threshold) as writer:
+        for ids, probabilities in predict_sorted(model, yield_texts(args.input_fp),
+                                                 args.batch_size, args.sort_batches):
+            writer.write(ids, probabilities)
+            number_texts += len(ids)
+    prediction_time = time.time() - t
+
+    print(f'Time to predict {number_texts} texts: {prediction_time:.4f}s')
+    if prediction_time:
+        print(f'Throughput: {number_texts / prediction_time:.2f} texts/s')
+    # (1024**2) converts it to GB from KB
+    print(f'Peak RAM memory used: {getrusage(RUSAGE_SELF).ru_maxrss / (1024**2):.4f}GB')
+    if args.cuda:
+        print(f'Peak GPU memory used: {torch.cuda.max_memory_allocated() / (1024**3):.4f}GB')
+    if sampler is not None:
+        sampler.stop()
+        print(f'Peak sampled RAM memory used: {sampler.peak_rss:.4f}GB')
+        if args.cuda:
+            print(f'Peak sampled GPU memory used: {sampler.peak_gpu_memory:.4f}GB')
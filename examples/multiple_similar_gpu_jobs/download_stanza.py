@@ -1,23 +1,17 @@
 import argparse
-from pathlib import Path
 
-import stanza
-
-def file_path(argument_str: str) -> Path:
-    '''
-    :param argument_str: String from a given argument.
-    :returns: Converts argument String to Path type.
-    '''
-    return Path(argument_str).resolve()
+from hec_tagging import download_stanza_models, file_path
 
 if __name__ == '__main__':
     program_description = ('Downloads the stanza tokenizer and NER model to '
-                           'the directory given in the first argument.')
+                           'the directory given in the first argument. Also '
+                           'writes a manifest of the model files so that the '
+                           'tagging script can check the models exist without '
+                           'downloading them again.')
     parser = argparse.ArgumentParser(description=program_description)
     parser.add_argument('stanza_model_directory', type=file_path, 
                         help='Directory to store the pre-trained stanza models.')
     args = parser.parse_args()
 
     stanza_processes = 'tokenize,ner'
-    stanza.download("en", dir=str(args.stanza_model_directory), 
-                    processors=stanza_processes)
\ No newline at end of file
+    download_stanza_models(args.stanza_model_directory, 'en', stanza_processes)
@@ -0,0 +1,9 @@
+from hec_tagging.cli import estimate_main
+
+if __name__ == '__main__':
+    program_description = ('Tags a sample of the paragraphs in the given text '
+                           'files (1st argument) using Stanza English NER '
+                           'model and prints the SGE memory (h_vmem) and run '
+                           'time (h_rt) directives for a job that tags all of '
+                           'the text files.')
+    estimate_main('stanza', program_description)
@@ -0,0 +1,8 @@
+from hec_tagging.cli import serve_main
+
+if __name__ == '__main__':
+    program_description = ('Loads the SpaCy small English NER model once and '
+                           'tags the paragraphs sent to the given Unix socket '
+                           '(1st argument) by tagging.py run with the --server '
+                           'argument, until it is stopped e.g. by Ctrl-C.')
+    serve_main('spacy', program_description)
@@ -0,0 +1,45 @@
+from .archives import (TAR_SUFFIXES, TextStat, archive_members, close_archives,
+                       is_tar_archive, list_members, member_fp, open_member,
+                       split_member_fp, text_checksum, text_stat)
+from .backends import (Entity, TaggingBackend, SpacyBackend, StanzaBackend,
+                       BACKENDS, create_backend)
+from .cache import CachedBackend, ParagraphCache
+from .checkpoint import (Checkpoint, Checkpointer, checkpoint_fp,
+                         read_checkpoint, write_checkpoint)
+from .compression import (COMPRESSIONS, COMPRESSION_SUFFIXES, decompress_stream,
+                          detect_compression, open_compressed,
+                          strip_compression_suffix)
+from .engine import (TaggedBatch, TaggingStatistics, approximate_tokens,
+                     batch_paragraphs, length_bucketed_batches, plan_batches,
+                     tag_batches, tag_file, tag_files, write_tagged_batch)
+from .estimate import (CorpusProfile, LinearFit, ResourceEstimate,
+                       estimate_resources, fit_line, format_sge_time,
+                       profile_corpus, sge_resource_directives)
+from .files import (FilePair, TextPart, read_manifest, write_manifest,
+                    directory_file_pairs, glob_file_pairs, resolve_file_pairs)
+from .incremental import (TaggingRecord, is_up_to_date, partition_file_pairs,
+                          read_tagging_record, tagging_record_fp,
+                          write_tagging_record)
+from .metrics import LatencyHistogram, format_percentiles
+from .models import (download_stanza_models, resolve_stanza_models,
+                     verify_model_manifest, write_model_manifest)
+from .parallel import TaggingPool
+from .progress import ProgressReporter, format_duration
+from .quantization import (QUANTIZABLE_LAYERS, QuantizationReport,
+                           check_quantization, entity_agreement,
+                           format_quantization_report, model_bytes,
+                           pipeline_model_bytes, quantize_model,
+                           quantize_pipeline)
+from .reader import (ParagraphIndex, ParagraphOffsets, yield_paragraphs,
+                     yield_paragraph_offsets)
+from .server import (RemoteBackend, TaggingServer, receive_message,
+                     send_message)
+from .splitting import SplittingBackend, split_paragraph
+from .telemetry import TelemetrySampler, read_telemetry, telemetry_fp
+from .tuning import (BatchSizeMeasurement, PeakMemory, candidate_batch_sizes,
+                     measure_batch_sizes, sample_paragraphs, tune_batch_size)
+from .utils import file_path, available_cpus, bytes_to_GB, get_stdout_logger
+from .work_queue import WorkQueue
+from .writers import (BackgroundWriter, Bz2TSVWriter, CompressedTSVWriter,
+                      EntityWriter, GzipTSVWriter, ParquetWriter, TSVWriter,
+                      WRITERS, XzTSVWriter, ZstdTSVWriter, create_writer)
@@ -0,0 +1,213 @@
+from contextlib import contextmanager
+import hashlib
+from pathlib import Path, PurePosixPath
+import tarfile
+import threading
+from typing import BinaryIO, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from .models import file_checksum
+
+# File extensions of the tar archives whose members are tagged as separate
+# text files, uncompressed or compressed by gzip, bz2, or xz.
+TAR_SUFFIXES = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+
+class TextStat(NamedTuple):
+    '''
+    The size in bytes and modified time, in seconds and in nanoseconds, of a
+    text file, or of a member of a tar archive, whose modified time is that
+    of the archive.
+    '''
+    size: int
+    mtime: float
+    mtime_ns: int
+
+def is_tar_archive(fp: Path) -> bool:
+    '''
+    :param fp: A file path.
+    :returns: Whether the file path has the file extension of a tar archive,
+              see `TAR_SUFFIXES`.
+    '''
+    return fp.name.lower().endswith(TAR_SUFFIXES)
+
+def archive_stem(fp: Path) -> str:
+    '''
+    :param fp: File path to a tar archive.
+    :returns: The name of the archive without its file extension, e.g.
+              `books` for `books.tar.gz`.
+    '''
+    name = fp.name
+    for suffix in sorted(TAR_SUFFIXES, key=len, reverse=True):
+        if name.lower().endswith(suffix):
+            return name[:-len(suffix)]
+    return name
+
+def member_fp(archive_fp: Path, member: str) -> Path:
+    '''
+    :param archive_fp: File path to a tar archive.
+    :param member: Name of a member of the archive.
+    :returns: The file path that refers to the member, the archive's file
+              path followed by the member's name, e.g.
+              `books.tar.gz/austen/0.txt`, see `split_member_fp`.
+    '''
+    return Path(archive_fp, *PurePosixPath(member).parts)
+
+def split_member_fp(fp: Path) -> Tuple[Path, Optional[str]]:
+    '''
+    :param fp: File path to a text file, or to a member of a tar archive,
+               see `member_fp`.
+    :returns: The file path to the tar archive and the member's name, or the
+              file path and None if it is not a member of a tar archive.
+    '''
+    if fp.exists():
+        return fp, None
+    for parent in fp.parents:
+        if parent.is_file():
+            if is_tar_archive(parent):
+                return parent, fp.relative_to(parent).as_posix()
+            break
+    return fp, None
+
+class _OpenArchive():
+    '''
+    A tar archive kept open with its regular files by name, thus the members
+    are listed once and the members of a compressed archive read in archive
+    order are decompressed in one pass.
+    '''
+
+    def __init__(self, archive_fp: Path, mtime: float) -> None:
+        self.archive_fp = archive_fp
+        self.mtime = mtime
+        self.archive = tarfile.open(str(archive_fp), 'r:*')
+        self.members = {member.name: member for member in self.archive.getmembers()
+                        if member.isfile()}
+        # Whether a member is being read, which moves the archive's position.
+        self.reading = False
+
+# Only the archive most recently used is kept open, the lock guards it as the
+# archives are read from the tagging thread and looked at from other threads.
+_ARCHIVE_LOCK = threading.Lock()
+_OPEN_ARCHIVE: Optional[_OpenArchive] = None
+
+def _open_archive(archive_fp: Path) -> _OpenArchive:
+    '''
+    Should be called holding `_ARCHIVE_LOCK`. The archive it replaces is
+    closed, or if a member of it is being read, closed once it has been read.
+    '''
+    global _OPEN_ARCHIVE
+    mtime = archive_fp.stat().st_mtime
+    if _OPEN_ARCHIVE is not None:
+        if _OPEN_ARCHIVE.archive_fp == archive_fp and _OPEN_ARCHIVE.mtime == mtime:
+            return _OPEN_ARCHIVE
+        if not _OPEN_ARCHIVE.reading:
+            _OPEN_ARCHIVE.archive.close()
+        _OPEN_ARCHIVE = None
+    _OPEN_ARCHIVE = _OpenArchive(archive_fp, mtime)
+    return _OPEN_ARCHIVE
+
+def close_archives() -> None:
+    '''
+    Closes the tar archive kept open by reading from it, see `open_member`,
+    e.g. once all of the text files have been tagged. It is opened again if
+    it is read from after.
+    '''
+    global _OPEN_ARCHIVE
+    with _ARCHIVE_LOCK:
+        if _OPEN_ARCHIVE is not None and not _OPEN_ARCHIVE.reading:
+            _OPEN_ARCHIVE.archive.close()
+        _OPEN_ARCHIVE = None
+
+def archive_members(archive_fp: Path) -> Dict[str, tarfile.TarInfo]:
+    '''
+    :param archive_fp: File path to a tar archive.
+    :returns: The regular files in the archive by name, in the order they
+              are in the archive. Listing the members of a compressed
+              archive decompresses all of it, thus the members of the
+              archive most recently used are kept until it is modified or
+              another archive is used.
+    '''
+    with _ARCHIVE_LOCK:
+        return _open_archive(archive_fp).members
+
+def list_members(archive_fp: Path, pattern: str = '*') -> List[str]:
+    '''
+    :param archive_fp: File path to a tar archive.
+    :param pattern: Glob pattern that the names of the members match, e.g.
+                    `*.txt`, matched from the right, see
+                    `pathlib.PurePath.match`.
+    :returns: The names of the regular files in the archive that match the
+              pattern, in the order they are in the archive.
+    '''
+    return [name for name in archive_members(archive_fp)
+            if PurePosixPath(name).match(pattern)]
+
+@contextmanager
+def open_member(archive_fp: Path, member: str) -> Iterator[BinaryIO]:
+    '''
+    :param archive_fp: File path to a tar archive.
+    :param member: Name of a regular file in the archive.
+    :returns: A binary stream of the member, read from the archive without
+              extracting it.
+    :raises FileNotFoundError: If the archive does not contain the member.
+    '''
+    with _ARCHIVE_LOCK:
+        open_archive = _open_archive(archive_fp)
+        if member not in open_archive.members:
+            raise FileNotFoundError(f'The archive {archive_fp} does not contain: '
+                                    f'{member}')
+        # Another thread reading a member of the archive has its position,
+        # thus this member is read through the archive opened again.
+        shared = not open_archive.reading
+        if shared:
+            open_archive.reading = True
+        archive = (open_archive.archive if shared
+                   else tarfile.open(str(archive_fp), 'r:*'))
+    try:
+        member_file = archive.extractfile(open_archive.members[member])
+        assert member_file is not None
+        try:
+            yield member_file  # type: ignore[misc]
+        finally:
+            member_file.close()
+    finally:
+        with _ARCHIVE_LOCK:
+            if shared:
+                open_archive.reading = False
+                # Replaced while the member was read.
+                if open_archive is not _OPEN_ARCHIVE:
+                    archive.close()
+            else:
+                archive.close()
+
+def text_stat(text_fp: Path) -> TextStat:
+    '''
+    :param text_fp: File path to a text file, or to a member of a tar
+                    archive, see `member_fp`.
+    :returns: The size and modified time of the text file.
+    :raises FileNotFoundError: If the text file does not exist.
+    '''
+    archive_fp, member = split_member_fp(text_fp)
+    if member is None:
+        stat = text_fp.stat()
+        return TextStat(stat.st_size, stat.st_mtime, stat.st_mtime_ns)
+    members = archive_members(archive_fp)
+    if member not in members:
+        raise FileNotFoundError(f'The archive {archive_fp} does not contain: {member}')
+    archive_stat = archive_fp.stat()
+    return TextStat(members[member].size, archive_stat.st_mtime,
+                    archive_stat.st_mtime_ns)
+
+def text_checksum(text_fp: Path, chunk_size: int = 1024**2) -> str:
+    '''
+    :param text_fp: File path to a text file, or to a member of a tar
+                    archive, see `member_fp`.
+    :param chunk_size: Number of bytes read at a time.
+    :returns: The SHA-256 checksum of the text file.
+    '''
+    archive_fp, member = split_member_fp(text_fp)
+    if member is None:
+        return file_checksum(text_fp, chunk_size)
+    checksum = hashlib.sha256()
+    with open_member(archive_fp, member) as member_file:
+        for chunk in iter(lambda: member_file.read(chunk_size), b''):
+            checksum.update(chunk)
+    return checksum.hexdigest()
@@ -0,0 +1,228 @@
+import hashlib
+import inspect
+import json
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Type
+
+class Entity(NamedTuple):
+    '''
+    A Named Entity found within a paragraph, the character offsets are
+    relative to the start of the paragraph.
+    '''
+    text: str
+    label: str
+    start_char: int
+    end_char: int
+
+class TaggingBackend():
+    '''
+    Base class of all NER tagging backends. A backend only stores it's
+    settings when created, the model is loaded through `load`, this allows a
+    backend to be created in one process and the model loaded in another.
+    '''
+
+    name = ''
+
+    def __init__(self, batch_size: int, use_gpu: bool = False) -> None:
+        '''
+        :param batch_size: Number of paragraphs of text for the model to
+                           process at a time.
+        :param use_gpu: Whether to run the model on a GPU.
+        '''
+        self.batch_size = batch_size
+        self.use_gpu = use_gpu
+        self.nlp: Optional[Any] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self.nlp is not None
+
+    def load(self) -> None:
+        '''
+        Loads the model, required before calling `tag_batch`.
+        '''
+        raise NotImplementedError
+
+    def tag_batch(self, paragraphs: List[str]) -> List[List[Entity]]:
+        '''
+        :param paragraphs: A batch of paragraphs to tag.
+        :returns: For each paragraph, in the same order as given, a list of
+                  the Named Entities found in that paragraph.
+        '''
+        raise NotImplementedError
+
+    def model_identity(self) -> str:
+        '''
+        :returns: Identifies the model and the settings that change the Named
+                  Entities found, thus backends with the same identity tag a
+                  paragraph the same way. The batch size and whether a GPU is
+                  used are not included. May load the model.
+        '''
+        return self.name
+
+class SpacyBackend(TaggingBackend):
+    '''
+    Tags paragraphs using a SpaCy NER model through `nlp.pipe`.
+    '''
+
+    name = 'spacy'
+
+    def __init__(self, batch_size: int, use_gpu: bool = False,
+                 model_name: str = 'en_core_web_sm',
+                 disable: Sequence[str] = ('tagger', 'parser')) -> None:
+        '''
+        :param model_name: Name of the SpaCy model to load.
+        :param disable: SpaCy pipeline components to disable, by default
+                        only the NER component is required.
+        '''
+        super().__init__(batch_size, use_gpu)
+        self.model_name = model_name
+        self.disable = list(disable)
+
+    def load(self) -> None:
+        import spacy
+
+        if self.use_gpu:
+            spacy.require_gpu()
+        self.nlp = spacy.load(self.model_name, disable=self.disable)
+
+    def tag_batch(self, paragraphs: List[str]) -> List[List[Entity]]:
+        if not self.loaded:
+            self.load()
+        batch_entities: List[List[Entity]] = []
+        for spacy_doc in self.nlp.pipe(paragraphs, batch_size=self.batch_size):
+            batch_entities.append([Entity(entity.text, entity.label_,
+                                          entity.start_char, entity.end_char)
+                                   for entity in spacy_doc.ents])
+        return batch_entities
+
+    def model_identity(self) -> str:
+        import spacy
+
+        if not self.loaded:
+            self.load()
+        return (f'{self.name}:{spacy.__version__}:{self.nlp.meta["name"]}:'
+                f'{self.nlp.meta["version"]}:disable={",".join(sorted(self.disable))}')
+
+class StanzaBackend(TaggingBackend):
+    '''
+    Tags paragraphs using a Stanza NER model through `stanza_batch.batch`.
+    '''
+
+    name = 'stanza'
+
+    def __init__(self, batch_size: int, model_directory: Path,
+                 use_gpu: bool = False, lang: str = 'en',
+                 processors: str = 'tokenize,ner', offline: bool = False,
+                 quantize: bool = False) -> None:
+        '''
+        :param model_directory: Directory to store the pre-trained stanza
+                                models.
+        :param lang: Language of the Stanza models.
+        :param processors: Comma separated Stanza processors to load.
+        :param offline: Never download the models, see
+                        `hec_tagging.models.resolve_stanza_models`.
+        :param quantize: Quantize the LSTM layers of the NER models to int8
+                         when they are loaded, faster and smaller on the CPU,
+                         see `hec_tagging.quantization.quantize_pipeline`.
+        :raises ValueError: If `quantize` and `use_gpu` are both True, the
+                            quantized models only run on the CPU.
+        '''
+        if quantize and use_gpu:
+            raise ValueError('Quantized models only run on the CPU, they '
+                             'cannot be used with a GPU')
+        super().__init__(batch_size, use_gpu)
+        self.model_directory = model_directory
+        self.lang = lang
+        self.processors = processors
+        self.offline = offline
+        self.quantize = quantize
+
+    @property
+    def batch_size(self) -> int:  # type: ignore[override]
+        return self._batch_size
+
+    @batch_size.setter
+    def batch_size(self, batch_size: int) -> None:
+        self._batch_size = batch_size
+        # The tokenizer's and NER model's batch sizes are set when the
+        # pipeline is created, thus a loaded pipeline is changed too, e.g.
+        # when tuning the batch size.
+        nlp = getattr(self, 'nlp', None)
+        if nlp is not None:
+            for processor_name in ('tokenize', 'ner'):
+                if processor_name in nlp.processors:
+                    nlp.processors[processor_name].config['batch_size'] = batch_size
+
+    def load(self) -> None:
+        import stanza
+
+        from .models import resolve_stanza_models
+
+        # Only downloads the stanza model if the model manifest shows it has
+        # not already been downloaded.
+        resolve_stanza_models(self.model_directory, self.lang, self.processors,
+                              self.offline)
+        pipeline_kwargs: Dict[str, Any] = {}
+        # Newer versions of Stanza contact the Stanza servers when creating
+        # a pipeline unless told not to.
+        if 'download_method' in inspect.signature(stanza.Pipeline).parameters:
+            pipeline_kwargs['download_method'] = None
+        self.nlp = stanza.Pipeline(lang=self.lang, processors=self.processors,
+                                   use_gpu=self.use_gpu,
+                                   tokenize_batch_size=self.batch_size,
+                                   ner_batch_size=self.batch_size,
+                                   dir=str(self.model_directory),
+                                   **pipeline_kwargs)
+        if self.quantize:
+            from .quantization import quantize_pipeline
+
+            quantize_pipeline(self.nlp)
+
+    def tag_batch(self, paragraphs: List[str]) -> List[List[Entity]]:
+        from stanza_batch import batch
+
+        if not self.loaded:
+            self.load()
+        batch_entities: List[List[Entity]] = []
+        for stanza_document in batch(paragraphs, self.nlp,
+                                     batch_size=self.batch_size):
+            batch_entities.append([Entity(entity.text, entity.type,
+                                          entity.start_char, entity.end_char)
+                                   for entity in stanza_document.ents])
+        return batch_entities
+
+    def model_identity(self) -> str:
+        import stanza
+
+        from .models import model_manifest_fp
+
+        if not self.loaded:
+            self.load()
+        # The checksums of the model files, from the manifest written when
+        # the models were downloaded.
+        with model_manifest_fp(self.model_directory, self.lang).open('r') as manifest_file:
+            files = json.load(manifest_file)['files']
+        checksums = hashlib.sha256(''.join(files[name]['sha256']
+                                           for name in sorted(files)).encode('utf-8'))
+        identity = (f'{self.name}:{stanza.__version__}:{self.lang}:{self.processors}:'
+                    f'{checksums.hexdigest()}')
+        # The quantized models find slightly different Named Entities.
+        if self.quantize:
+            identity += ':int8'
+        return identity
+
+BACKENDS: Dict[str, Type[TaggingBackend]] = {SpacyBackend.name: SpacyBackend,
+                                             StanzaBackend.name: StanzaBackend}
+
+def create_backend(name: str, **kwargs: Any) -> TaggingBackend:
+    '''
+    :param name: Name of the backend, one of the keys in `BACKENDS`.
+    :param kwargs: Keyword arguments given to the backend's constructor.
+    :returns: The backend, the model is not loaded.
+    :raises ValueError: If the backend name is not known.
+    '''
+    if name not in BACKENDS:
+        raise ValueError(f'Unknown tagging backend: {name}, the known '
+                         f'backends are: {sorted(BACKENDS)}')
+    return BACKENDS[name](**kwargs)
@@ -0,0 +1,520 @@
+import argparse
+import copy
+from itertools import cycle, islice
+import json
+import multiprocessing
+from pathlib import Path
+import platform
+import random
+import re
+from resource import getrusage, RUSAGE_CHILDREN, RUSAGE_SELF
+import string
+import subprocess
+import sys
+import time
+from typing import (Any, Callable, Dict, Iterable, List, NamedTuple, Optional,
+                    Sequence)
+
+from .backends import BACKENDS, Entity, TaggingBackend, create_backend
+from .engine import TaggedBatch, tag_files
+from .files import FilePair
+from .reader import ParagraphIndex, yield_paragraphs
+from .utils import file_path, get_stdout_logger
+from .writers import BackgroundWriter, WRITERS, create_writer
+
+BENCHMARKS = ('reader', 'writer', 'tagging')
+# Number of paragraphs whose Named Entities are written repeatedly by the
+# writer benchmark.
+_WRITER_SAMPLE = 1000
+_SIZE_UNITS = {'B': 1, 'KB': 1024, 'MB': 1024**2, 'GB': 1024**3}
+_CAPITALISED_WORD = re.compile(r'\b[A-Z][a-z]+\b')
+
+class BenchmarkResult(NamedTuple):
+    '''
+    The result of one benchmark on one corpus with one set of parameters,
+    e.g. the batch size and number of workers of the tagging benchmark.
+    '''
+    benchmark: str
+    corpus: str
+    corpus_bytes: int
+    parameters: Dict[str, Any]
+    number_paragraphs: int
+    # Wall clock time of the whole benchmark, including the start up.
+    seconds: float
+    # Time before the first batch was tagged, e.g. loading the model.
+    startup_seconds: float
+    # Throughput after the start up, the bytes of the writer benchmark are
+    # the bytes written.
+    paragraphs_per_second: float
+    bytes_per_second: float
+    # Peak RAM of the benchmark process and of its largest child process.
+    peak_rss_GB: float
+    peak_child_rss_GB: float
+
+    @property
+    def key(self) -> str:
+        '''
+        :returns: Identifies the benchmark, corpus, and parameters, e.g.
+                  `tagging/alice-in-wonderland/backend=spacy,batch_size=50`
+        '''
+        key = f'{self.benchmark}/{self.corpus}'
+        if self.parameters:
+            key += '/' + ','.join(f'{name}={value}' for name, value
+                                  in sorted(self.parameters.items()))
+        return key
+
+class Regression(NamedTuple):
+    '''
+    A metric of a benchmark that is worse than in the baseline results.
+    '''
+    key: str
+    metric: str
+    baseline: float
+    current: float
+
+    @property
+    def change(self) -> float:
+        '''
+        :returns: Relative change from the baseline, e.g. -0.2 is 20% less.
+        '''
+        if not self.baseline:
+            return 0.0
+        return (self.current - self.baseline) / self.baseline
+
+def parse_size(size: str) -> int:
+    '''
+    :param size: A size in bytes with an optional unit, e.g. `10MB` or `1GB`,
+                 units are powers of 1024.
+    :returns: The number of bytes.
+    :raises ValueError: If the size cannot be parsed.
+    '''
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([KMG]?B)?\s*', size.upper())
+    if match is None:
+        raise ValueError(f'Cannot parse the size {size}, e.g. 10MB or 1GB')
+    return int(float(match.group(1)) * _SIZE_UNITS[match.group(2) or 'B'])
+
+def _random_paragraph(random_generator: random.Random) -> str:
+    words: List[str] = []
+    for _ in range(random_generator.randint(5, 120)):
+        word = ''.join(random_generator.choices(string.ascii_lowercase,
+                                                k=random_generator.randint(1, 10)))
+        if random_generator.random() < 0.1:
+            word = word.capitalize()
+        words.append(word)
+    return ' '.join(words) + '.'
+
+def generate_corpus(output_fp: Path, number_bytes: int,
+                    source_fps: Sequence[Path] = (), seed: int = 0) -> None:
+    '''
+    Writes a synthetic text file of at least `number_bytes` bytes, paragraphs
+    separated by blank lines, by drawing paragraphs at random, thus the
+    paragraph lengths follow those of the source texts.
+
+    :param output_fp: File path to write the text too.
+    :param number_bytes: Minimum size of the text file in bytes.
+    :param source_fps: Texts to draw the paragraphs from, if none are given
+                       the paragraphs are random words.
+    :param seed: Seed of the random paragraphs, the same seed and sources
+                 give the same text file.
+    :raises ValueError: If the source texts do not contain any paragraphs.
+    '''
+    random_generator = random.Random(seed)
+    source_paragraphs: List[str] = []
+    for source_fp in source_fps:
+        source_paragraphs.extend(yield_paragraphs(source_fp))
+    if source_fps and not source_paragraphs:
+        raise ValueError('The source texts do not contain any paragraphs: '
+                         f'{source_fps}')
+    output_fp.parent.mkdir(parents=True, exist_ok=True)
+    written_bytes = 0
+    with output_fp.open('w', encoding='utf-8') as output_file:
+        while written_bytes < number_bytes:
+            if source_paragraphs:
+                paragraph = random_generator.choice(source_paragraphs)
+            else:
+                paragraph = _random_paragraph(random_generator)
+            written_bytes += output_file.write(paragraph + '\n\n')
+
+def _peak_rss() -> float:
+    # (1024**2) converts it to GB from KB
+    return getrusage(RUSAGE_SELF).ru_maxrss / (1024**2)
+
+def _peak_child_rss() -> float:
+    return getrusage(RUSAGE_CHILDREN).ru_maxrss / (1024**2)
+
+def _corpus_name(text_fp: Path) -> str:
+    return text_fp.stem
+
+def benchmark_reader(text_fp: Path) -> BenchmarkResult:
+    '''
+    :param text_fp: File path to the text to read.
+    :returns: The throughput of reading the paragraphs of the text, see
+              `hec_tagging.reader.yield_paragraphs`.
+    '''
+    text_bytes = text_fp.stat().st_size
+    start_time = time.perf_counter()
+    number_paragraphs = sum(1 for _ in yield_paragraphs(text_fp))
+    seconds = max(time.perf_counter() - start_time, 1e-9)
+    return BenchmarkResult('reader', _corpus_name(text_fp), text_bytes, {},
+                           number_paragraphs, seconds, 0.0,
+                           number_paragraphs / seconds, text_bytes / seconds,
+                           _peak_rss(), _peak_child_rss())
+
+def benchmark_writer(text_fp: Path, output_format: str,
+                     output_directory: Path) -> BenchmarkResult:
+    '''
+    Writes Named Entities for as many paragraphs as the text contains, the
+    Named Entities being the capitalised words of the first paragraphs of
+    the text written over and over, through the `BackgroundWriter` that
+    `tag_file` uses.
+
+    :param text_fp: File path to the text.
+    :param output_format: Format of the output file, one of the keys in
+                          `hec_tagging.writers.WRITERS`.
+    :param output_directory: Directory to write the output file too, the
+                             output file is deleted afterwards.
+    :returns: The throughput of writing the Named Entities.
+    '''
+    with ParagraphIndex(text_fp) as index:
+        number_paragraphs = len(index)
+        sample_entities = [[Entity(match.group(), 'CAPITALISED', match.start(),
+                                   match.end())
+                            for match in _CAPITALISED_WORD.finditer(paragraph)]
+                           for paragraph in index.paragraphs(0, _WRITER_SAMPLE)]
+    output_directory.mkdir(parents=True, exist_ok=True)
+    output_fp = Path(output_directory,
+                     f'{_corpus_name(text_fp)}{WRITERS[output_format].suffix}')
+    start_time = time.perf_counter()
+    with BackgroundWriter(create_writer(output_format, output_fp)) as writer:
+        paragraphs_entities = islice(cycle(sample_entities), number_paragraphs) \
+            if sample_entities else iter(())
+        for paragraph_number, entities in enumerate(paragraphs_entities):
+            writer.write(paragraph_number, entities)
+    seconds = max(time.perf_counter() - start_time, 1e-9)
+    output_bytes = output_fp.stat().st_size
+    output_fp.unlink()
+    return BenchmarkResult('writer', _corpus_name(text_fp), text_fp.stat().st_size,
+                           {'output_format': output_format}, number_paragraphs,
+                           seconds, 0.0, number_paragraphs / seconds,
+                           output_bytes / seconds, _peak_rss(),
+                           _peak_child_rss())
+
+def benchmark_tagging(text_fp: Path, backend: TaggingBackend,
+                      number_workers: int, output_directory: Path
+                      ) -> BenchmarkResult:
+    '''
+    Tags the text with `hec_tagging.engine.tag_files`, the start up is the
+    time until the first batch has been tagged, which includes loading the
+    model, and the throughput is of the batches after the first.
+
+    :param text_fp: File path to the text to tag.
+    :param backend: Backend to tag with, the model should not be loaded.
+    :param number_workers: Number of worker processes, see `tag_files`.
+    :param output_directory: Directory to write the TSV file too, the TSV
+                             file is deleted afterwards.
+    :returns: The throughput of tagging the text.
+    '''
+    text_bytes = text_fp.stat().st_size
+    output_fp = Path(output_directory, f'{_corpus_name(text_fp)}.tsv')
+    first_batch: List[TaggedBatch] = []
+    first_batch_times: List[float] = []
+
+    def record_first_batch(tagged_batch: TaggedBatch) -> None:
+        if not first_batch:
+            first_batch.append(tagged_batch)
+            first_batch_times.append(time.perf_counter())
+
+    start_time = time.perf_counter()
+    statistics = tag_files([FilePair(text_fp, output_fp)], backend,
+                           number_workers, on_batch=record_first_batch)
+    end_time = time.perf_counter()
+    output_fp.unlink()
+    seconds = max(end_time - start_time, 1e-9)
+    startup_seconds = 0.0
+    steady_paragraphs = statistics.number_paragraphs
+    steady_bytes = text_bytes
+    steady_seconds = seconds
+    if first_batch and statistics.number_batches > 1:
+        startup_seconds = first_batch_times[0] - start_time
+        first_paragraphs = first_batch[0].paragraphs
+        steady_paragraphs -= len(first_paragraphs)
+        steady_bytes -= sum(len(paragraph.encode('utf-8'))
+                            for paragraph in first_paragraphs)
+        steady_seconds = max(end_time - first_batch_times[0], 1e-9)
+    parameters = {'backend': backend.name, 'batch_size': backend.batch_size,
+                  'workers': number_workers}
+    return BenchmarkResult('tagging', _corpus_name(text_fp), text_bytes,
+                           parameters, statistics.number_paragraphs, seconds,
+                           startup_seconds, steady_paragraphs / steady_seconds,
+                           max(0, steady_bytes) / steady_seconds, _peak_rss(),
+                           _peak_child_rss())
+
+def _run_and_send(connection: Any, function: Callable[..., BenchmarkResult],
+                  args: Sequence[Any]) -> None:
+    try:
+        connection.send(('result', function(*args)))
+    except Exception as error:
+        connection.send(('error', repr(error)))
+    finally:
+        connection.close()
+
+def run_isolated(function: Callable[..., BenchmarkResult], *args: Any
+                 ) -> BenchmarkResult:
+    '''
+    Runs the benchmark in a new process, thus the peak RAM and start up time
+    are those of the benchmark alone, not of the benchmarks before it. The
+    process is not a daemon, so the benchmark can start worker processes.
+
+    :param function: The benchmark function, e.g. `benchmark_tagging`.
+    :param args: Arguments of the benchmark function, which are pickled.
+    :returns: The benchmark result.
+    :raises RuntimeError: If the benchmark raised an error or its process
+                          exited without a result.
+    '''
+    context = multiprocessing.get_context('spawn')
+    receive_connection, send_connection = context.Pipe(duplex=False)
+    process = context.Process(target=_run_and_send,
+                              args=(send_connection, function, args))
+    process.start()
+    send_connection.close()
+    try:
+        outcome, value = receive_connection.recv()
+    except EOFError:
+        outcome, value = 'error', 'the process exited without a result'
+    process.join()
+    if outcome == 'error':
+        raise RuntimeError(f'The benchmark {function.__name__} failed: {value}')
+    return value
+
+def _best(results: Iterable[BenchmarkResult]) -> BenchmarkResult:
+    return max(results, key=lambda result: result.paragraphs_per_second)
+
+def run_benchmarks(text_fps: Sequence[Path], output_directory: Path,
+                   benchmarks: Sequence[str] = BENCHMARKS,
+                   backends: Sequence[TaggingBackend] = (),
+                   batch_sizes: Sequence[int] = (50,),
+                   number_workers: Sequence[int] = (1,),
+                   output_formats: Sequence[str] = ('tsv',),
+                   repeats: int = 1) -> List[BenchmarkResult]:
+    '''
+    Runs each benchmark on each text in its own process, see `run_isolated`,
+    the tagging benchmark is run for every combination of backend, batch
+    size, and number of workers.
+
+    :param text_fps: File paths to the texts to benchmark on.
+    :param output_directory: Directory for the output files, which are
+                             deleted after each benchmark.
+    :param benchmarks: Benchmarks to run, from `BENCHMARKS`.
+    :param backends: Backends for the tagging benchmark, their batch sizes
+                     are replaced by `batch_sizes`.
+    :param batch_sizes: Batch sizes for the tagging benchmark.
+    :param number_workers: Numbers of worker processes for the tagging
+                           benchmark.
+    :param output_formats: Output formats for the writer benchmark.
+    :param repeats: Number of times each benchmark is run, the run with the
+                    largest throughput is kept.
+    :returns: The result of each benchmark.
+    :raises ValueError: If a benchmark is not known.
+    '''
+    unknown_benchmarks = set(benchmarks) - set(BENCHMARKS)
+    if unknown_benchmarks:
+        raise ValueError(f'Unknown benchmarks: {sorted(unknown_benchmarks)}, '
+                         f'the known benchmarks are: {BENCHMARKS}')
+    logger = get_stdout_logger(__name__)
+    cases: List[Sequence[Any]] = []
+    for text_fp in text_fps:
+        if 'reader' in benchmarks:
+            cases.append((benchmark_reader, text_fp))
+        if 'writer' in benchmarks:
+            for output_format in output_formats:
+                cases.append((benchmark_writer, text_fp, output_format,
+                              output_directory))
+        if 'tagging' in benchmarks:
+            for backend in backends:
+                for batch_size in batch_sizes:
+                    for workers in number_workers:
+                        case_backend = copy.copy(backend)
+                        case_backend.batch_size = batch_size
+                        cases.append((benchmark_tagging, text_fp, case_backend,
+                                      workers, output_directory))
+    results: List[BenchmarkResult] = []
+    for function, *args in cases:
+        result = _best(run_isolated(function, *args)
+                       for _ in range(max(1, repeats)))
+        logger.info(f'{result.key}: {result.paragraphs_per_second:.2f} '
+                    f'paragraphs/s, {result.bytes_per_second / (1024**2):.2f}'
+                    f'MB/s, start up {result.startup_seconds:.4f}s, peak RSS '
+                    f'{result.peak_rss_GB:.4f}GB')
+        results.append(result)
+    return results
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], check=True,
+                              capture_output=True, text=True,
+                              cwd=str(Path(__file__).parent)).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def write_results(results_fp: Path, results: Sequence[BenchmarkResult]) -> None:
+    '''
+    :param results_fp: File path to write the results too, JSON, along with
+                       the git commit, Python version, and machine they
+                       were measured on.
+    :param results: The benchmark results.
+    '''
+    results_fp.parent.mkdir(parents=True, exist_ok=True)
+    with results_fp.open('w') as results_file:
+        json.dump({'git_commit': _git_commit(),
+                   'python_version': platform.python_version(),
+                   'machine': platform.node(),
+                   'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                   'results': [result._asdict() for result in results]},
+                  results_file, indent=2)
+
+def read_results(results_fp: Path) -> List[BenchmarkResult]:
+    '''
+    :param results_fp: File path of results written by `write_results`.
+    :returns: The benchmark results.
+    '''
+    with results_fp.open('r') as results_file:
+        return [BenchmarkResult(**result)
+                for result in json.load(results_file)['results']]
+
+def compare_results(baseline: Sequence[BenchmarkResult],
+                    current: Sequence[BenchmarkResult],
+                    threshold: float = 0.1,
+                    minimum_startup_change: float = 0.5) -> List[Regression]:
+    '''
+    :param baseline: Results to compare against, e.g. of the main branch.
+    :param current: Results of the change being tested.
+    :param threshold: Relative change that is a regression, e.g. 0.1 flags a
+                      throughput 10% lower, or a peak RSS or start up 10%
+                      higher, than the baseline.
+    :param minimum_startup_change: Minimum increase of the start up in
+                                   seconds that is a regression, as short
+                                   start ups are noisy.
+    :returns: The regressions of the benchmarks in both sets of results.
+    '''
+    baseline_by_key = {result.key: result for result in baseline}
+    regressions: List[Regression] = []
+    for result in current:
+        if result.key not in baseline_by_key:
+            continue
+        baseline_result = baseline_by_key[result.key]
+        for metric in ('paragraphs_per_second', 'bytes_per_second'):
+            baseline_value = getattr(baseline_result, metric)
+            value = getattr(result, metric)
+            if value < baseline_value * (1 - threshold):
+                regressions.append(Regression(result.key, metric,
+                                              baseline_value, value))
+        if result.peak_rss_GB > baseline_result.peak_rss_GB * (1 + threshold):
+            regressions.append(Regression(result.key, 'peak_rss_GB',
+                                          baseline_result.peak_rss_GB,
+                                          result.peak_rss_GB))
+        startup_change = result.startup_seconds - baseline_result.startup_seconds
+        if (startup_change > minimum_startup_change and result.startup_seconds
+                > baseline_result.startup_seconds * (1 + threshold)):
+            regressions.append(Regression(result.key, 'startup_seconds',
+                                          baseline_result.startup_seconds,
+                                          result.startup_seconds))
+    return regressions
+
+def create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description=('Benchmarks the paragraph reader, the entity writers, '
+                     'and the tagging backends, and compares the results of '
+                     'two runs, e.g. of two git commits.'))
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='Run the benchmarks.')
+    run_parser.add_argument('results_file_path', type=file_path,
+                            help='JSON file to write the results too.')
+    run_parser.add_argument('--text', type=file_path, nargs='+', default=[],
+                            help=('Text files to benchmark on, e.g. '
+                                  'alice-in-wonderland.txt, and the source '
+                                  'of the paragraphs of the generated '
+                                  'texts.'))
+    run_parser.add_argument('--generate', nargs='+', default=[], metavar='SIZE',
+                            help=('Sizes of synthetic texts to generate and '
+                                  'benchmark on, e.g. 10MB 1GB. A generated '
+                                  'text is reused by later runs.'))
+    run_parser.add_argument('--corpus-directory', type=file_path, default=None,
+                            help=('Directory of the generated texts, by '
+                                  'default next to the results file.'))
+    run_parser.add_argument('--seed', type=int, default=0,
+                            help='Seed of the generated texts.')
+    run_parser.add_argument('--benchmarks', nargs='+', choices=BENCHMARKS,
+                            default=list(BENCHMARKS))
+    run_parser.add_argument('--backends', nargs='+', choices=sorted(BACKENDS),
+                            default=[], help='Backends of the tagging benchmark.')
+    run_parser.add_argument('--batch-sizes', type=int, nargs='+', default=[50])
+    run_parser.add_argument('--workers', type=int, nargs='+', default=[1])
+    run_parser.add_argument('--output-formats', nargs='+', choices=sorted(WRITERS),
+                            default=['tsv'])
+    run_parser.add_argument('--stanza-model-directory', type=file_path,
+                            default=None,
+                            help='Directory of the pre-trained stanza models.')
+    run_parser.add_argument('--gpu', action="store_true",
+                            help='Tag using a GPU.')
+    run_parser.add_argument('--repeats', type=int, default=1,
+                            help=('Number of times to run each benchmark, the '
+                                  'fastest run is kept.'))
+
+    compare_parser = subparsers.add_parser(
+        'compare', help=('Compare two results files, exits with status 1 if '
+                         'there are regressions.'))
+    compare_parser.add_argument('baseline_file_path', type=file_path)
+    compare_parser.add_argument('current_file_path', type=file_path)
+    compare_parser.add_argument('--threshold', type=float, default=0.1,
+                                help=('Relative change that is a regression, '
+                                      'e.g. 0.1 is 10%%.'))
+    return parser
+
+def main(argv: Optional[List[str]] = None) -> int:
+    '''
+    :param argv: Command line arguments, if None `sys.argv` is used.
+    :returns: The exit status, 1 if comparing found regressions.
+    '''
+    args = create_parser().parse_args(argv)
+    logger = get_stdout_logger(__name__)
+    if args.command == 'compare':
+        regressions = compare_results(read_results(args.baseline_file_path),
+                                      read_results(args.current_file_path),
+                                      args.threshold)
+        for regression in regressions:
+            logger.warning(f'Regression {regression.key} {regression.metric}: '
+                           f'{regression.baseline:.4f} -> '
+                           f'{regression.current:.4f} '
+                           f'({100 * regression.change:+.1f}%)')
+        if not regressions:
+            logger.info('No regressions')
+        return 1 if regressions else 0
+
+    corpus_directory = args.corpus_directory
+    if corpus_directory is None:
+        corpus_directory = Path(args.results_file_path.parent, 'corpora')
+    text_fps = list(args.text)
+    for size in args.generate:
+        number_bytes = parse_size(size)
+        corpus_fp = Path(corpus_directory,
+                         f'synthetic_{size.upper()}_seed{args.seed}.txt')
+        if not corpus_fp.exists() or corpus_fp.stat().st_size < number_bytes:
+            logger.info(f'Generating {corpus_fp}')
+            generate_corpus(corpus_fp, number_bytes, args.text, args.seed)
+        text_fps.append(corpus_fp)
+    backends: List[TaggingBackend] = []
+    for backend_name in args.backends:
+        backend_kwargs = {'batch_size': args.batch_sizes[0], 'use_gpu': args.gpu}
+        if backend_name == 'stanza':
+            backend_kwargs['model_directory'] = args.stanza_model_directory
+        backends.append(create_backend(backend_name, **backend_kwargs))
+    results = run_benchmarks(text_fps, Path(corpus_directory, 'output'),
+                             args.benchmarks, backends, args.batch_sizes,
+                             args.workers, args.output_formats, args.repeats)
+    write_results(args.results_file_path, results)
+    logger.info(f'{len(results)} results written to {args.results_file_path}')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
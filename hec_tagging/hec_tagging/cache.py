@@ -0,0 +1,240 @@
+import copy
+import hashlib
+import json
+from pathlib import Path
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+from .backends import Entity, TaggingBackend
+
+# Fraction of the maximum size the cache is reduced to when it is full, thus
+# the least recently used paragraphs are not evicted after every batch.
+_EVICT_TO = 0.9
+
+class ParagraphCache():
+    '''
+    An on disk cache, a SQLite database, of the Named Entities found in each
+    paragraph by a model. A paragraph is stored under a hash of the model's
+    identity, see `TaggingBackend.model_identity`, and the paragraph's text,
+    thus the same paragraph found in other text files, or tagged again, is
+    only tagged once by the model, and a cache can be shared by models
+    without their results mixing. The Named Entities' character offsets are
+    relative to the paragraph, so they are the same wherever the paragraph
+    is.
+
+    The size of the cache is bounded, when it is larger than `max_bytes` the
+    least recently used paragraphs are removed.
+
+    Any number of processes can use the same cache, SQLite locks the
+    database, which requires a file system with working locks, e.g. a local
+    disk.
+    '''
+
+    def __init__(self, cache_fp: Path, model_identity: str,
+                 max_bytes: int = 10 * 1024**3) -> None:
+        '''
+        :param cache_fp: File path of the SQLite database, created if it
+                         does not exist.
+        :param model_identity: Identity of the model whose Named Entities
+                               are cached.
+        :param max_bytes: Maximum size of the cached Named Entities in bytes.
+        '''
+        self.cache_fp = cache_fp
+        self.model_identity = model_identity
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._key_prefix = hashlib.blake2b(model_identity.encode('utf-8') + b'\0',
+                                           digest_size=20)
+        cache_fp.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(str(cache_fp), timeout=60)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        with self._connection:
+            self._connection.execute('CREATE TABLE IF NOT EXISTS paragraphs '
+                                     '(key BLOB PRIMARY KEY, entities TEXT NOT NULL, '
+                                     'size INTEGER NOT NULL, last_used REAL NOT NULL)')
+            self._connection.execute('CREATE INDEX IF NOT EXISTS paragraphs_last_used '
+                                     'ON paragraphs (last_used)')
+        self._size = self._total_size()
+
+    def _key(self, paragraph: str) -> bytes:
+        paragraph_hash = self._key_prefix.copy()
+        paragraph_hash.update(paragraph.encode('utf-8'))
+        return paragraph_hash.digest()
+
+    def _total_size(self) -> int:
+        return self._connection.execute('SELECT COALESCE(SUM(size), 0) '
+                                        'FROM paragraphs').fetchone()[0]
+
+    def get(self, paragraphs: Sequence[str]) -> List[Optional[List[Entity]]]:
+        '''
+        :param paragraphs: Paragraphs to look up.
+        :returns: For each paragraph, in the same order as given, the cached
+                  Named Entities, or None if the paragraph is not cached.
+        '''
+        keys = [self._key(paragraph) for paragraph in paragraphs]
+        found: Dict[bytes, List[Entity]] = {}
+        unique_keys = list(set(keys))
+        # SQLite limits the number of parameters in a query.
+        for start in range(0, len(unique_keys), 500):
+            chunk = unique_keys[start: start + 500]
+            rows = self._connection.execute(
+                'SELECT key, entities FROM paragraphs WHERE key IN '
+                f'({",".join("?" * len(chunk))})', chunk)
+            for key, entities in rows:
+                found[key] = [Entity(*entity) for entity in json.loads(entities)]
+        if found:
+            with self._connection:
+                self._connection.executemany('UPDATE paragraphs SET last_used = ? '
+                                             'WHERE key = ?',
+                                             [(time.time(), key) for key in found])
+        results = [found.get(key) for key in keys]
+        number_hits = sum(result is not None for result in results)
+        self.hits += number_hits
+        self.misses += len(results) - number_hits
+        return results
+
+    def put(self, paragraphs: Sequence[str],
+            entities: Sequence[List[Entity]]) -> None:
+        '''
+        Stores the Named Entities of each paragraph, removing the least
+        recently used paragraphs if the cache is then too large.
+
+        :param paragraphs: Paragraphs that have been tagged.
+        :param entities: For each paragraph the Named Entities found.
+        '''
+        rows: Dict[bytes, Any] = {}
+        current_time = time.time()
+        for paragraph, paragraph_entities in zip(paragraphs, entities):
+            serialised = json.dumps([list(entity) for entity in paragraph_entities],
+                                    ensure_ascii=False)
+            key = self._key(paragraph)
+            rows[key] = (key, serialised, len(key) + len(serialised.encode('utf-8')),
+                         current_time)
+        keys = list(rows)
+        added_size = sum(row[2] for row in rows.values())
+        with self._connection:
+            # Paragraphs cached since they were looked up, e.g. by another
+            # process, are replaced, thus only the change in their size is
+            # added.
+            for start in range(0, len(keys), 500):
+                chunk = keys[start: start + 500]
+                replaced = self._connection.execute(
+                    'SELECT size FROM paragraphs WHERE key IN '
+                    f'({",".join("?" * len(chunk))})', chunk)
+                added_size -= sum(size for size, in replaced)
+            self._connection.executemany('INSERT OR REPLACE INTO paragraphs '
+                                         'VALUES (?, ?, ?, ?)', rows.values())
+        self._size += added_size
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def evict(self) -> None:
+        '''
+        Removes the least recently used paragraphs until the cache is at
+        most 90% of its maximum size.
+        '''
+        self._size = self._total_size()
+        target_size = self.max_bytes * _EVICT_TO
+        with self._connection:
+            while self._size > target_size:
+                rows = self._connection.execute('SELECT key, size FROM paragraphs '
+                                                'ORDER BY last_used LIMIT 1000').fetchall()
+                if not rows:
+                    break
+                removed_keys = []
+                for key, size in rows:
+                    if self._size <= target_size:
+                        break
+                    removed_keys.append((key,))
+                    self._size -= size
+                self._connection.executemany('DELETE FROM paragraphs WHERE key = ?',
+                                             removed_keys)
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def __enter__(self) -> 'ParagraphCache':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+class CachedBackend(TaggingBackend):
+    '''
+    Wraps a backend so that paragraphs found in a `ParagraphCache` are not
+    tagged by the model, their cached Named Entities are returned instead,
+    and the Named Entities of the paragraphs the model tags are cached. A
+    paragraph that is in the same batch more than once is only tagged once.
+
+    Like the other backends it only stores its settings when created, the
+    cache is opened, and the wrapped backend loaded, through `load`, thus it
+    can be given to the worker processes of a
+    `hec_tagging.parallel.TaggingPool`, each opening the cache.
+    '''
+
+    def __init__(self, backend: TaggingBackend, cache_fp: Path,
+                 max_bytes: int = 10 * 1024**3) -> None:
+        '''
+        :param backend: Backend that tags the paragraphs not in the cache.
+        :param cache_fp: File path of the cache, see `ParagraphCache`.
+        :param max_bytes: Maximum size of the cache in bytes.
+        '''
+        self.backend = backend
+        self.cache_fp = cache_fp
+        self.max_bytes = max_bytes
+        self.name = backend.name
+        self.cache: Optional[ParagraphCache] = None
+
+    @property
+    def batch_size(self) -> int:  # type: ignore[override]
+        return self.backend.batch_size
+
+    @batch_size.setter
+    def batch_size(self, batch_size: int) -> None:
+        self.backend.batch_size = batch_size
+
+    @property
+    def use_gpu(self) -> bool:  # type: ignore[override]
+        return self.backend.use_gpu
+
+    @property
+    def loaded(self) -> bool:
+        return self.cache is not None and self.backend.loaded
+
+    def load(self) -> None:
+        if not self.backend.loaded:
+            self.backend.load()
+        self.cache = ParagraphCache(self.cache_fp, self.backend.model_identity(),
+                                    self.max_bytes)
+
+    def __copy__(self) -> 'CachedBackend':
+        # A copy, e.g. for a worker process, opens its own cache and should
+        # not load the wrapped backend of the original.
+        return CachedBackend(copy.copy(self.backend), self.cache_fp, self.max_bytes)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # The SQLite connection cannot be given to another process.
+        state = self.__dict__.copy()
+        state['cache'] = None
+        return state
+
+    def tag_batch(self, paragraphs: List[str]) -> List[List[Entity]]:
+        if not self.loaded:
+            self.load()
+        assert self.cache is not None
+        batch_entities = self.cache.get(paragraphs)
+        uncached = list(dict.fromkeys(paragraph for paragraph, entities
+                                      in zip(paragraphs, batch_entities)
+                                      if entities is None))
+        if uncached:
+            tagged = dict(zip(uncached, self.backend.tag_batch(uncached)))
+            self.cache.put(uncached, [tagged[paragraph] for paragraph in uncached])
+            batch_entities = [tagged[paragraph] if entities is None else entities
+                              for paragraph, entities in zip(paragraphs, batch_entities)]
+        return batch_entities  # type: ignore[return-value]
+
+    def model_identity(self) -> str:
+        return self.backend.model_identity()
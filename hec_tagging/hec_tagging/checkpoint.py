@@ -0,0 +1,191 @@
+import json
+import os
+from pathlib import Path
+from typing import List, NamedTuple, Optional
+import time
+
+from .archives import text_stat
+from .files import TextPart
+
+class Checkpoint(NamedTuple):
+    '''
+    The progress of tagging a text file, everything before these points has
+    been tagged and fully written to the output file. `tagged_with`
+    identifies the model and settings the output file is being tagged with,
+    if given when the checkpoint was written, and `part` is the part of the
+    text file being tagged, see `hec_tagging.files.TextPart`, as a list,
+    None when all of the text file is tagged.
+    '''
+    paragraph_number: int
+    text_offset: int
+    output_offset: int
+    text_size: int
+    text_mtime: float
+    complete: bool = False
+    tagged_with: Optional[str] = None
+    part: Optional[List[int]] = None
+
+def checkpoint_fp(output_fp: Path) -> Path:
+    '''
+    :param output_fp: File path of the output file.
+    :returns: File path of the output file's checkpoint.
+    '''
+    return output_fp.with_name(output_fp.name + '.checkpoint')
+
+def read_checkpoint(text_fp: Path, output_fp: Path,
+                    tagged_with: Optional[str] = None,
+                    part: Optional[TextPart] = None) -> Optional[Checkpoint]:
+    '''
+    :param text_fp: File path to the text being tagged.
+    :param output_fp: File path of the output file.
+    :param tagged_with: If given, the identity of the model and settings
+                        the text will be tagged with, which the checkpoint
+                        has to have been written with.
+    :param part: The part of the text file that will be tagged, which the
+                 checkpoint has to have been written for, None if all of
+                 it will be tagged.
+    :returns: The checkpoint of the output file, None if there is no
+              checkpoint or the checkpoint is no longer valid as the text
+              file has changed, the output file is shorter than it was at
+              the checkpoint, it was tagged with a different model or
+              settings, or it is of a different part of the text file.
+    '''
+    _checkpoint_fp = checkpoint_fp(output_fp)
+    if not _checkpoint_fp.exists() or not output_fp.exists():
+        return None
+    with _checkpoint_fp.open('r') as checkpoint_file:
+        checkpoint = Checkpoint(**json.load(checkpoint_file))
+    stat = text_stat(text_fp)
+    if checkpoint.text_size != stat.size or checkpoint.text_mtime != stat.mtime:
+        return None
+    if output_fp.stat().st_size < checkpoint.output_offset:
+        return None
+    if tagged_with is not None and checkpoint.tagged_with != tagged_with:
+        return None
+    if checkpoint.part != (None if part is None else list(part)):
+        return None
+    return checkpoint
+
+def write_checkpoint(output_fp: Path, checkpoint: Checkpoint) -> None:
+    '''
+    Atomically writes the checkpoint of the output file, thus a job killed
+    while writing the checkpoint leaves the previous checkpoint in place.
+
+    :param output_fp: File path of the output file.
+    :param checkpoint: The checkpoint to write.
+    '''
+    _checkpoint_fp = checkpoint_fp(output_fp)
+    temporary_fp = _checkpoint_fp.with_name(_checkpoint_fp.name + '.tmp')
+    with temporary_fp.open('w') as checkpoint_file:
+        json.dump(checkpoint._asdict(), checkpoint_file)
+    os.replace(str(temporary_fp), str(_checkpoint_fp))
+
+class Checkpointer():
+    '''
+    Periodically writes a checkpoint while tagging a text file and resumes
+    from the last checkpoint when the text file is tagged again, e.g. after
+    the job was killed for running out of time (`h_rt`).
+
+    A checkpoint records the number of the next paragraph to tag, the byte
+    offset of that paragraph in the text file, and the size of the output
+    file. On resume the text file is read from that byte offset and the
+    output file is truncated to that size, removing any Named Entities
+    written after the checkpoint, and then appended too.
+    '''
+
+    def __init__(self, text_fp: Path, output_fp: Path, interval: float,
+                 start_paragraph_number: int = 0, start_offset: int = 0,
+                 tagged_with: Optional[str] = None,
+                 part: Optional[TextPart] = None) -> None:
+        '''
+        :param text_fp: File path to the text to tag.
+        :param output_fp: File path to output the Named Entities too.
+        :param interval: Minimum number of seconds between checkpoints.
+        :param start_paragraph_number: Paragraph number of the first
+                                       paragraph to tag when there is no
+                                       checkpoint, e.g. tagging a part of
+                                       the text file.
+        :param start_offset: Byte offset of that paragraph.
+        :param tagged_with: If given, the identity of the model and settings
+                            the text is tagged with, a checkpoint written
+                            with a different identity is not resumed from,
+                            see `read_checkpoint`.
+        :param part: The part of the text file that is tagged, None if all
+                     of it is tagged, a checkpoint of a different part is
+                     not resumed from.
+        '''
+        self.text_fp = text_fp
+        self.output_fp = output_fp
+        self.interval = interval
+        self.tagged_with = tagged_with
+        self.part = part
+        self.resume_from = read_checkpoint(text_fp, output_fp, tagged_with, part)
+        self._text_offset = start_offset
+        self._paragraph_number = start_paragraph_number
+        if self.resume_from is not None:
+            self._text_offset = self.resume_from.text_offset
+            self._paragraph_number = self.resume_from.paragraph_number
+        self._start_paragraph_number = self._paragraph_number
+        self._start_offset = self._text_offset
+        self._last_checkpoint_time = time.perf_counter()
+
+    @property
+    def complete(self) -> bool:
+        '''
+        :returns: Whether the text file has already been fully tagged.
+        '''
+        return self.resume_from is not None and self.resume_from.complete
+
+    @property
+    def start_paragraph_number(self) -> int:
+        '''
+        :returns: Paragraph number of the first paragraph to tag.
+        '''
+        return self._start_paragraph_number
+
+    @property
+    def start_offset(self) -> int:
+        '''
+        :returns: Byte offset in the text file of the first paragraph to tag.
+        '''
+        return self._start_offset
+
+    def prepare_output(self) -> bool:
+        '''
+        Removes everything written to the output file after the checkpoint
+        that is being resumed from.
+
+        :returns: Whether the output file should be appended too, False if
+                  there is no checkpoint to resume from.
+        '''
+        if self.resume_from is None:
+            return False
+        os.truncate(str(self.output_fp), self.resume_from.output_offset)
+        return True
+
+    def batch_written(self, number_paragraphs: int, text_offset: int) -> bool:
+        '''
+        :param number_paragraphs: Number of paragraphs in the batch that was
+                                  written.
+        :param text_offset: Byte offset in the text file after the paragraphs
+                            that have been written, see
+                            `hec_tagging.reader.ParagraphOffsets`.
+        :returns: Whether a checkpoint is due, if so the output file should
+                  be flushed and `write` called.
+        '''
+        self._text_offset = text_offset
+        self._paragraph_number += number_paragraphs
+        return time.perf_counter() - self._last_checkpoint_time >= self.interval
+
+    def write(self, output_offset: int, complete: bool = False) -> None:
+        '''
+        :param output_offset: Size of the flushed output file.
+        :param complete: Whether the text file has been fully tagged.
+        '''
+        stat = text_stat(self.text_fp)
+        write_checkpoint(self.output_fp,
+                         Checkpoint(self._paragraph_number, self._text_offset,
+                                    output_offset, stat.size, stat.mtime,
+                                    complete, self.tagged_with,
+                                    None if self.part is None else list(self.part)))
+        self._last_checkpoint_time = time.perf_counter()
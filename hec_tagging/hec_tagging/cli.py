@@ -0,0 +1,594 @@
+import argparse
+import copy
+import json
+import logging
+from typing import Callable, Iterable, List, Optional, Tuple
+import time
+
+from .backends import StanzaBackend, TaggingBackend, create_backend
+from .cache import CachedBackend
+from .engine import TaggedBatch, TaggingStatistics, tag_files
+from .estimate import (ResourceEstimate, estimate_resources, format_sge_time,
+                       profile_corpus, sge_resource_directives)
+from .files import FilePair, resolve_file_pairs
+from .incremental import (partition_file_pairs, tagging_record_fp,
+                          write_tagging_record)
+from .metrics import format_percentiles
+from .progress import ProgressReporter
+from .quantization import check_quantization, format_quantization_report
+from .server import RemoteBackend, TaggingServer
+from .splitting import SplittingBackend
+from .telemetry import TelemetrySampler, telemetry_fp
+from .tuning import sample_paragraphs, tune_batch_size
+from .utils import file_path, get_stdout_logger
+from .work_queue import WorkQueue
+from .writers import WRITERS
+
+def _add_text_file_argument(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('text_file_path', type=file_path,
+                        help=('File path to the text to process e.g. Alice in '
+                              'Wonderland. Can also be a directory of text '
+                              'files, a quoted glob pattern of text files, a '
+                              'tar archive of text files, or a manifest file '
+                              '(see --manifest), whereby all of the files are '
+                              'processed with the same loaded model. Text '
+                              'files compressed by gzip, bz2, xz, or zstd are '
+                              'decompressed as they are read.'))
+
+def _add_model_arguments(parser: argparse.ArgumentParser,
+                         backend_name: str) -> None:
+    '''
+    Adds the batch size argument and the arguments that choose how the model
+    is loaded, see `backend_from_arguments`.
+    '''
+    parser.add_argument('batch_size', type=int,
+                        help='Number of paragraphs of text for the model to process at a time.')
+    if backend_name == 'stanza':
+        parser.add_argument('stanza_model_directory', type=file_path,
+                            help='Directory to store the pre-trained stanza models.')
+        parser.add_argument('--offline', action="store_true",
+                            help=('Never download the stanza models, fail if '
+                                  'they have not been downloaded through '
+                                  'download_stanza.py'))
+        parser.add_argument('--quantize', action="store_true",
+                            help=('Quantize the LSTM layers of the stanza NER '
+                                  'model to int8, which is faster and '
+                                  'uses less memory on a CPU, at the cost of '
+                                  'slightly different entities. Cannot be '
+                                  'used with a GPU.'))
+    parser.add_argument('--gpu', action="store_true",
+                        help='Process using a GPU.')
+    parser.add_argument('--max-paragraph-chars', type=int, default=None,
+                        metavar='CHARS',
+                        help=('Split paragraphs longer than CHARS characters, '
+                              'e.g. text without blank lines, at sentence or '
+                              'white space boundaries before the model '
+                              'processes them, bounding the memory used '
+                              'whatever the text. The character offsets of '
+                              'the entities are still relative to the whole '
+                              'paragraph. Entities crossing a split may be '
+                              'missed, thus CHARS should be far larger than '
+                              'a typical paragraph, e.g. 10000.'))
+
+def _add_text_selection_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('--manifest', action="store_true",
+                        help=('The text file path is a manifest, a TSV file '
+                              'whereby each line contains a text file path '
+                              'and the file path to output its processed '
+                              'data too. Relative output file paths are '
+                              'relative to the output file path argument.'))
+    parser.add_argument('--pattern', type=str, default='*.txt',
+                        help=('Glob pattern of the text file names to process '
+                              'when the text file path is a directory, and of '
+                              'the members of tar archives to process.'))
+
+def create_parser(description: str, backend_name: str) -> argparse.ArgumentParser:
+    '''
+    :param description: Description of the tagging program.
+    :param backend_name: Name of the backend the program uses, the `stanza`
+                         backend has an extra argument for the directory that
+                         stores the pre-trained stanza models.
+    :returns: The argument parser shared by all of the tagging programs.
+    '''
+    parser = argparse.ArgumentParser(description=description)
+    _add_text_file_argument(parser)
+    parser.add_argument('output_file_path', type=file_path,
+                        help=('File path to output the processed data too. '
+                              'A directory when processing more than one '
+                              'text file.'))
+    _add_model_arguments(parser, backend_name)
+    _add_text_selection_arguments(parser)
+    parser.add_argument('--server', type=file_path, default=None, metavar='SOCKET',
+                        help=('Send the paragraphs to the tagging server '
+                              'listening on the Unix socket SOCKET, see '
+                              'serve.py, rather than loading the model. The '
+                              'server\'s model is used, the model arguments '
+                              'are ignored apart from the batch size.'))
+    parser.add_argument('--workers', type=int, default=1,
+                        help=('Number of processes, each with their own '
+                              'loaded model, that process the batches of '
+                              'paragraphs at the same time. The output is the '
+                              'same as processing with one process.'))
+    parser.add_argument('--output-format', choices=sorted(WRITERS), default='tsv',
+                        help=('Format of the output files, parquet requires '
+                              'the pyarrow package, tsv.zst requires the '
+                              'zstandard package. Only tsv can be used with '
+                              '--checkpoint-interval.'))
+    parser.add_argument('--max-batch-tokens', type=int, default=None,
+                        metavar='TOKENS',
+                        help=('Batch paragraphs of similar length together '
+                              'so that each batch contains at most TOKENS '
+                              'white space separated tokens, including '
+                              'padding each paragraph to the longest '
+                              'paragraph in the batch. The batch size is '
+                              'then the maximum number of paragraphs in a '
+                              'batch. The output is in the same order as '
+                              'without this argument.'))
+    parser.add_argument('--auto-batch', action="store_true",
+                        help=('Before processing, tag a sample of the '
+                              'paragraphs with batch sizes from 1 up to the '
+                              'batch size argument and process with the '
+                              'batch size that has the largest throughput, '
+                              'using at most --memory-cap memory.'))
+    parser.add_argument('--memory-cap', type=float, default=None, metavar='GB',
+                        help=('Maximum memory in GB for --auto-batch, the '
+                              'peak RAM of the process, or the peak memory '
+                              'used on the GPU when processing using a GPU.'))
+    if backend_name == 'stanza':
+        parser.add_argument('--quantize-check', type=int, default=None,
+                            metavar='PARAGRAPHS',
+                            help=('With --quantize, before processing, tag a '
+                                  'sample of PARAGRAPHS paragraphs, stratified '
+                                  'by length, with both the fp32 and the int8 '
+                                  'models and log how closely the entities '
+                                  'agree, the speedup, and the memory saved.'))
+        parser.add_argument('--quantize-min-f1', type=float, default=0.95,
+                            help=('Stop before processing when the F1 of the '
+                                  'int8 entities against the fp32 entities '
+                                  'found by --quantize-check is below this.'))
+    parser.add_argument('--auto-batch-sample', type=int, default=1000,
+                        metavar='PARAGRAPHS',
+                        help=('Number of paragraphs, from the start of the '
+                              'text files, that --auto-batch tags with each '
+                              'batch size.'))
+    parser.add_argument('--telemetry-interval', type=float, default=None,
+                        metavar='SECONDS',
+                        help=('Sample the RAM, CPU time, storage I/O, and GPU '
+                              'memory when processing using a GPU, of the '
+                              'program and its worker processes every '
+                              'SECONDS seconds on a background thread, '
+                              'writing the samples as JSON lines to '
+                              '{output_file_path}.telemetry.jsonl'))
+    parser.add_argument('--metrics-interval', type=float, default=None,
+                        metavar='SECONDS',
+                        help=('Log the throughput and the batch and paragraph '
+                              'latency percentiles of the text processed so '
+                              'far at most every SECONDS seconds.'))
+    parser.add_argument('--progress-interval', type=float, default=None,
+                        metavar='SECONDS',
+                        help=('Log the percentage of the text files, by size '
+                              'in bytes, processed so far, the smoothed '
+                              'throughput, and the estimated time remaining '
+                              'at most every SECONDS seconds.'))
+    parser.add_argument('--cache', type=file_path, default=None, metavar='FILE',
+                        help=('SQLite file that caches the entities found in '
+                              'each paragraph by the model, paragraphs in the '
+                              'cache, e.g. repeated boilerplate text or text '
+                              'processed by an earlier run, are not processed '
+                              'again. Should be on a file system with working '
+                              'file locks, e.g. a local disk.'))
+    parser.add_argument('--cache-size', type=float, default=10.0, metavar='GB',
+                        help=('Maximum size of the --cache in GB, the least '
+                              'recently used paragraphs are removed when it '
+                              'is larger.'))
+    parser.add_argument('--incremental', action="store_true",
+                        help=('Only process the text files that are new or '
+                              'have changed since they were last processed, '
+                              'or whose output was created with a different '
+                              'model or batch size, --auto-batch, '
+                              '--max-batch-tokens, or --output-format. What '
+                              'each output file was created from is saved '
+                              'next to it, {output file}.tagged.json'))
+    parser.add_argument('--checkpoint-interval', type=float, default=None,
+                        metavar='SECONDS',
+                        help=('Save the progress at most every SECONDS '
+                              'seconds, when the program is run again, e.g. '
+                              'after the job ran out of time, it resumes from '
+                              'the saved progress and skips text files that '
+                              'have been fully processed.'))
+    parser.add_argument('--queue', type=file_path, default=None, metavar='DIR',
+                        help=('Share the text files with the other programs, '
+                              'e.g. the other tasks of an array job, given '
+                              'the same text files and queue directory DIR '
+                              'on a shared file system. Each program '
+                              'processes the next text file, largest first, '
+                              'that no other program has taken until none '
+                              'remain, then exits.'))
+    parser.add_argument('--lease-time', type=float, default=600.0,
+                        metavar='SECONDS',
+                        help=('With --queue, a text file taken by a program '
+                              'that has not renewed its claim within SECONDS '
+                              'seconds, as it was killed, is taken by another '
+                              'program. Use with --checkpoint-interval to '
+                              'resume from where the killed program stopped.'))
+    parser.add_argument('--queue-wait', action="store_true",
+                        help=('With --queue, once every text file has been '
+                              'taken, wait until the text files taken by the '
+                              'other programs are done, taking over those '
+                              'whose claim expires, rather than exiting. The '
+                              'program keeps its resources while it waits.'))
+    return parser
+
+def create_script_parser(description: str, backend_name: str
+                         ) -> argparse.ArgumentParser:
+    '''
+    :param description: Description of the tagging script.
+    :param backend_name: Name of the backend the script uses, see
+                         `create_parser`.
+    :returns: The argument parser of the hand written example scripts that
+              tag one text file with their own tagging loop, e.g. to show
+              how to measure the resources used, which only has the
+              arguments they all use: the text file, the output file, the
+              batch size, and for the `stanza` backend the directory of the
+              pre-trained stanza models and `--offline`. A script adds any
+              other argument it uses itself, thus it does not accept the
+              arguments of `create_parser` that it would ignore.
+    '''
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('text_file_path', type=file_path,
+                        help='File path to the text to process e.g. Alice in Wonderland.')
+    parser.add_argument('output_file_path', type=file_path,
+                        help='File path to output the processed data too.')
+    parser.add_argument('batch_size', type=int,
+                        help='Number of paragraphs of text for the model to process at a time.')
+    if backend_name == 'stanza':
+        parser.add_argument('stanza_model_directory', type=file_path,
+                            help='Directory to store the pre-trained stanza models.')
+        parser.add_argument('--offline', action="store_true",
+                            help=('Never download the stanza models, fail if '
+                                  'they have not been downloaded through '
+                                  'download_stanza.py'))
+    return parser
+
+def create_estimate_parser(description: str, backend_name: str
+                           ) -> argparse.ArgumentParser:
+    '''
+    :param description: Description of the estimating program.
+    :param backend_name: Name of the backend the program uses, see
+                         `create_parser`.
+    :returns: The argument parser of the programs that estimate the SGE
+              resources needed to tag the text files, see `estimate_main`.
+    '''
+    parser = argparse.ArgumentParser(description=description)
+    _add_text_file_argument(parser)
+    _add_model_arguments(parser, backend_name)
+    _add_text_selection_arguments(parser)
+    parser.add_argument('--sample-paragraphs', type=int, default=1000,
+                        metavar='PARAGRAPHS',
+                        help=('Number of paragraphs, sampled from all of the '
+                              'text files stratified by length, to tag.'))
+    parser.add_argument('--memory-margin', type=float, default=0.25,
+                        metavar='FRACTION',
+                        help=('Fraction of the estimated peak memory to add '
+                              'to h_vmem, which is rounded up to a whole GB.'))
+    parser.add_argument('--time-margin', type=float, default=0.5,
+                        metavar='FRACTION',
+                        help=('Fraction of the estimated run time to add to '
+                              'h_rt, which is rounded up to a whole minute.'))
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Seed of the random sample of paragraphs.')
+    return parser
+
+def create_serve_parser(description: str, backend_name: str
+                        ) -> argparse.ArgumentParser:
+    '''
+    :param description: Description of the server program.
+    :param backend_name: Name of the backend the program uses, see
+                         `create_parser`.
+    :returns: The argument parser of the programs that serve a loaded model,
+              see `serve_main`.
+    '''
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('socket_path', type=file_path,
+                        help=('File path of the Unix socket to listen on, '
+                              'given to the tagging program through --server.'))
+    _add_model_arguments(parser, backend_name)
+    parser.add_argument('--max-wait', type=float, default=0.01, metavar='SECONDS',
+                        help=('Maximum seconds to wait for paragraphs from '
+                              'other clients to process in the same batch.'))
+    return parser
+
+def backend_from_arguments(backend_name: str, args: argparse.Namespace,
+                           use_gpu: bool = False) -> TaggingBackend:
+    '''
+    :param backend_name: Name of the backend to create.
+    :param args: Arguments parsed by the parser from `create_parser`.
+    :param use_gpu: Use a GPU even if the `--gpu` flag was not given.
+    :returns: The backend, the model is not loaded. A
+              `hec_tagging.server.RemoteBackend` if the `--server` argument
+              was given, wrapped by a
+              `hec_tagging.splitting.SplittingBackend` if the
+              `--max-paragraph-chars` argument was given.
+    '''
+    backend: TaggingBackend
+    if getattr(args, 'server', None) is not None:
+        backend = RemoteBackend(args.server, args.batch_size)
+    else:
+        backend_kwargs = {'batch_size': args.batch_size,
+                          'use_gpu': use_gpu or args.gpu}
+        if backend_name == 'stanza':
+            backend_kwargs['model_directory'] = args.stanza_model_directory
+            backend_kwargs['offline'] = args.offline
+            backend_kwargs['quantize'] = args.quantize
+        backend = create_backend(backend_name, **backend_kwargs)
+    if args.max_paragraph_chars is not None:
+        backend = SplittingBackend(backend, args.max_paragraph_chars)
+    return backend
+
+def log_latencies(logger: logging.Logger, statistics: TaggingStatistics) -> None:
+    '''
+    Logs the throughput and the batch and paragraph latency percentiles.
+    '''
+    logger.info(f'Throughput: {statistics.paragraphs_per_second:.2f} paragraphs/s, '
+                f'{statistics.characters_per_second:.2f} characters/s')
+    logger.info(f'Batch time: {format_percentiles(statistics.batch_latency)}')
+    logger.info('Paragraph time: '
+                f'{format_percentiles(statistics.paragraph_latency)}')
+
+class MetricsLogger():
+    '''
+    Given each tagged batch, see `hec_tagging.engine.tag_file`, logs the
+    statistics of all of the batches so far at most every `interval` seconds.
+    '''
+
+    def __init__(self, interval: float, logger: logging.Logger) -> None:
+        self.interval = interval
+        self.logger = logger
+        self.statistics = TaggingStatistics()
+        self._last_log_time = time.perf_counter()
+
+    def __call__(self, tagged_batch: TaggedBatch) -> None:
+        self.statistics.update(tagged_batch)
+        if time.perf_counter() - self._last_log_time < self.interval:
+            return
+        self.logger.info('Paragraphs processed so far: '
+                         f'{self.statistics.number_paragraphs}')
+        log_latencies(self.logger, self.statistics)
+        self._last_log_time = time.perf_counter()
+
+def main(backend_name: str, description: str, use_gpu: bool = False,
+         argv: Optional[List[str]] = None) -> TaggingStatistics:
+    '''
+    Command line program that tags one or more text files with the given
+    backend and writes the Named Entities found in each to a TSV file.
+
+    :param backend_name: Name of the backend to tag with.
+    :param description: Description of the program.
+    :param use_gpu: Use a GPU even if the `--gpu` flag was not given.
+    :param argv: Command line arguments, if None `sys.argv` is used.
+    :returns: Statistics from tagging the text.
+    '''
+    parser = create_parser(description, backend_name)
+    args = parser.parse_args(argv)
+
+    logger = get_stdout_logger(__name__)
+    backend = backend_from_arguments(backend_name, args, use_gpu)
+    sampler: Optional[TelemetrySampler] = None
+    if args.telemetry_interval is not None:
+        sampler = TelemetrySampler(telemetry_fp(args.output_file_path),
+                                   args.telemetry_interval, backend.use_gpu)
+        sampler.start()
+    try:
+        statistics, wall_clock_time = _tag(backend, args, logger)
+    finally:
+        if sampler is not None:
+            sampler.stop()
+
+    logger.info(f'Total processing time: {statistics.processing_time:.4f}s')
+    if args.workers > 1:
+        logger.info(f'Wall clock time with {args.workers} workers: '
+                    f'{wall_clock_time:.4f}s')
+    if statistics.number_files > 1:
+        logger.info(f'Number of text files {statistics.number_files}')
+    logger.info(f'Number of paragraphs in the text file {statistics.number_paragraphs}')
+    logger.info(f'Number batches {statistics.number_batches}')
+    log_latencies(logger, statistics)
+    if sampler is not None:
+        logger.info(f'Peak sampled RAM memory used {sampler.peak_rss:.4f}GB')
+        if sampler.use_gpu:
+            logger.info('Peak sampled GPU memory used '
+                        f'{sampler.peak_gpu_memory:.4f}GB')
+        logger.info(f'{sampler.number_samples} telemetry samples written to '
+                    f'{sampler.output_fp}')
+    return statistics
+
+def estimate_main(backend_name: str, description: str, use_gpu: bool = False,
+                  argv: Optional[List[str]] = None) -> ResourceEstimate:
+    '''
+    Command line program that tags a sample of the paragraphs in one or more
+    text files, estimates the peak memory and the time to tag all of the
+    text files, see `hec_tagging.estimate.estimate_resources`, and prints the
+    SGE `h_vmem` and `h_rt` directives for a job that tags them.
+
+    :param backend_name: Name of the backend to tag with.
+    :param description: Description of the program.
+    :param use_gpu: Use a GPU even if the `--gpu` flag was not given.
+    :param argv: Command line arguments, if None `sys.argv` is used.
+    :returns: The estimated resources.
+    '''
+    parser = create_estimate_parser(description, backend_name)
+    args = parser.parse_args(argv)
+
+    logger = get_stdout_logger(__name__)
+    backend = backend_from_arguments(backend_name, args, use_gpu)
+    # Only the text files are needed, the output file paths are not used.
+    file_pairs = resolve_file_pairs(args.text_file_path, args.text_file_path,
+                                    args.manifest, args.pattern)
+    # A text file split into parts, see `hec_tagging.planner`, is estimated
+    # as a whole.
+    text_fps = list(dict.fromkeys(file_pair.text_fp for file_pair in file_pairs))
+    estimate = estimate_resources(backend, text_fps,
+                                  args.sample_paragraphs, args.seed)
+    logger.info(f'Estimated model load time {estimate.load_time:.4f}s')
+    logger.info('Estimated processing time '
+                f'{format_sge_time(estimate.processing_time)} '
+                f'({estimate.processing_time:.4f}s)')
+    logger.info(f'Estimated peak RAM memory used {estimate.peak_memory:.4f}GB')
+    print('\n'.join(sge_resource_directives(estimate, args.memory_margin,
+                                            args.time_margin)))
+    return estimate
+
+def serve_main(backend_name: str, description: str, use_gpu: bool = False,
+               argv: Optional[List[str]] = None) -> None:
+    '''
+    Command line program that loads the backend's model once and tags the
+    paragraphs sent by tagging programs run with the `--server` argument,
+    see `hec_tagging.server.TaggingServer`, until it is stopped.
+
+    :param backend_name: Name of the backend to tag with.
+    :param description: Description of the program.
+    :param use_gpu: Use a GPU even if the `--gpu` flag was not given.
+    :param argv: Command line arguments, if None `sys.argv` is used.
+    '''
+    parser = create_serve_parser(description, backend_name)
+    args = parser.parse_args(argv)
+
+    backend = backend_from_arguments(backend_name, args, use_gpu)
+    TaggingServer(backend, args.socket_path, args.max_wait).serve_forever()
+
+def _check_quantization(backend: TaggingBackend, file_pairs: List[FilePair],
+                        args: argparse.Namespace, logger: logging.Logger) -> None:
+    '''
+    Compares the int8 quantized models to the fp32 models on a sample of the
+    paragraphs of the text files, see `--quantize-check`, loading the fp32
+    models separately from the backend.
+
+    :raises ValueError: If the F1 of the int8 entities against the fp32
+                        entities is below `--quantize-min-f1`.
+    '''
+    if isinstance(backend, SplittingBackend):
+        backend = backend.backend
+    if not isinstance(backend, StanzaBackend):
+        return
+    fp32_backend = copy.copy(backend)
+    fp32_backend.quantize = False
+    fp32_backend.nlp = None
+    text_fps = list(dict.fromkeys(file_pair.text_fp for file_pair in file_pairs))
+    _, paragraphs = profile_corpus(text_fps, backend.batch_size, args.quantize_check)
+    report = check_quantization(fp32_backend, paragraphs)
+    del fp32_backend
+    logger.info(f'Quantization check: {format_quantization_report(report)}')
+    if report.f1 < args.quantize_min_f1:
+        raise ValueError(f'The int8 entities only agree with the fp32 entities '
+                         f'with an F1 of {report.f1:.4f}, below the '
+                         f'--quantize-min-f1 of {args.quantize_min_f1}')
+
+def _tag(backend: TaggingBackend, args: argparse.Namespace,
+         logger: logging.Logger) -> Tuple[TaggingStatistics, float]:
+    '''
+    :returns: The statistics from tagging the files given by the arguments and
+              the wall clock time taken to tag them, excluding tuning.
+    '''
+    file_pairs = resolve_file_pairs(args.text_file_path, args.output_file_path,
+                                    args.manifest, args.pattern,
+                                    WRITERS[args.output_format].suffix)
+    if getattr(args, 'quantize_check', None) is not None and args.quantize:
+        _check_quantization(backend, file_pairs, args, logger)
+    file_callbacks: List[Callable[[FilePair, TaggingStatistics], None]] = []
+    tagged_with: Optional[str] = None
+    if args.incremental:
+        # The model is loaded to get its identity, with worker processes
+        # this model should not be given to them.
+        identity_backend = copy.copy(backend) if args.workers > 1 else backend
+        model_identity = identity_backend.model_identity()
+        del identity_backend
+        settings = {'batch_size': args.batch_size, 'auto_batch': args.auto_batch,
+                    'memory_cap': args.memory_cap,
+                    'max_batch_tokens': args.max_batch_tokens,
+                    'output_format': args.output_format}
+        file_pairs, up_to_date = partition_file_pairs(file_pairs, model_identity,
+                                                      settings)
+        logger.info(f'{len(up_to_date)} text files are up to date, '
+                    f'{len(file_pairs)} text files to process')
+        for file_pair in file_pairs:
+            if tagging_record_fp(file_pair.output_fp).exists():
+                tagging_record_fp(file_pair.output_fp).unlink()
+        # A checkpoint, even a complete one, of output tagged with a
+        # different model or settings is not resumed from.
+        tagged_with = json.dumps({'model_identity': model_identity,
+                                  'settings': settings}, sort_keys=True)
+
+        def write_record(file_pair: FilePair, _: TaggingStatistics) -> None:
+            write_tagging_record(file_pair.text_fp, file_pair.output_fp,
+                                 model_identity, settings, part=file_pair.part)
+
+        file_callbacks.append(write_record)
+        if not file_pairs:
+            return TaggingStatistics(), 0.0
+    work_queue: Optional[WorkQueue] = None
+    if args.queue is not None:
+        work_queue = WorkQueue(args.queue, args.lease_time)
+        # The last text files taken, while the other programs finish, are
+        # then the smallest.
+        file_pairs = sorted(file_pairs, reverse=True,
+                            key=lambda file_pair: file_pair.text_size)
+        # Marked done after any tagging record is written.
+        complete = work_queue.complete
+        file_callbacks.append(lambda file_pair, _: complete(file_pair))
+    if args.auto_batch:
+        paragraphs = sample_paragraphs((file_pair.text_fp for file_pair in file_pairs),
+                                       args.auto_batch_sample)
+        # The worker processes load their own model, thus the model loaded
+        # for tuning should not be given to them.
+        tuning_backend = copy.copy(backend) if args.workers > 1 else backend
+        backend.batch_size = tune_batch_size(tuning_backend, paragraphs,
+                                             args.batch_size, args.memory_cap)
+        del tuning_backend
+    if args.cache is not None:
+        # (1024**3) converts it to bytes from GB
+        backend = CachedBackend(backend, args.cache, int(args.cache_size * (1024**3)))
+    on_batch: Optional[MetricsLogger] = None
+    if args.metrics_interval is not None:
+        on_batch = MetricsLogger(args.metrics_interval, logger)
+    progress: Optional[ProgressReporter] = None
+    if args.progress_interval is not None:
+        total_bytes = sum(file_pair.text_size for file_pair in file_pairs)
+        progress = ProgressReporter(total_bytes, args.progress_interval,
+                                    logger=logger)
+
+    def on_file(file_pair: FilePair, file_statistics: TaggingStatistics) -> None:
+        for file_callback in file_callbacks:
+            file_callback(file_pair, file_statistics)
+
+    tagged_file_pairs: Iterable[FilePair] = file_pairs
+    should_stop: Optional[Callable[[FilePair], bool]] = None
+    if work_queue is not None:
+        on_done: Optional[Callable[[FilePair], None]] = None
+        if progress is not None:
+            # Text files processed by the other programs count as processed.
+            skip_file = progress.skip_file
+            on_done = lambda file_pair: skip_file(file_pair.text_fp, file_pair.part)
+        tagged_file_pairs = work_queue.claims(file_pairs, on_done, args.queue_wait)
+        should_stop = work_queue.lost
+        work_queue.start()
+    start_time = time.perf_counter()
+    try:
+        statistics = tag_files(tagged_file_pairs, backend, args.workers,
+                               args.checkpoint_interval, args.max_batch_tokens,
+                               args.output_format, on_batch, progress, on_file,
+                               tagged_with, should_stop)
+    finally:
+        if work_queue is not None:
+            work_queue.stop()
+    end_time = time.perf_counter()
+    if work_queue is not None:
+        logger.info(f'Processed {work_queue.number_claimed} of {len(file_pairs)} '
+                    f'text files from the queue {args.queue}, '
+                    f'{work_queue.number_expired} after their claim expired, '
+                    f'{work_queue.number_lost} stopped as their claim was '
+                    'taken by another program')
+    if isinstance(backend, CachedBackend) and backend.cache is not None:
+        # With worker processes each worker has its own cache counts.
+        logger.info(f'Paragraph cache hits {backend.cache.hits}, misses '
+                    f'{backend.cache.misses}')
+    return statistics, end_time - start_time
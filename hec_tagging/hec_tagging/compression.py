@@ -0,0 +1,142 @@
+import io
+from pathlib import Path
+from typing import BinaryIO, Dict, Optional
+
+# The magic bytes that each compressed file starts with.
+COMPRESSIONS: Dict[str, bytes] = {'gzip': b'\x1f\x8b',
+                                  'bz2': b'BZh',
+                                  'xz': b'\xfd7zXZ\x00',
+                                  'zstd': b'\x28\xb5\x2f\xfd'}
+# File extension of each compression.
+COMPRESSION_SUFFIXES: Dict[str, str] = {'gzip': '.gz', 'bz2': '.bz2',
+                                        'xz': '.xz', 'zstd': '.zst'}
+
+def detect_compression(fp: Path) -> Optional[str]:
+    '''
+    :param fp: File path to a file.
+    :returns: The compression of the file, one of the keys in `COMPRESSIONS`,
+              from the magic bytes it starts with, None if it is not
+              compressed.
+    '''
+    with fp.open('rb') as _file:
+        start = _file.read(max(len(magic) for magic in COMPRESSIONS.values()))
+    for compression, magic in COMPRESSIONS.items():
+        if start.startswith(magic):
+            return compression
+    return None
+
+def strip_compression_suffix(fp: Path) -> Path:
+    '''
+    :param fp: A file path.
+    :returns: The file path without the file extension of a compression,
+              e.g. `0.txt` for `0.txt.gz`.
+    '''
+    if fp.suffix in COMPRESSION_SUFFIXES.values():
+        return fp.with_suffix('')
+    return fp
+
+def _check_compression(compression: str) -> None:
+    if compression not in COMPRESSIONS:
+        raise ValueError(f'Unknown compression: {compression}, the known '
+                         f'compressions are: {sorted(COMPRESSIONS)}')
+
+def decompress_stream(raw_file: BinaryIO, compression: str) -> BinaryIO:
+    '''
+    :param raw_file: Binary stream of the compressed data, it is not closed
+                     when the returned stream is closed, thus its position
+                     is how much of the compressed data has been read.
+    :param compression: The compression of the data, one of the keys in
+                        `COMPRESSIONS`. `zstd` requires the `zstandard`
+                        package.
+    :returns: A binary stream of the data, decompressed as it is read.
+    :raises ValueError: If the compression is not known.
+    '''
+    _check_compression(compression)
+    if compression == 'gzip':
+        import gzip
+        return gzip.GzipFile(fileobj=raw_file, mode='rb')  # type: ignore[return-value]
+    if compression == 'bz2':
+        import bz2
+        return bz2.BZ2File(raw_file, mode='rb')  # type: ignore[return-value]
+    if compression == 'xz':
+        import lzma
+        return lzma.LZMAFile(raw_file, mode='rb')  # type: ignore[return-value]
+    import zstandard
+    return zstandard.ZstdDecompressor().stream_reader(raw_file, closefd=False)  # type: ignore[return-value]
+
+class _CompressedOutput(io.RawIOBase):
+    '''
+    Writes through a compressor to a file, closing both, as the compressors
+    do not close a file they are given.
+    '''
+
+    def __init__(self, compression: str, compressor: BinaryIO,
+                 raw_file: BinaryIO) -> None:
+        self.compression = compression
+        self.compressor = compressor
+        self.raw_file = raw_file
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:  # type: ignore[override]
+        self.compressor.write(data)
+        return len(data)
+
+    def flush(self) -> None:
+        # Also called by `close` once the compressor has been closed.
+        if self.closed or self.compressor.closed:
+            return
+        # gzip and zstd can end a block part way through the stream, thus
+        # everything written so far can be decompressed from the file, bz2
+        # and xz keep their current block until they are closed.
+        if self.compression in ('gzip', 'zstd'):
+            self.compressor.flush()
+        self.raw_file.flush()
+
+    def fileno(self) -> int:
+        return self.raw_file.fileno()
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        try:
+            self.compressor.close()
+            self.raw_file.flush()
+        finally:
+            self.raw_file.close()
+            super().close()
+
+def open_compressed(fp: Path, compression: str,
+                    buffer_size: int = io.DEFAULT_BUFFER_SIZE) -> BinaryIO:
+    '''
+    :param fp: File path to write the compressed data too, overwritten if it
+               exists.
+    :param compression: Compression to use, one of the keys in
+                        `COMPRESSIONS`. `zstd` requires the `zstandard`
+                        package.
+    :param buffer_size: Size in bytes of the buffer of the file.
+    :returns: A binary stream that compresses the data written to it into the
+              file, its `fileno` is that of the file.
+    :raises ValueError: If the compression is not known.
+    '''
+    _check_compression(compression)
+    if compression == 'zstd':
+        # Imported before the file is created, thus a missing package does
+        # not leave an empty file behind.
+        import zstandard
+    raw_file = fp.open('wb', buffering=buffer_size)
+    compressor: BinaryIO
+    if compression == 'gzip':
+        import gzip
+        compressor = gzip.GzipFile(fileobj=raw_file, mode='wb')  # type: ignore[assignment]
+    elif compression == 'bz2':
+        import bz2
+        compressor = bz2.BZ2File(raw_file, mode='wb')  # type: ignore[assignment]
+    elif compression == 'xz':
+        import lzma
+        compressor = lzma.LZMAFile(raw_file, mode='wb')  # type: ignore[assignment]
+    else:
+        compressor = zstandard.ZstdCompressor().stream_writer(raw_file,
+                                                               closefd=False)
+    return _CompressedOutput(compression, compressor, raw_file)  # type: ignore[return-value]
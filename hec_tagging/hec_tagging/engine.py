@@ -0,0 +1,440 @@
+from pathlib import Path
+from typing import (Any, Callable, Dict, Iterable, List, NamedTuple, Optional,
+                    Tuple, TYPE_CHECKING)
+import time
+
+from .archives import close_archives
+from .backends import Entity, TaggingBackend
+from .checkpoint import Checkpointer
+from .files import FilePair, TextPart
+from .metrics import LatencyHistogram
+from .reader import ParagraphOffsets
+from .writers import BackgroundWriter, EntityWriter, WRITERS, create_writer
+
+if TYPE_CHECKING:
+    from .parallel import TaggingPool
+    from .progress import ProgressReporter
+
+# Number of paragraphs that are sorted by length together when batching by
+# a token budget, see `plan_batches`.
+DEFAULT_SORT_WINDOW = 1000
+
+class TaggedBatch(NamedTuple):
+    '''
+    The result of tagging one batch of paragraphs. When batching by a token
+    budget, see `plan_batches`, this is the result of tagging a window of
+    paragraphs over `number_batches` batches.
+    '''
+    start_paragraph_number: int
+    paragraphs: List[str]
+    entities: List[List[Entity]]
+    processing_time: float
+    number_batches: int = 1
+
+class TaggingStatistics():
+    '''
+    Statistics collected while tagging. The batch and paragraph latencies are
+    stored in fixed size histograms, see
+    `hec_tagging.metrics.LatencyHistogram`, thus the memory used does not
+    grow with the number of batches. The paragraph latency is the time of the
+    batch the paragraph was in divided by the number of paragraphs in the
+    batch.
+    '''
+
+    def __init__(self) -> None:
+        self.number_files = 0
+        # Files whose tagging was stopped part way through, see `tag_file`.
+        self.number_stopped_files = 0
+        self.number_paragraphs = 0
+        self.number_characters = 0
+        self.number_batches = 0
+        self.processing_time = 0.0
+        self.batch_latency = LatencyHistogram()
+        self.paragraph_latency = LatencyHistogram()
+
+    @property
+    def paragraphs_per_second(self) -> float:
+        if not self.processing_time:
+            return 0.0
+        return self.number_paragraphs / self.processing_time
+
+    @property
+    def characters_per_second(self) -> float:
+        if not self.processing_time:
+            return 0.0
+        return self.number_characters / self.processing_time
+
+    def update(self, tagged_batch: TaggedBatch) -> None:
+        number_paragraphs = len(tagged_batch.paragraphs)
+        self.number_paragraphs += number_paragraphs
+        self.number_characters += sum(len(paragraph)
+                                      for paragraph in tagged_batch.paragraphs)
+        self.number_batches += tagged_batch.number_batches
+        self.processing_time += tagged_batch.processing_time
+        # A window of paragraphs tagged over many batches, see `plan_batches`,
+        # only has the total time of those batches.
+        self.batch_latency.record(tagged_batch.processing_time
+                                  / tagged_batch.number_batches,
+                                  tagged_batch.number_batches)
+        if number_paragraphs:
+            self.paragraph_latency.record(tagged_batch.processing_time
+                                          / number_paragraphs, number_paragraphs)
+
+    def combine(self, other: 'TaggingStatistics') -> None:
+        '''
+        :param other: Statistics from tagging other files, which are added to
+                      these statistics.
+        '''
+        self.number_files += other.number_files
+        self.number_stopped_files += other.number_stopped_files
+        self.number_paragraphs += other.number_paragraphs
+        self.number_characters += other.number_characters
+        self.number_batches += other.number_batches
+        self.processing_time += other.processing_time
+        self.batch_latency.merge(other.batch_latency)
+        self.paragraph_latency.merge(other.paragraph_latency)
+
+    def snapshot(self) -> Dict[str, Any]:
+        '''
+        :returns: The counts, throughput, and the batch and paragraph latency
+                  summaries, see `hec_tagging.metrics.LatencyHistogram.summary`.
+        '''
+        return {'number_files': self.number_files,
+                'number_stopped_files': self.number_stopped_files,
+                'number_paragraphs': self.number_paragraphs,
+                'number_characters': self.number_characters,
+                'number_batches': self.number_batches,
+                'processing_time': self.processing_time,
+                'paragraphs_per_second': self.paragraphs_per_second,
+                'characters_per_second': self.characters_per_second,
+                'batch_latency': self.batch_latency.summary(),
+                'paragraph_latency': self.paragraph_latency.summary()}
+
+def batch_paragraphs(paragraphs: Iterable[str], batch_size: int
+                     ) -> Iterable[List[str]]:
+    '''
+    :param paragraphs: Paragraphs to batch.
+    :param batch_size: Number of paragraphs in each batch.
+    :returns: Yields lists of `batch_size` paragraphs, the last batch can
+              contain fewer paragraphs.
+    '''
+    batch: List[str] = []
+    for paragraph in paragraphs:
+        batch.append(paragraph)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def approximate_tokens(paragraph: str) -> int:
+    '''
+    :param paragraph: A paragraph of text.
+    :returns: Number of white space separated tokens in the paragraph, an
+              approximation of the number of tokens the model processes.
+    '''
+    return len(paragraph.split())
+
+def length_bucketed_batches(paragraphs: List[str], batch_size: int,
+                            max_batch_tokens: int) -> List[List[int]]:
+    '''
+    Groups paragraphs of similar length into batches, whereby the number of
+    tokens in a batch, including the padding of each paragraph to the
+    longest paragraph, is at most `max_batch_tokens`.
+
+    :param paragraphs: Paragraphs to batch.
+    :param batch_size: Maximum number of paragraphs in each batch.
+    :param max_batch_tokens: Maximum number of tokens in each batch, see
+                             `approximate_tokens`. A paragraph with more
+                             tokens than this is a batch by itself.
+    :returns: The batches, each a list of indexes of `paragraphs`, from the
+              shortest paragraphs to the longest.
+    '''
+    lengths = [approximate_tokens(paragraph) for paragraph in paragraphs]
+    batches: List[List[int]] = []
+    batch: List[int] = []
+    for index in sorted(range(len(paragraphs)), key=lengths.__getitem__):
+        # As the paragraphs are sorted this is the longest in the batch.
+        padded_tokens = (len(batch) + 1) * lengths[index]
+        if batch and (len(batch) == batch_size or padded_tokens > max_batch_tokens):
+            batches.append(batch)
+            batch = []
+        batch.append(index)
+    if batch:
+        batches.append(batch)
+    return batches
+
+def plan_batches(paragraphs: Iterable[str], batch_size: int,
+                 max_batch_tokens: Optional[int] = None,
+                 sort_window: int = DEFAULT_SORT_WINDOW
+                 ) -> Iterable[Tuple[List[str], List[List[int]]]]:
+    '''
+    :param paragraphs: Paragraphs to batch.
+    :param batch_size: Maximum number of paragraphs in each batch.
+    :param max_batch_tokens: If given, each window of `sort_window`
+                             paragraphs is batched by
+                             `length_bucketed_batches`, else the paragraphs
+                             are batched in order by `batch_paragraphs`.
+    :param sort_window: Number of paragraphs sorted by length together, the
+                        larger the window the more similar the lengths of
+                        the paragraphs in each batch.
+    :returns: Yields a window of paragraphs in order and the batches of that
+              window, each a list of indexes of the window.
+    '''
+    if max_batch_tokens is None:
+        for batch in batch_paragraphs(paragraphs, batch_size):
+            yield batch, [list(range(len(batch)))]
+        return
+    for window in batch_paragraphs(paragraphs, sort_window):
+        yield window, length_bucketed_batches(window, batch_size, max_batch_tokens)
+
+def tag_batches(paragraphs: Iterable[str], backend: TaggingBackend,
+                start_paragraph_number: int = 0,
+                max_batch_tokens: Optional[int] = None,
+                sort_window: int = DEFAULT_SORT_WINDOW) -> Iterable[TaggedBatch]:
+    '''
+    :param paragraphs: Paragraphs to tag.
+    :param backend: Backend that tags the paragraphs, batched by the
+                    backend's batch size.
+    :param start_paragraph_number: Paragraph number of the first paragraph.
+    :param max_batch_tokens: If given, paragraphs of similar length are
+                             batched together under this token budget, see
+                             `plan_batches`. The tagged batches are still
+                             yielded in paragraph order.
+    :param sort_window: See `plan_batches`.
+    :returns: Yields the tagged batches in paragraph order.
+    '''
+    if not backend.loaded:
+        backend.load()
+    paragraph_number = start_paragraph_number
+    for window, batches in plan_batches(paragraphs, backend.batch_size,
+                                        max_batch_tokens, sort_window):
+        window_entities: List[List[Entity]] = [[] for _ in window]
+        processing_time = 0.0
+        for batch in batches:
+            start_time = time.perf_counter()
+            batch_entities = backend.tag_batch([window[index] for index in batch])
+            end_time = time.perf_counter()
+            processing_time += end_time - start_time
+            for index, paragraph_entities in zip(batch, batch_entities):
+                window_entities[index] = paragraph_entities
+        yield TaggedBatch(paragraph_number, window, window_entities,
+                          processing_time, len(batches))
+        paragraph_number += len(window)
+
+def write_tagged_batch(writer: EntityWriter, tagged_batch: TaggedBatch) -> None:
+    '''
+    :param writer: Writer to write the Named Entities of the batch too.
+    :param tagged_batch: The tagged batch to write.
+    '''
+    paragraph_number = tagged_batch.start_paragraph_number
+    for paragraph_entities in tagged_batch.entities:
+        writer.write(paragraph_number, paragraph_entities)
+        paragraph_number += 1
+
+def tag_file(text_fp: Path, output_fp: Path, backend: TaggingBackend,
+             pool: Optional['TaggingPool'] = None,
+             checkpoint_interval: Optional[float] = None,
+             max_batch_tokens: Optional[int] = None,
+             output_format: str = 'tsv',
+             on_batch: Optional[Callable[[TaggedBatch], None]] = None,
+             progress: Optional['ProgressReporter'] = None,
+             part: Optional[TextPart] = None,
+             tagged_with: Optional[str] = None,
+             should_stop: Optional[Callable[[], bool]] = None
+             ) -> TaggingStatistics:
+    '''
+    Tags all of the paragraphs, see `yield_paragraphs`, in the text file
+    and writes the Named Entities found to the output file, by default a TSV
+    file, see `hec_tagging.writers.TSVWriter` for the structure of the TSV
+    file.
+
+    :param text_fp: File path to the text to tag.
+    :param output_fp: File path to output the Named Entities too.
+    :param backend: Backend that tags the paragraphs.
+    :param pool: If given the paragraphs are tagged by the pool's worker
+                 processes rather than the backend in this process.
+    :param checkpoint_interval: If given, a checkpoint is written at most
+                                every this many seconds and tagging resumes
+                                from the last checkpoint, see
+                                `hec_tagging.checkpoint.Checkpointer`. A text
+                                file that has been fully tagged is skipped.
+    :param max_batch_tokens: If given, paragraphs of similar length are
+                             batched together under this token budget, see
+                             `tag_batches`. When tagging with a pool, the
+                             pool's token budget is used instead.
+    :param output_format: Format of the output file, one of the keys in
+                          `hec_tagging.writers.WRITERS`.
+    :param on_batch: Called with each tagged batch after it has been
+                     written, e.g. to report progress.
+    :param progress: If given, reports the number of bytes of the text file
+                     that have been tagged after each batch is written, see
+                     `hec_tagging.progress.ProgressReporter`.
+    :param part: If given, only this part of the text file is tagged, the
+                 paragraph numbers are those of the whole text file.
+    :param tagged_with: If given, the identity of the model and settings,
+                        a checkpoint written with a different identity is
+                        not resumed from, see
+                        `hec_tagging.checkpoint.Checkpointer`.
+    :param should_stop: If given, called before each batch is written, if it
+                        returns True tagging stops without writing the
+                        entities not yet written or a checkpoint, e.g. as
+                        another job has taken over the text file, see
+                        `hec_tagging.work_queue.WorkQueue.lost`. The output
+                        file is left as it is, as the other job writes it,
+                        and the statistics count a stopped file rather than
+                        a tagged file.
+    :returns: Statistics from tagging the text.
+    :raises ValueError: If checkpointing with an output format that cannot
+                        be appended too.
+    '''
+    if (checkpoint_interval is not None and output_format in WRITERS
+            and not WRITERS[output_format].supports_append):
+        raise ValueError(f'Checkpoints cannot be used with the {output_format} '
+                         'output format, as it cannot be appended too.')
+    statistics = TaggingStatistics()
+    statistics.number_files = 1
+    checkpointer: Optional[Checkpointer] = None
+    start_paragraph_number = 0
+    start_offset = 0
+    end_offset: Optional[int] = None
+    if part is not None:
+        start_paragraph_number, start_offset, end_offset = part
+    append = False
+    if checkpoint_interval is not None:
+        checkpointer = Checkpointer(text_fp, output_fp, checkpoint_interval,
+                                    start_paragraph_number, start_offset,
+                                    tagged_with, part)
+        if checkpointer.complete:
+            statistics.number_files = 0
+            if progress is not None:
+                progress.skip_file(text_fp, part)
+            return statistics
+        append = checkpointer.prepare_output()
+        start_paragraph_number = checkpointer.start_paragraph_number
+        start_offset = checkpointer.start_offset
+    paragraph_offsets = ParagraphOffsets(text_fp, start_offset,
+                                         end_offset=end_offset)
+    paragraphs = paragraph_offsets.paragraphs()
+    if progress is not None:
+        progress.start_file(text_fp, paragraph_offsets.input_offset, part)
+    if pool is None:
+        tagged_batches = tag_batches(paragraphs, backend, start_paragraph_number,
+                                     max_batch_tokens)
+    else:
+        tagged_batches = pool.tag_batches(paragraphs, start_paragraph_number)
+    # Writing the entities on a background thread keeps the file system off
+    # the tagging loop.
+    with BackgroundWriter(create_writer(output_format, output_fp,
+                                        append=append)) as writer:
+        for tagged_batch in tagged_batches:
+            if should_stop is not None and should_stop():
+                writer.discard()
+                statistics.number_files = 0
+                statistics.number_stopped_files = 1
+                if progress is not None:
+                    progress.abandon_file()
+                return statistics
+            write_tagged_batch(writer, tagged_batch)
+            statistics.update(tagged_batch)
+            text_offset = paragraph_offsets.processed(len(tagged_batch.paragraphs))
+            if on_batch is not None:
+                on_batch(tagged_batch)
+            if progress is not None:
+                progress.update(paragraph_offsets.input_offset)
+            if (checkpointer is not None
+                    and checkpointer.batch_written(len(tagged_batch.paragraphs),
+                                                   text_offset)):
+                checkpointer.write(writer.flush())
+        if checkpointer is not None:
+            checkpointer.write(writer.flush(), complete=True)
+    if progress is not None:
+        progress.finish_file()
+    return statistics
+
+def _file_should_stop(should_stop: Optional[Callable[[FilePair], bool]],
+                      file_pair: FilePair) -> Optional[Callable[[], bool]]:
+    if should_stop is None:
+        return None
+    return lambda: should_stop(file_pair)
+
+def tag_files(file_pairs: Iterable[FilePair], backend: TaggingBackend,
+              number_workers: int = 1,
+              checkpoint_interval: Optional[float] = None,
+              max_batch_tokens: Optional[int] = None,
+              output_format: str = 'tsv',
+              on_batch: Optional[Callable[[TaggedBatch], None]] = None,
+              progress: Optional['ProgressReporter'] = None,
+              on_file: Optional[Callable[[FilePair, TaggingStatistics], None]] = None,
+              tagged_with: Optional[str] = None,
+              should_stop: Optional[Callable[[FilePair], bool]] = None
+              ) -> TaggingStatistics:
+    '''
+    Tags each text file with `tag_file` using the same loaded model, thus the
+    model is only loaded once for all of the files. The paragraph numbers
+    start from 0 for each file, as if each file was tagged separately, or
+    from the first paragraph of the part of a file, see
+    `hec_tagging.files.FilePair`.
+
+    :param file_pairs: The text files to tag and the file to output each of
+                       their Named Entities too. The output directories are
+                       created if they do not exist.
+    :param backend: Backend that tags the paragraphs.
+    :param number_workers: If more than 1, the paragraphs are tagged by a
+                           `hec_tagging.parallel.TaggingPool` of this many
+                           worker processes, each loading the model once.
+    :param checkpoint_interval: See `tag_file`.
+    :param max_batch_tokens: See `tag_file`.
+    :param output_format: See `tag_file`.
+    :param on_batch: See `tag_file`.
+    :param progress: See `tag_file`, its total should be the size of all of
+                     the text files.
+    :param on_file: Called with each file pair, and the statistics from
+                    tagging it, after its output file has been fully
+                    written, thus not with a file pair whose tagging was
+                    stopped.
+    :param tagged_with: See `tag_file`.
+    :param should_stop: If given, called with the file pair being tagged
+                        before each batch is written, see `tag_file`.
+    :returns: Statistics from tagging all of the files.
+    '''
+    statistics = TaggingStatistics()
+    try:
+        if number_workers > 1:
+            from .parallel import TaggingPool
+
+            with TaggingPool(backend, number_workers,
+                             max_batch_tokens=max_batch_tokens) as pool:
+                for file_pair in file_pairs:
+                    file_pair.output_fp.parent.mkdir(parents=True, exist_ok=True)
+                    file_statistics = tag_file(file_pair.text_fp, file_pair.output_fp,
+                                               backend, pool, checkpoint_interval,
+                                               output_format=output_format,
+                                               on_batch=on_batch, progress=progress,
+                                               part=file_pair.part,
+                                               tagged_with=tagged_with,
+                                               should_stop=_file_should_stop(
+                                                   should_stop, file_pair))
+                    if (on_file is not None
+                            and not file_statistics.number_stopped_files):
+                        on_file(file_pair, file_statistics)
+                    statistics.combine(file_statistics)
+            return statistics
+        for file_pair in file_pairs:
+            file_pair.output_fp.parent.mkdir(parents=True, exist_ok=True)
+            file_statistics = tag_file(file_pair.text_fp, file_pair.output_fp,
+                                       backend, checkpoint_interval=checkpoint_interval,
+                                       max_batch_tokens=max_batch_tokens,
+                                       output_format=output_format,
+                                       on_batch=on_batch, progress=progress,
+                                       part=file_pair.part, tagged_with=tagged_with,
+                                       should_stop=_file_should_stop(should_stop,
+                                                                     file_pair))
+            if on_file is not None and not file_statistics.number_stopped_files:
+                on_file(file_pair, file_statistics)
+            statistics.combine(file_statistics)
+        return statistics
+    finally:
+        # The tar archive last read from is kept open until all of the files
+        # have been tagged.
+        close_archives()
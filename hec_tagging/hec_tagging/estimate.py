@@ -0,0 +1,250 @@
+import math
+from pathlib import Path
+import random
+import time
+from typing import Dict, List, NamedTuple, Sequence, Tuple
+
+from .backends import TaggingBackend
+from .reader import ParagraphIndex
+from .tuning import PeakMemory
+from .utils import get_stdout_logger
+
+class CorpusProfile(NamedTuple):
+    '''
+    The size of the text files to tag, from their paragraph indexes, see
+    `hec_tagging.reader.ParagraphIndex`. Bytes are the UTF-8 bytes of the
+    paragraphs.
+    '''
+    number_files: int
+    number_paragraphs: int
+    number_bytes: int
+    number_batches: int
+    # Bytes of the largest batch of consecutive paragraphs.
+    max_batch_bytes: int
+
+class LinearFit(NamedTuple):
+    '''
+    `y = intercept + slope * x`, fitted by least squares.
+    '''
+    intercept: float
+    slope: float
+
+    def __call__(self, x: float) -> float:
+        return self.intercept + self.slope * x
+
+class ResourceEstimate(NamedTuple):
+    '''
+    The estimated resources to tag all of the text files with one process.
+    '''
+    profile: CorpusProfile
+    load_time: float
+    processing_time: float
+    # Peak RAM of the process in GB.
+    peak_memory: float
+
+def _length_stratum(number_bytes: int) -> int:
+    # Strata of paragraph lengths that double in size.
+    return number_bytes.bit_length()
+
+def profile_corpus(text_fps: Sequence[Path], batch_size: int,
+                   number_sample: int = 0, seed: int = 0
+                   ) -> Tuple[CorpusProfile, List[str]]:
+    '''
+    Indexes each text file once, counting the paragraphs, bytes, and batches
+    of `batch_size` consecutive paragraphs, the batches `tag_file` tags, and
+    sampling paragraphs stratified by length. The paragraphs are put into
+    strata of lengths that double in size (1 byte, 2-3 bytes, 4-7 bytes,
+    ...) and the sample is split as evenly as possible between the strata,
+    thus the sample covers the short and the long paragraphs even when
+    either are rare.
+
+    :param text_fps: File paths to the texts.
+    :param batch_size: Number of paragraphs in a batch.
+    :param number_sample: Number of paragraphs to sample.
+    :param seed: Seed of the random sample.
+    :returns: The profile of the text files and the sampled paragraphs.
+    '''
+    random_generator = random.Random(seed)
+    # Reservoir sample of (file index, paragraph number) for each stratum.
+    reservoirs: Dict[int, List[Tuple[int, int]]] = {}
+    stratum_counts: Dict[int, int] = {}
+    number_paragraphs = number_bytes = number_batches = max_batch_bytes = 0
+    for file_index, text_fp in enumerate(text_fps):
+        with ParagraphIndex(text_fp) as index:
+            batch_bytes = 0
+            for paragraph_number in range(len(index)):
+                start, end = index.span(paragraph_number)
+                paragraph_bytes = end - start
+                number_bytes += paragraph_bytes
+                batch_bytes += paragraph_bytes
+                if (paragraph_number + 1) % batch_size == 0 \
+                        or paragraph_number + 1 == len(index):
+                    number_batches += 1
+                    max_batch_bytes = max(max_batch_bytes, batch_bytes)
+                    batch_bytes = 0
+                if not number_sample:
+                    continue
+                stratum = _length_stratum(paragraph_bytes)
+                count = stratum_counts.get(stratum, 0) + 1
+                stratum_counts[stratum] = count
+                reservoir = reservoirs.setdefault(stratum, [])
+                if len(reservoir) < number_sample:
+                    reservoir.append((file_index, paragraph_number))
+                else:
+                    replace_index = random_generator.randrange(count)
+                    if replace_index < number_sample:
+                        reservoir[replace_index] = (file_index, paragraph_number)
+            number_paragraphs += len(index)
+    profile = CorpusProfile(len(text_fps), number_paragraphs, number_bytes,
+                            number_batches, max_batch_bytes)
+
+    # Split the sample evenly between the strata, strata with fewer
+    # paragraphs than their share give the remainder to the other strata.
+    sample_locations: List[Tuple[int, int]] = []
+    remaining_sample = min(number_sample, number_paragraphs)
+    strata = sorted(reservoirs, key=lambda stratum: len(reservoirs[stratum]))
+    for number_strata_left, stratum in zip(range(len(strata), 0, -1), strata):
+        share = min(len(reservoirs[stratum]), remaining_sample // number_strata_left)
+        sample_locations.extend(random_generator.sample(reservoirs[stratum], share))
+        remaining_sample -= share
+    sample: List[str] = []
+    for file_index, text_fp in enumerate(text_fps):
+        paragraph_numbers = sorted(paragraph_number for _file_index, paragraph_number
+                                   in sample_locations if _file_index == file_index)
+        if not paragraph_numbers:
+            continue
+        with ParagraphIndex(text_fp) as index:
+            sample.extend(index[paragraph_number]
+                          for paragraph_number in paragraph_numbers)
+    return profile, sample
+
+def fit_line(xs: Sequence[float], ys: Sequence[float]) -> LinearFit:
+    '''
+    :param xs: Independent values.
+    :param ys: Dependent values.
+    :returns: The least squares line through the points, with a non negative
+              intercept and slope. With fewer than two distinct `xs` the line
+              goes through the origin and the mean of the points.
+    :raises ValueError: If there are no points.
+    '''
+    if not xs or len(xs) != len(ys):
+        raise ValueError('Fitting a line requires the same number of x and y '
+                         f'values, and at least one: {len(xs)} and {len(ys)}')
+    mean_x = sum(xs) / len(xs)
+    mean_y = sum(ys) / len(ys)
+    variance_x = sum((x - mean_x) ** 2 for x in xs)
+    if not variance_x:
+        return LinearFit(0.0, mean_y / mean_x if mean_x else 0.0)
+    slope = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / variance_x
+    slope = max(0.0, slope)
+    intercept = max(0.0, mean_y - slope * mean_x)
+    return LinearFit(intercept, slope)
+
+def estimate_resources(backend: TaggingBackend, text_fps: Sequence[Path],
+                       number_sample: int = 1000, seed: int = 0
+                       ) -> ResourceEstimate:
+    '''
+    Tags a sample of paragraphs, see `profile_corpus`, with the backend's
+    batch size and extrapolates the time and memory to all of the text
+    files. The sample is tagged in batches of paragraphs of similar length,
+    from the shortest to the longest, and two lines are fitted:
+
+    1. The time to tag a batch against the bytes in the batch, the processing
+       time is this line summed over all of the batches of the text files,
+       `number_batches * intercept + number_bytes * slope`.
+    2. The peak RAM of the process, which only increases, against the bytes
+       in the largest batch so far, the peak memory is this line at the
+       largest batch of the text files, or the peak of the sample if larger.
+
+    The estimate does not include the time to read the text files or write
+    the Named Entities, which is small compared to tagging.
+
+    :param backend: Backend to tag with, loaded if it has not been, the load
+                    time is measured.
+    :param text_fps: File paths to the texts that will be tagged.
+    :param number_sample: Number of paragraphs to tag.
+    :param seed: Seed of the random sample.
+    :returns: The estimated resources.
+    :raises ValueError: If the text files do not contain any paragraphs.
+    '''
+    logger = get_stdout_logger(__name__)
+    profile, sample = profile_corpus(text_fps, backend.batch_size, number_sample,
+                                     seed)
+    if not sample:
+        raise ValueError('The text files do not contain any paragraphs to '
+                         'estimate the resources from')
+    logger.info(f'{profile.number_files} text files, {profile.number_paragraphs} '
+                f'paragraphs, {profile.number_bytes} bytes, '
+                f'{profile.number_batches} batches of up to {backend.batch_size} '
+                f'paragraphs, largest batch {profile.max_batch_bytes} bytes')
+
+    peak_memory = PeakMemory()
+    load_time = 0.0
+    if not backend.loaded:
+        load_start_time = time.perf_counter()
+        backend.load()
+        load_time = time.perf_counter() - load_start_time
+    # The first call of a model can include one off setup costs.
+    backend.tag_batch(sample[:1])
+    sample.sort(key=len)
+    batch_bytes: List[float] = []
+    batch_times: List[float] = []
+    batch_peak_memory: List[float] = []
+    for batch_start in range(0, len(sample), backend.batch_size):
+        batch = sample[batch_start: batch_start + backend.batch_size]
+        start_time = time.perf_counter()
+        backend.tag_batch(batch)
+        batch_times.append(time.perf_counter() - start_time)
+        batch_bytes.append(sum(len(paragraph.encode('utf-8'))
+                               for paragraph in batch))
+        batch_peak_memory.append(peak_memory.sample())
+    peak_memory.close()
+
+    time_fit = fit_line(batch_bytes, batch_times)
+    processing_time = (profile.number_batches * time_fit.intercept
+                       + profile.number_bytes * time_fit.slope)
+    # The largest batch so far, as the peak memory is of all batches so far.
+    largest_batch_bytes = [max(batch_bytes[:index + 1])
+                           for index in range(len(batch_bytes))]
+    memory_fit = fit_line(largest_batch_bytes, batch_peak_memory)
+    estimated_peak_memory = max(memory_fit(profile.max_batch_bytes),
+                                max(batch_peak_memory))
+    logger.info(f'Tagged {len(sample)} sampled paragraphs in {len(batch_times)} '
+                f'batches, batch time {time_fit.intercept:.4f}s + '
+                f'{time_fit.slope * (1024**2):.4f}s per MB, peak memory '
+                f'{memory_fit.intercept:.4f}GB + '
+                f'{memory_fit.slope * (1024**2):.4f}GB per MB in the largest '
+                'batch')
+    return ResourceEstimate(profile, load_time, processing_time,
+                            estimated_peak_memory)
+
+def format_sge_time(seconds: float) -> str:
+    '''
+    :param seconds: A duration in seconds.
+    :returns: The duration as `HH:MM:SS`, the hours can be more than 24, the
+              format of the SGE run time limit (`h_rt`).
+    '''
+    minutes, seconds = divmod(math.ceil(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f'{hours:02d}:{minutes:02d}:{seconds:02d}'
+
+def sge_resource_directives(estimate: ResourceEstimate,
+                            memory_margin: float = 0.25,
+                            time_margin: float = 0.5,
+                            minimum_time: float = 600.0) -> List[str]:
+    '''
+    :param estimate: The estimated resources.
+    :param memory_margin: Fraction of the peak memory added to it, the
+                          memory is rounded up to a whole GB.
+    :param time_margin: Fraction of the load and processing time added to
+                        it, the time is rounded up to a whole minute.
+    :param minimum_time: Minimum run time limit in seconds, covering the
+                         start up of the job, e.g. activating the conda
+                         environment.
+    :returns: The SGE directives of the memory (`h_vmem`) and run time
+              (`h_rt`) limits, e.g. `#$ -l h_vmem=3G`.
+    '''
+    memory = max(1, math.ceil(estimate.peak_memory * (1 + memory_margin)))
+    run_time = (estimate.load_time + estimate.processing_time) * (1 + time_margin)
+    run_time = 60 * math.ceil(max(minimum_time, run_time) / 60)
+    return [f'#$ -l h_vmem={memory}G', f'#$ -l h_rt={format_sge_time(run_time)}']
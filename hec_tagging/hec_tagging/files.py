@@ -0,0 +1,222 @@
+import csv
+import glob
+from pathlib import Path
+from typing import Iterable, List, NamedTuple, Optional
+
+from .archives import (archive_stem, is_tar_archive, list_members, member_fp,
+                       text_stat)
+from .compression import strip_compression_suffix
+
+class TextPart(NamedTuple):
+    '''
+    Consecutive paragraphs of a text file, from the paragraph that starts at
+    `start_offset` to the last paragraph that starts before `end_offset`,
+    thus a large text file can be split between jobs, see
+    `hec_tagging.planner.plan_shards`.
+    '''
+    start_paragraph_number: int
+    start_offset: int
+    end_offset: int
+
+class FilePair(NamedTuple):
+    '''
+    A text file to tag and the file to output it's Named Entities too. If
+    `part` is given only that part of the text file is tagged, the paragraph
+    numbers in the output file are those of the whole text file.
+    '''
+    text_fp: Path
+    output_fp: Path
+    part: Optional[TextPart] = None
+
+    @property
+    def text_size(self) -> int:
+        '''
+        :returns: Size in bytes of the text to tag, the size of the part when
+                  only a part of the text file is tagged. For a compressed
+                  text file the size of the compressed file, see
+                  `hec_tagging.archives.text_stat`.
+        '''
+        if self.part is not None:
+            return self.part.end_offset - self.part.start_offset
+        return text_stat(self.text_fp).size
+
+def read_manifest(manifest_fp: Path, output_directory: Optional[Path] = None
+                  ) -> List[FilePair]:
+    '''
+    A manifest is a TSV file whereby each line contains a text file path
+    followed by the file path to output it's Named Entities too, and
+    optionally the paragraph number, start byte offset, and end byte offset
+    of the part of the text file to tag, see `TextPart`. Blank lines and
+    lines starting with `#` are ignored.
+
+    :param manifest_fp: File path to the manifest.
+    :param output_directory: Directory that relative output file paths are
+                             relative too. If None they are relative to the
+                             directory of the manifest, like the relative
+                             text file paths.
+    :returns: The file pairs in the order they are in the manifest.
+    :raises ValueError: If a line does not contain exactly two file paths,
+                        optionally followed by the three numbers of a part.
+    '''
+    manifest_directory = manifest_fp.parent
+    if output_directory is None:
+        output_directory = manifest_directory
+    file_pairs: List[FilePair] = []
+    with manifest_fp.open('r', newline='') as manifest_file:
+        tsv_reader = csv.reader(manifest_file, delimiter='\t')
+        for line_number, line in enumerate(tsv_reader, 1):
+            if not line or not ''.join(line).strip() or line[0].startswith('#'):
+                continue
+            part: Optional[TextPart] = None
+            if len(line) == 5 and all(value.strip().isdigit() for value in line[2:]):
+                part = TextPart(*(int(value) for value in line[2:]))
+            elif len(line) != 2:
+                raise ValueError(f'Line {line_number} of the manifest '
+                                 f'{manifest_fp} should contain a text file '
+                                 'path and an output file path, optionally '
+                                 'followed by the paragraph number, start '
+                                 'offset, and end offset of a part of the '
+                                 f'text file: {line}')
+            text_fp = Path(manifest_directory, line[0].strip()).resolve()
+            output_fp = Path(output_directory, line[1].strip()).resolve()
+            file_pairs.append(FilePair(text_fp, output_fp, part))
+    return file_pairs
+
+def write_manifest(manifest_fp: Path, file_pairs: Iterable[FilePair]) -> None:
+    '''
+    :param manifest_fp: File path to write the manifest too, see
+                        `read_manifest` for the manifest format.
+    :param file_pairs: The file pairs to write to the manifest.
+    '''
+    with manifest_fp.open('w', newline='') as manifest_file:
+        tsv_writer = csv.writer(manifest_file, delimiter='\t')
+        for text_fp, output_fp, part in file_pairs:
+            line = [str(text_fp), str(output_fp)]
+            if part is not None:
+                line.extend(str(value) for value in part)
+            tsv_writer.writerow(line)
+
+def _output_fp(text_fp: Path, text_directory: Path, output_directory: Path,
+               output_suffix: str) -> Path:
+    relative_fp = strip_compression_suffix(text_fp.relative_to(text_directory))
+    return Path(output_directory, relative_fp).with_suffix(output_suffix)
+
+def _file_pairs(text_fps: Iterable[Path], text_directory: Path,
+                output_directory: Path, pattern: str, output_suffix: str
+                ) -> List[FilePair]:
+    '''
+    :returns: The file pairs of the text files, whereby each tar archive is
+              replaced by its members that match the pattern, in archive
+              order, output to a sub directory named after the archive.
+    '''
+    file_pairs: List[FilePair] = []
+    for text_fp in text_fps:
+        if not is_tar_archive(text_fp):
+            file_pairs.append(FilePair(text_fp, _output_fp(text_fp, text_directory,
+                                                           output_directory,
+                                                           output_suffix)))
+            continue
+        archive_output_directory = Path(output_directory,
+                                        text_fp.parent.relative_to(text_directory),
+                                        archive_stem(text_fp))
+        for member in list_members(text_fp, pattern):
+            file_pairs.append(FilePair(member_fp(text_fp, member),
+                                       _output_fp(Path(member), Path(),
+                                                  archive_output_directory,
+                                                  output_suffix)))
+    return file_pairs
+
+def directory_file_pairs(text_directory: Path, output_directory: Path,
+                         pattern: str = '*.txt', output_suffix: str = '.tsv'
+                         ) -> List[FilePair]:
+    '''
+    :param text_directory: Directory that contains the text files, sub
+                           directories are searched as well.
+    :param output_directory: Directory to output the Named Entities too, the
+                             sub directory structure of `text_directory` is
+                             kept.
+    :param pattern: Glob pattern that the text file names match, and the
+                    names of the members of the tar archives in the
+                    directory, see `hec_tagging.archives.TAR_SUFFIXES`.
+    :param output_suffix: File extension of the output files.
+    :returns: The file pairs sorted by text file path, e.g. for
+              `text_directory/files_1/0.txt` the output file path is
+              `output_directory/files_1/0.tsv`. The file extension of a
+              compressed text file is removed, `0.txt.gz` is output to
+              `0.tsv`, and the members of a tar archive, e.g.
+              `books.tar.gz/austen/0.txt`, are output to a sub directory
+              named after the archive, `books/austen/0.tsv`.
+    '''
+    text_fps = {text_fp for text_fp in text_directory.rglob(pattern)
+                if text_fp.is_file() and not is_tar_archive(text_fp)}
+    text_fps.update(text_fp for text_fp in text_directory.rglob('*')
+                    if is_tar_archive(text_fp) and text_fp.is_file())
+    return _file_pairs(sorted(text_fps), text_directory, output_directory,
+                       pattern, output_suffix)
+
+def glob_file_pairs(text_pattern: str, output_directory: Path,
+                    output_suffix: str = '.tsv', member_pattern: str = '*.txt'
+                    ) -> List[FilePair]:
+    '''
+    :param text_pattern: Glob pattern of the text files, `**` matches any
+                         number of sub directories.
+    :param output_directory: Directory to output the Named Entities too, the
+                             directory structure after the first part of
+                             the pattern that contains a glob character is
+                             kept.
+    :param output_suffix: File extension of the output files.
+    :param member_pattern: Glob pattern that the names of the members of the
+                           matched tar archives match, see
+                           `directory_file_pairs`.
+    :returns: The file pairs sorted by text file path.
+    '''
+    base_parts: List[str] = []
+    for part in Path(text_pattern).parts:
+        if glob.has_magic(part):
+            break
+        base_parts.append(part)
+    text_directory = Path(*base_parts)
+    return _file_pairs((text_fp for text_fp in sorted(Path(match) for match in
+                                                      glob.glob(text_pattern,
+                                                                recursive=True))
+                        if text_fp.is_file()),
+                       text_directory, output_directory, member_pattern,
+                       output_suffix)
+
+def resolve_file_pairs(text_path: Path, output_path: Path,
+                       manifest: bool = False, pattern: str = '*.txt',
+                       output_suffix: str = '.tsv') -> List[FilePair]:
+    '''
+    :param text_path: Either a text file, a directory of text files, a glob
+                      pattern of text files, a tar archive of text files, or
+                      a manifest file. The text files can be compressed.
+    :param output_path: The output file if `text_path` is a text file, else
+                        the output directory.
+    :param manifest: Whether `text_path` is a manifest file.
+    :param pattern: Glob pattern of the text file names when `text_path` is
+                    a directory, and of the names of the members of the tar
+                    archives.
+    :param output_suffix: File extension of the output files when `text_path`
+                          is a directory or a glob pattern.
+    :returns: The text files to tag and the file to output each of their
+              Named Entities too.
+    :raises FileNotFoundError: If `text_path` does not match any files.
+    '''
+    if manifest:
+        file_pairs = read_manifest(text_path, output_path)
+    elif text_path.is_dir():
+        file_pairs = directory_file_pairs(text_path, output_path, pattern,
+                                          output_suffix)
+    elif glob.has_magic(str(text_path)):
+        file_pairs = glob_file_pairs(str(text_path), output_path, output_suffix,
+                                     pattern)
+    elif is_tar_archive(text_path) and text_path.is_file():
+        file_pairs = [FilePair(member_fp(text_path, member),
+                               _output_fp(Path(member), Path(), output_path,
+                                          output_suffix))
+                      for member in list_members(text_path, pattern)]
+    else:
+        file_pairs = [FilePair(text_path, output_path)]
+    if not file_pairs:
+        raise FileNotFoundError(f'No text files to tag were found from: {text_path}')
+    return file_pairs
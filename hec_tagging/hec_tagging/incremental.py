@@ -0,0 +1,140 @@
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from .archives import text_checksum, text_stat
+from .files import FilePair, TextPart
+
+class TaggingRecord(NamedTuple):
+    '''
+    What an output file was tagged from: the text file's size, modified
+    time, and checksum, the identity of the model, see
+    `hec_tagging.backends.TaggingBackend.model_identity`, and the settings
+    used, e.g. the batch size, along with the size of the output file, and
+    the part of the text file tagged, see `hec_tagging.files.TextPart`, as a
+    list, None if all of the text file was tagged.
+    '''
+    text_size: int
+    text_mtime: float
+    text_sha256: str
+    output_size: int
+    model_identity: str
+    settings: Dict[str, Any]
+    part: Optional[List[int]] = None
+
+def tagging_record_fp(output_fp: Path) -> Path:
+    '''
+    :param output_fp: File path of the output file.
+    :returns: File path of the output file's tagging record.
+    '''
+    return output_fp.with_name(output_fp.name + '.tagged.json')
+
+def read_tagging_record(output_fp: Path) -> Optional[TaggingRecord]:
+    '''
+    :param output_fp: File path of the output file.
+    :returns: The tagging record of the output file, None if it does not
+              have one.
+    '''
+    record_fp = tagging_record_fp(output_fp)
+    if not record_fp.exists():
+        return None
+    with record_fp.open('r') as record_file:
+        return TaggingRecord(**json.load(record_file))
+
+def _part_record(part: Optional[TextPart]) -> Optional[List[int]]:
+    return None if part is None else list(part)
+
+def write_tagging_record(text_fp: Path, output_fp: Path, model_identity: str,
+                         settings: Dict[str, Any],
+                         text_sha256: Optional[str] = None,
+                         part: Optional[TextPart] = None) -> TaggingRecord:
+    '''
+    Atomically writes the tagging record of an output file that has been
+    fully written.
+
+    :param text_fp: File path to the text that was tagged.
+    :param output_fp: File path of the output file.
+    :param model_identity: Identity of the model that tagged the text.
+    :param settings: Settings used to tag the text, must be JSON
+                     serialisable.
+    :param text_sha256: Checksum of the text file, if None it is computed.
+    :param part: The part of the text file that was tagged, None if all of
+                 it was tagged.
+    :returns: The record written.
+    '''
+    stat = text_stat(text_fp)
+    if text_sha256 is None:
+        text_sha256 = text_checksum(text_fp)
+    record = TaggingRecord(stat.size, stat.mtime, text_sha256,
+                           output_fp.stat().st_size, model_identity, settings,
+                           _part_record(part))
+    record_fp = tagging_record_fp(output_fp)
+    temporary_fp = record_fp.with_name(record_fp.name + '.tmp')
+    with temporary_fp.open('w') as record_file:
+        json.dump(record._asdict(), record_file, indent=2)
+    os.replace(str(temporary_fp), str(record_fp))
+    return record
+
+def is_up_to_date(text_fp: Path, output_fp: Path, model_identity: str,
+                  settings: Dict[str, Any],
+                  part: Optional[TextPart] = None) -> bool:
+    '''
+    An output file is up to date when its tagging record shows it was tagged
+    from the same text, or the same part of the text, i.e. it was not
+    planned again with different byte ranges, by the same model with the
+    same settings, and the output file has not changed size since. The text
+    file is only read, to compare its checksum, when its size is the same
+    but its modified time has changed, e.g. it was copied again, in which
+    case the record is updated with the new modified time.
+
+    :param text_fp: File path to the text.
+    :param output_fp: File path of the output file.
+    :param model_identity: Identity of the model that will tag the text.
+    :param settings: Settings that will be used to tag the text.
+    :param part: The part of the text file that will be tagged, None if all
+                 of it will be tagged.
+    :returns: Whether the output file does not need tagging again.
+    '''
+    record = read_tagging_record(output_fp)
+    if record is None or not output_fp.exists():
+        return False
+    if (record.model_identity != model_identity or record.settings != settings
+            or record.part != _part_record(part)
+            or output_fp.stat().st_size != record.output_size):
+        return False
+    stat = text_stat(text_fp)
+    if stat.size != record.text_size:
+        return False
+    if stat.mtime == record.text_mtime:
+        return True
+    text_sha256 = text_checksum(text_fp)
+    if text_sha256 != record.text_sha256:
+        return False
+    write_tagging_record(text_fp, output_fp, model_identity, settings,
+                         text_sha256, part)
+    return True
+
+def partition_file_pairs(file_pairs: Sequence[FilePair], model_identity: str,
+                         settings: Dict[str, Any]
+                         ) -> Tuple[List[FilePair], List[FilePair]]:
+    '''
+    :param file_pairs: Text files and the file to output each of their Named
+                       Entities too.
+    :param model_identity: Identity of the model that will tag the texts.
+    :param settings: Settings that will be used to tag the texts.
+    :returns: The file pairs whose output files need tagging, as their text
+              files are new or changed, their parts of the text files are
+              different, or the model or settings are different, and the file
+              pairs whose output files are up to date, see `is_up_to_date`.
+              Both are in the given order.
+    '''
+    stale: List[FilePair] = []
+    up_to_date: List[FilePair] = []
+    for file_pair in file_pairs:
+        if is_up_to_date(file_pair.text_fp, file_pair.output_fp, model_identity,
+                         settings, file_pair.part):
+            up_to_date.append(file_pair)
+        else:
+            stale.append(file_pair)
+    return stale, up_to_date
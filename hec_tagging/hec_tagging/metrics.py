@@ -0,0 +1,119 @@
+from array import array
+import math
+from typing import Dict, Sequence
+
+# Percentiles reported by `LatencyHistogram.summary`.
+PERCENTILES = (50.0, 90.0, 99.0, 99.9)
+
+class LatencyHistogram():
+    '''
+    A streaming histogram of latencies (seconds) with logarithmically sized
+    buckets, thus it uses the same amount of memory however many latencies
+    are recorded, and any percentile is within the relative error of one
+    bucket, about 2% with the default 32 buckets per doubling. The minimum,
+    maximum, and total are exact.
+    '''
+
+    def __init__(self, lowest: float = 1e-6, highest: float = 86400.0,
+                 buckets_per_doubling: int = 32) -> None:
+        '''
+        :param lowest: Latencies at or below this are counted in the first
+                       bucket.
+        :param highest: Latencies at or above this are counted in the last
+                        bucket.
+        :param buckets_per_doubling: Number of buckets between a latency and
+                                     double that latency, the more buckets
+                                     the more precise the percentiles.
+        '''
+        self.lowest = lowest
+        self.highest = highest
+        self.buckets_per_doubling = buckets_per_doubling
+        number_buckets = math.ceil(math.log2(highest / lowest) * buckets_per_doubling) + 1
+        self.counts = array('Q', bytes(8 * number_buckets))
+        self.count = 0
+        self.total = 0.0
+        self.minimum = math.inf
+        self.maximum = 0.0
+
+    def _bucket(self, latency: float) -> int:
+        if latency <= self.lowest:
+            return 0
+        bucket = math.ceil(math.log2(latency / self.lowest) * self.buckets_per_doubling)
+        return min(bucket, len(self.counts) - 1)
+
+    def _bucket_upper_bound(self, bucket: int) -> float:
+        return self.lowest * 2 ** (bucket / self.buckets_per_doubling)
+
+    def record(self, latency: float, count: int = 1) -> None:
+        '''
+        :param latency: Latency in seconds.
+        :param count: Number of times the latency occurred.
+        '''
+        if count < 1:
+            return
+        self.counts[self._bucket(latency)] += count
+        self.count += count
+        self.total += latency * count
+        self.minimum = min(self.minimum, latency)
+        self.maximum = max(self.maximum, latency)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, percent: float) -> float:
+        '''
+        :param percent: Percentile between 0 and 100.
+        :returns: The latency that `percent` percent of the latencies are at or
+                  below, 0.0 if no latencies have been recorded.
+        '''
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(self.count * percent / 100))
+        cumulative_count = 0
+        for bucket, bucket_count in enumerate(self.counts):
+            cumulative_count += bucket_count
+            if cumulative_count >= rank:
+                latency = self._bucket_upper_bound(bucket)
+                return min(max(latency, self.minimum), self.maximum)
+        return self.maximum
+
+    def merge(self, other: 'LatencyHistogram') -> None:
+        '''
+        :param other: Histogram, with the same buckets, whose latencies are
+                      added to this histogram.
+        :raises ValueError: If the histograms have different buckets.
+        '''
+        if (other.lowest, other.highest, other.buckets_per_doubling) != \
+                (self.lowest, self.highest, self.buckets_per_doubling):
+            raise ValueError('Cannot merge histograms with different buckets')
+        for bucket, bucket_count in enumerate(other.counts):
+            if bucket_count:
+                self.counts[bucket] += bucket_count
+        self.count += other.count
+        self.total += other.total
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+
+    def summary(self, percentiles: Sequence[float] = PERCENTILES
+                ) -> Dict[str, float]:
+        '''
+        :param percentiles: Percentiles to include.
+        :returns: The count, minimum, mean, maximum, and the percentiles, keyed
+                  by e.g. `p99.9`, of the latencies.
+        '''
+        summary = {'count': float(self.count),
+                   'min': self.minimum if self.count else 0.0,
+                   'mean': self.mean, 'max': self.maximum}
+        for percent in percentiles:
+            summary[f'p{percent:g}'] = self.percentile(percent)
+        return summary
+
+def format_percentiles(histogram: LatencyHistogram,
+                       percentiles: Sequence[float] = PERCENTILES) -> str:
+    '''
+    :returns: The percentiles of the histogram in seconds, e.g.
+              `p50 0.0123s, p90 0.0456s, p99 ...`
+    '''
+    return ', '.join(f'p{percent:g} {histogram.percentile(percent):.4f}s'
+                     for percent in percentiles)
@@ -0,0 +1,146 @@
+import hashlib
+import json
+from pathlib import Path
+from typing import Any, Dict, List
+
+MODEL_MANIFEST_NAME = 'hec_tagging_manifest_{lang}.json'
+
+def file_checksum(fp: Path, chunk_size: int = 1024**2) -> str:
+    '''
+    :param fp: File path to create a checksum for.
+    :param chunk_size: Number of bytes read from the file at a time.
+    :returns: The SHA-256 checksum of the file.
+    '''
+    checksum = hashlib.sha256()
+    with fp.open('rb') as _file:
+        for chunk in iter(lambda: _file.read(chunk_size), b''):
+            checksum.update(chunk)
+    return checksum.hexdigest()
+
+def model_manifest_fp(model_directory: Path, lang: str) -> Path:
+    '''
+    :param model_directory: Directory that stores the pre-trained stanza models.
+    :param lang: Language of the Stanza models.
+    :returns: File path to the manifest of the models for the language.
+    '''
+    return Path(model_directory, MODEL_MANIFEST_NAME.format(lang=lang))
+
+def _model_files(model_directory: Path, lang: str) -> List[Path]:
+    model_files = [fp for fp in Path(model_directory, lang).rglob('*')
+                   if fp.is_file()]
+    resources_fp = Path(model_directory, 'resources.json')
+    if resources_fp.exists():
+        model_files.append(resources_fp)
+    return sorted(model_files)
+
+def write_model_manifest(model_directory: Path, lang: str, processors: str
+                         ) -> Path:
+    '''
+    Writes a manifest of the size, modified time, and checksum of every
+    Stanza model file for the language, this manifest is used by
+    `verify_model_manifest` to check that the models exist without having
+    to contact the Stanza servers.
+
+    :param model_directory: Directory that stores the pre-trained stanza models.
+    :param lang: Language of the Stanza models.
+    :param processors: Comma separated Stanza processors that were downloaded.
+    :returns: File path to the manifest.
+    '''
+    files: Dict[str, Dict[str, Any]] = {}
+    for fp in _model_files(model_directory, lang):
+        file_stat = fp.stat()
+        files[fp.relative_to(model_directory).as_posix()] = {
+            'size': file_stat.st_size, 'mtime': file_stat.st_mtime,
+            'sha256': file_checksum(fp)}
+    # Processors downloaded before are kept as their files are still checked.
+    manifest_fp = model_manifest_fp(model_directory, lang)
+    all_processors = set(processors.split(','))
+    if manifest_fp.exists():
+        with manifest_fp.open('r') as manifest_file:
+            all_processors.update(json.load(manifest_file)['processors'])
+    manifest = {'lang': lang, 'processors': sorted(all_processors),
+                'files': files}
+    with manifest_fp.open('w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    return manifest_fp
+
+def verify_model_manifest(model_directory: Path, lang: str, processors: str
+                          ) -> List[str]:
+    '''
+    Checks the Stanza model files against the manifest written by
+    `write_model_manifest`. To keep start up quick a file's checksum is only
+    computed when it's size is the same but it's modified time is different
+    to the time in the manifest.
+
+    :param model_directory: Directory that stores the pre-trained stanza models.
+    :param lang: Language of the Stanza models.
+    :param processors: Comma separated Stanza processors that are required.
+    :returns: A description of each problem found, e.g. a missing model file,
+              an empty list means the models are all there and unchanged.
+    '''
+    manifest_fp = model_manifest_fp(model_directory, lang)
+    if not manifest_fp.exists():
+        return [f'No model manifest at {manifest_fp}']
+    with manifest_fp.open('r') as manifest_file:
+        manifest = json.load(manifest_file)
+
+    problems: List[str] = []
+    missing_processors = set(processors.split(',')) - set(manifest['processors'])
+    if missing_processors:
+        problems.append(f'Processors {sorted(missing_processors)} are not '
+                        f'in the model manifest {manifest_fp}')
+    for relative_fp, file_info in manifest['files'].items():
+        fp = Path(model_directory, relative_fp)
+        if not fp.exists():
+            problems.append(f'Missing model file {fp}')
+            continue
+        file_stat = fp.stat()
+        if file_stat.st_size != file_info['size']:
+            problems.append(f'Model file {fp} has changed size')
+        elif (file_stat.st_mtime != file_info['mtime']
+              and file_checksum(fp) != file_info['sha256']):
+            problems.append(f'Model file {fp} has a different checksum')
+    return problems
+
+def download_stanza_models(model_directory: Path, lang: str = 'en',
+                           processors: str = 'tokenize,ner') -> Path:
+    '''
+    Downloads the Stanza models and writes the model manifest, this is the
+    only step that requires network access.
+
+    :param model_directory: Directory to store the pre-trained stanza models.
+    :param lang: Language of the Stanza models.
+    :param processors: Comma separated Stanza processors to download.
+    :returns: File path to the model manifest.
+    '''
+    import stanza
+
+    model_directory.mkdir(parents=True, exist_ok=True)
+    stanza.download(lang, dir=str(model_directory), processors=processors)
+    return write_model_manifest(model_directory, lang, processors)
+
+def resolve_stanza_models(model_directory: Path, lang: str = 'en',
+                          processors: str = 'tokenize,ner',
+                          offline: bool = False) -> None:
+    '''
+    Ensures the Stanza models exist in the model directory. The models are
+    only downloaded if the model manifest shows that a model is missing or
+    has changed, thus when the models have already been downloaded no
+    network access is required.
+
+    :param model_directory: Directory that stores the pre-trained stanza models.
+    :param lang: Language of the Stanza models.
+    :param processors: Comma separated Stanza processors that are required.
+    :param offline: Never download the models.
+    :raises FileNotFoundError: If `offline` and the models are missing or
+                               have changed.
+    '''
+    problems = verify_model_manifest(model_directory, lang, processors)
+    if not problems:
+        return
+    if offline:
+        problem_string = '\n'.join(problems)
+        raise FileNotFoundError('The Stanza models need to be downloaded, '
+                                'e.g. through the `download_stanza.py` script,'
+                                f' before running offline:\n{problem_string}')
+    download_stanza_models(model_directory, lang, processors)
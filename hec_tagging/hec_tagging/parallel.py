@@ -0,0 +1,138 @@
+from collections import deque
+import multiprocessing
+from multiprocessing.pool import AsyncResult
+import os
+import sys
+from typing import Deque, Iterable, List, Optional, Tuple
+import time
+
+from .backends import Entity, TaggingBackend
+from .engine import DEFAULT_SORT_WINDOW, TaggedBatch, plan_batches
+from .utils import available_cpus
+
+# A window of paragraphs, its batches, and the result of tagging each batch.
+_Window = Tuple[List[str], List[List[int]], List[AsyncResult]]
+
+# The backend of a worker process, loaded once when the worker starts.
+_worker_backend: Optional[TaggingBackend] = None
+
+def _initialise_worker(backend: TaggingBackend, threads_per_worker: int) -> None:
+    global _worker_backend
+    # Stops the workers from each using all of the CPUs.
+    for thread_variable in ['OMP_NUM_THREADS', 'MKL_NUM_THREADS']:
+        os.environ[thread_variable] = str(threads_per_worker)
+    backend.load()
+    if 'torch' in sys.modules:
+        sys.modules['torch'].set_num_threads(threads_per_worker)
+    _worker_backend = backend
+
+def _tag_batch(batch: List[str]) -> Tuple[List[List[Entity]], float]:
+    assert _worker_backend is not None
+    start_time = time.perf_counter()
+    batch_entities = _worker_backend.tag_batch(batch)
+    end_time = time.perf_counter()
+    return batch_entities, end_time - start_time
+
+class TaggingPool():
+    '''
+    A pool of worker processes, each with their own loaded model, that tag
+    batches of paragraphs at the same time. The tagged batches are returned
+    in the same order as the paragraphs were given, thus the output is the
+    same as tagging with one process.
+
+    Can be used as a context manager, which closes the pool on exit.
+    '''
+
+    def __init__(self, backend: TaggingBackend, number_workers: int,
+                 threads_per_worker: Optional[int] = None,
+                 max_batches_in_flight: Optional[int] = None,
+                 max_batch_tokens: Optional[int] = None,
+                 sort_window: int = DEFAULT_SORT_WINDOW) -> None:
+        '''
+        :param backend: Backend that is loaded in each worker process, the
+                        backend should not be loaded in this process.
+        :param number_workers: Number of worker processes.
+        :param threads_per_worker: Number of threads each worker's model can
+                                   use. If None the available CPUs are split
+                                   evenly between the workers.
+        :param max_batches_in_flight: Maximum number of batches that have
+                                      been read but not returned, this bounds
+                                      the memory used. If None it is twice
+                                      the number of workers.
+        :param max_batch_tokens: If given, paragraphs of similar length are
+                                 batched together under this token budget,
+                                 see `hec_tagging.engine.plan_batches`.
+        :param sort_window: See `hec_tagging.engine.plan_batches`.
+        '''
+        if number_workers < 1:
+            raise ValueError(f'The number of workers has to be at least 1: '
+                             f'{number_workers}')
+        if threads_per_worker is None:
+            threads_per_worker = max(1, available_cpus() // number_workers)
+        if max_batches_in_flight is None:
+            max_batches_in_flight = 2 * number_workers
+        self.backend = backend
+        self.number_workers = number_workers
+        self.max_batches_in_flight = max_batches_in_flight
+        self.max_batch_tokens = max_batch_tokens
+        self.sort_window = sort_window
+        self._pool = multiprocessing.Pool(number_workers,
+                                          initializer=_initialise_worker,
+                                          initargs=(backend, threads_per_worker))
+
+    def tag_batches(self, paragraphs: Iterable[str],
+                    start_paragraph_number: int = 0) -> Iterable[TaggedBatch]:
+        '''
+        :param paragraphs: Paragraphs to tag.
+        :param start_paragraph_number: Paragraph number of the first paragraph.
+        :returns: Yields the tagged batches in paragraph order, see
+                  `hec_tagging.engine.tag_batches`.
+        '''
+        in_flight: Deque[_Window] = deque()
+        number_batches_in_flight = 0
+        paragraph_number = start_paragraph_number
+        for window, batches in plan_batches(paragraphs, self.backend.batch_size,
+                                            self.max_batch_tokens,
+                                            self.sort_window):
+            results = [self._pool.apply_async(_tag_batch,
+                                              ([window[index] for index in batch],))
+                       for batch in batches]
+            in_flight.append((window, batches, results))
+            number_batches_in_flight += len(batches)
+            while number_batches_in_flight >= self.max_batches_in_flight:
+                tagged_batch = self._next_tagged_batch(in_flight, paragraph_number)
+                number_batches_in_flight -= tagged_batch.number_batches
+                paragraph_number += len(tagged_batch.paragraphs)
+                yield tagged_batch
+        while in_flight:
+            tagged_batch = self._next_tagged_batch(in_flight, paragraph_number)
+            paragraph_number += len(tagged_batch.paragraphs)
+            yield tagged_batch
+
+    @staticmethod
+    def _next_tagged_batch(in_flight: Deque[_Window], paragraph_number: int
+                           ) -> TaggedBatch:
+        window, batches, results = in_flight.popleft()
+        window_entities: List[List[Entity]] = [[] for _ in window]
+        processing_time = 0.0
+        for batch, result in zip(batches, results):
+            batch_entities, batch_time = result.get()
+            processing_time += batch_time
+            for index, paragraph_entities in zip(batch, batch_entities):
+                window_entities[index] = paragraph_entities
+        return TaggedBatch(paragraph_number, window, window_entities,
+                           processing_time, len(batches))
+
+    def close(self) -> None:
+        self._pool.close()
+        self._pool.join()
+
+    def __enter__(self) -> 'TaggingPool':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is not None:
+            self._pool.terminate()
+            self._pool.join()
+        else:
+            self.close()
@@ -0,0 +1,257 @@
+import argparse
+from array import array
+from bisect import bisect_right
+import heapq
+from itertools import accumulate
+from pathlib import Path
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+from .archives import split_member_fp
+from .compression import detect_compression, strip_compression_suffix
+from .files import FilePair, TextPart, resolve_file_pairs, write_manifest
+from .reader import ParagraphIndex
+from .utils import file_path, get_stdout_logger
+from .writers import WRITERS
+
+# What a text file is weighed by, its size in bytes or number of paragraphs.
+WEIGHTS = ('bytes', 'paragraphs')
+
+class Shard(NamedTuple):
+    '''
+    The text files, or parts of text files, tagged by one task of an array
+    job, and their total weight.
+    '''
+    file_pairs: List[FilePair]
+    weight: int
+
+def part_output_fp(output_fp: Path, part_number: int, number_parts: int) -> Path:
+    '''
+    :param output_fp: File path of the output file of the whole text file.
+    :param part_number: Number of the part, starting from 1.
+    :param number_parts: Number of parts the text file is split into.
+    :returns: File path of the output file of the part, e.g. `0.part2.tsv`
+              or `0.part2.tsv.gz`, the part number is zero padded thus the
+              output files of the parts sort in order.
+    '''
+    width = len(str(number_parts))
+    uncompressed_fp = strip_compression_suffix(output_fp)
+    compression_suffix = output_fp.suffix if uncompressed_fp != output_fp else ''
+    return output_fp.with_name(f'{uncompressed_fp.stem}.part{part_number:0{width}d}'
+                               f'{uncompressed_fp.suffix}{compression_suffix}')
+
+def split_file_pair(file_pair: FilePair, max_part_weight: float,
+                    weight: str = 'bytes') -> List[Tuple[FilePair, int]]:
+    '''
+    Splits a text file into parts of consecutive paragraphs, see
+    `hec_tagging.files.TextPart`, each as heavy as possible without being
+    heavier than `max_part_weight`, thus only the last part is lighter. A
+    paragraph is never split, a paragraph heavier than `max_part_weight` is
+    a part by itself. A compressed text file, or a member of a tar archive,
+    is never split as each part would have to decompress the text before it.
+
+    :param file_pair: The text file to split and the file to output its
+                      Named Entities too.
+    :param max_part_weight: Maximum weight of a part.
+    :param weight: What the parts are weighed by, one of `WEIGHTS`.
+    :returns: The file pair of each part, whose output file is given by
+              `part_output_fp`, and the part's weight, in the order of the
+              text file. The file pair itself if it is not split.
+    :raises ValueError: If the weight is not one of `WEIGHTS`.
+    '''
+    if weight not in WEIGHTS:
+        raise ValueError(f'The weight has to be one of {WEIGHTS}: {weight}')
+    if (split_member_fp(file_pair.text_fp)[1] is not None
+            or detect_compression(file_pair.text_fp) is not None):
+        return [(file_pair, file_weight(file_pair, weight))]
+    text_size = file_pair.text_fp.stat().st_size
+    with ParagraphIndex(file_pair.text_fp) as index:
+        number_paragraphs = len(index)
+        if weight == 'bytes':
+            # Including the blank lines after the paragraph, thus the parts
+            # weigh the same as their size, see `FilePair.text_size`.
+            paragraph_weights = (end - start for start, end
+                                 in zip(index.starts, index.starts[1:]
+                                        + array('q', [text_size])))
+        else:
+            paragraph_weights = (1 for _ in range(number_paragraphs))
+        # Total weight of the paragraphs up to and including each paragraph.
+        cumulative_weights = array('q', accumulate(paragraph_weights))
+        starts = index.starts
+    if not number_paragraphs:
+        return [(file_pair, 0)]
+    total_weight = cumulative_weights[-1]
+    boundaries = [0]
+    while boundaries[-1] < number_paragraphs:
+        part_start = boundaries[-1]
+        weight_before = cumulative_weights[part_start - 1] if part_start else 0
+        part_end = bisect_right(cumulative_weights, weight_before + max_part_weight)
+        boundaries.append(max(part_end, part_start + 1))
+    if len(boundaries) == 2:
+        return [(file_pair, total_weight)]
+
+    number_split = len(boundaries) - 1
+    parts: List[Tuple[FilePair, int]] = []
+    for part_number, (start, end) in enumerate(zip(boundaries, boundaries[1:]), 1):
+        end_offset = starts[end] if end < number_paragraphs else text_size
+        part = TextPart(start, starts[start], end_offset)
+        part_weight = (cumulative_weights[end - 1]
+                       - (cumulative_weights[start - 1] if start else 0))
+        output_fp = part_output_fp(file_pair.output_fp, part_number, number_split)
+        parts.append((FilePair(file_pair.text_fp, output_fp, part), part_weight))
+    return parts
+
+def file_weight(file_pair: FilePair, weight: str = 'bytes') -> int:
+    '''
+    :param file_pair: A text file and the file to output its Named Entities
+                      too.
+    :param weight: What the text file is weighed by, one of `WEIGHTS`.
+    :returns: The weight of the text file.
+    :raises ValueError: If the weight is not one of `WEIGHTS`.
+    '''
+    if weight == 'bytes':
+        return file_pair.text_size
+    if weight == 'paragraphs':
+        with ParagraphIndex(file_pair.text_fp) as index:
+            if file_pair.part is None:
+                return len(index)
+            return len(index.paragraph_range(file_pair.part.start_offset,
+                                              file_pair.part.end_offset))
+    raise ValueError(f'The weight has to be one of {WEIGHTS}: {weight}')
+
+def plan_shards(file_pairs: Sequence[FilePair], number_shards: int,
+                weight: str = 'bytes') -> List[Shard]:
+    '''
+    Packs the text files into shards of about the same total weight, one
+    shard for each task of an array job, with the Longest Processing Time
+    (LPT) heuristic: from the heaviest text file to the lightest, each is
+    added to the shard with the least weight so far. A text file heavier than
+    an equal share of the total weight is first split into parts, see
+    `split_file_pair`, of that share and a lighter remainder, as otherwise
+    the task given that text file would finish long after the others, and
+    the remainders fill the gaps left by the other text files.
+
+    :param file_pairs: The text files to tag and the file to output each of
+                       their Named Entities too.
+    :param number_shards: Maximum number of shards.
+    :param weight: What the text files are weighed by, one of `WEIGHTS`.
+    :returns: The shards, without empty shards thus fewer than
+              `number_shards` when there are fewer text files and parts.
+              Within a shard the text files are in the given order.
+    :raises ValueError: If the number of shards is less than 1 or the weight
+                        is not one of `WEIGHTS`.
+    '''
+    if number_shards < 1:
+        raise ValueError(f'The number of shards has to be at least 1: {number_shards}')
+    weights = [file_weight(file_pair, weight) for file_pair in file_pairs]
+    share = sum(weights) / number_shards
+    # The file pairs and parts, with their order and weight.
+    items: List[Tuple[Tuple[int, int], FilePair, int]] = []
+    for index, (file_pair, pair_weight) in enumerate(zip(file_pairs, weights)):
+        if number_shards > 1 and pair_weight > share:
+            parts = split_file_pair(file_pair, share, weight)
+        else:
+            parts = [(file_pair, pair_weight)]
+        for part_index, (part_file_pair, part_weight) in enumerate(parts):
+            items.append(((index, part_index), part_file_pair, part_weight))
+
+    shard_items: List[List[Tuple[Tuple[int, int], FilePair, int]]] = \
+        [[] for _ in range(number_shards)]
+    # (weight so far, shard index), the lightest shard is at the top.
+    shard_heap = [(0, shard_index) for shard_index in range(number_shards)]
+    for item in sorted(items, key=lambda item: item[2], reverse=True):
+        shard_weight, shard_index = heapq.heappop(shard_heap)
+        shard_items[shard_index].append(item)
+        heapq.heappush(shard_heap, (shard_weight + item[2], shard_index))
+    shards: List[Shard] = []
+    for items_of_shard in shard_items:
+        if not items_of_shard:
+            continue
+        items_of_shard.sort(key=lambda item: item[0])
+        shards.append(Shard([file_pair for _, file_pair, _ in items_of_shard],
+                            sum(item_weight for _, _, item_weight in items_of_shard)))
+    return shards
+
+def write_shard_manifests(shards: Sequence[Shard], manifest_directory: Path
+                          ) -> List[Path]:
+    '''
+    :param shards: The shards to write.
+    :param manifest_directory: Directory to write a manifest for each shard
+                               too, see `hec_tagging.files.write_manifest`,
+                               created if it does not exist.
+    :returns: The file paths of the manifests, `shard_1.tsv` to `shard_K.tsv`
+              thus the manifest of an array task is
+              `shard_$SGE_TASK_ID.tsv`.
+    '''
+    manifest_directory.mkdir(parents=True, exist_ok=True)
+    manifest_fps: List[Path] = []
+    for shard_number, shard in enumerate(shards, 1):
+        manifest_fp = Path(manifest_directory, f'shard_{shard_number}.tsv')
+        write_manifest(manifest_fp, shard.file_pairs)
+        manifest_fps.append(manifest_fp)
+    return manifest_fps
+
+def array_directive(number_shards: int) -> str:
+    '''
+    :param number_shards: Number of shards.
+    :returns: The SGE directive of an array job with a task for each shard,
+              e.g. `#$ -t 1-4:1`.
+    '''
+    return f'#$ -t 1-{number_shards}:1'
+
+def create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description=('Splits the text files into balanced shards, one for each '
+                     'task of an array job, and writes a manifest for each '
+                     'shard, shard_1.tsv to shard_K.tsv, to give to the tagging '
+                     'program through --manifest. Prints the array job '
+                     'directive.'))
+    parser.add_argument('text_file_path', type=file_path,
+                        help=('Directory of text files, or a quoted glob '
+                              'pattern of text files.'))
+    parser.add_argument('output_file_path', type=file_path,
+                        help='Directory to output the processed data too.')
+    parser.add_argument('manifest_directory', type=file_path,
+                        help='Directory to write the manifests too.')
+    parser.add_argument('--shards', type=int, required=True,
+                        help='Number of shards, the number of array tasks.')
+    parser.add_argument('--weight', choices=WEIGHTS, default='bytes',
+                        help=('Weigh the text files by size in bytes, or by '
+                              'number of paragraphs which requires reading '
+                              'every text file.'))
+    parser.add_argument('--pattern', type=str, default='*.txt',
+                        help=('Glob pattern of the text file names when the '
+                              'text file path is a directory.'))
+    parser.add_argument('--output-format', choices=sorted(WRITERS), default='tsv',
+                        help='Format of the output files, sets their file extension.')
+    return parser
+
+def main(argv: Optional[List[str]] = None) -> List[Shard]:
+    '''
+    :param argv: Command line arguments, if None `sys.argv` is used.
+    :returns: The shards.
+    '''
+    args = create_parser().parse_args(argv)
+    logger = get_stdout_logger(__name__)
+    file_pairs = resolve_file_pairs(args.text_file_path, args.output_file_path,
+                                    pattern=args.pattern,
+                                    output_suffix=WRITERS[args.output_format].suffix)
+    shards = plan_shards(file_pairs, args.shards, args.weight)
+    manifest_fps = write_shard_manifests(shards, args.manifest_directory)
+    number_parts = sum(file_pair.part is not None
+                       for shard in shards for file_pair in shard.file_pairs)
+    if number_parts:
+        logger.info(f'Split the large text files into {number_parts} parts, '
+                    'each part has its own output file, e.g. 0.part1.tsv')
+    mean_weight = sum(shard.weight for shard in shards) / len(shards)
+    for manifest_fp, shard in zip(manifest_fps, shards):
+        logger.info(f'{manifest_fp.name}: {len(shard.file_pairs)} text files, '
+                    f'{shard.weight} {args.weight}')
+    if mean_weight:
+        largest_weight = max(shard.weight for shard in shards)
+        logger.info(f'The largest shard is {largest_weight / mean_weight:.2f} '
+                    'times the mean shard weight')
+    print(array_directive(len(shards)))
+    return shards
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+from datetime import timedelta
+import logging
+from pathlib import Path
+import time
+from typing import Optional
+
+from .archives import text_stat
+from .files import TextPart
+from .utils import get_stdout_logger
+
+def format_duration(seconds: float) -> str:
+    '''
+    :param seconds: A duration in seconds.
+    :returns: The duration as `H:MM:SS`, or `D days, H:MM:SS`, the same
+              format as the SGE run time limit (`h_rt`) for less than a day.
+    '''
+    return str(timedelta(seconds=round(seconds)))
+
+class ProgressReporter():
+    '''
+    Reports how far through the text files tagging is by the number of bytes
+    of the text files that have been tagged, rather than the number of
+    paragraphs, as the total size of the text files is known before tagging
+    starts. The throughput, bytes per second, is smoothed with an exponential
+    moving average so that the estimated time remaining (ETA) follows
+    changes in throughput, e.g. a file of longer paragraphs, without jumping
+    around after every batch.
+
+    Progress is logged at most every `interval` seconds. Bytes skipped when
+    resuming from a checkpoint count as done but are not included in the
+    throughput.
+    '''
+
+    def __init__(self, total_bytes: int, interval: float = 60.0,
+                 smoothing: float = 0.3,
+                 logger: Optional[logging.Logger] = None) -> None:
+        '''
+        :param total_bytes: Total size in bytes of the text files to tag.
+        :param interval: Minimum number of seconds between logging progress.
+        :param smoothing: Weight, between 0 and 1, of the latest throughput
+                          in the smoothed throughput, the larger the weight
+                          the faster the ETA follows changes in throughput.
+        :param logger: Logger to log progress too, by default a logger that
+                       logs to stdout.
+        '''
+        self.total_bytes = total_bytes
+        self.interval = interval
+        self.smoothing = smoothing
+        self.logger = logger if logger is not None else get_stdout_logger(__name__)
+        # Smoothed bytes per second, None until the first report.
+        self.throughput: Optional[float] = None
+        self._completed_bytes = 0
+        self._file_size = 0
+        self._file_offset = 0
+        # Byte offset in the current text file that its part starts at.
+        self._part_offset = 0
+        self._last_time = time.perf_counter()
+        self._last_bytes = 0
+
+    @property
+    def bytes_done(self) -> int:
+        '''
+        :returns: Number of bytes of the text files that have been tagged,
+                  including bytes skipped when resuming.
+        '''
+        return self._completed_bytes + self._file_offset
+
+    @property
+    def fraction_done(self) -> float:
+        if not self.total_bytes:
+            return 1.0
+        return min(1.0, self.bytes_done / self.total_bytes)
+
+    @property
+    def seconds_remaining(self) -> Optional[float]:
+        '''
+        :returns: Estimated number of seconds until all of the text files
+                  have been tagged, None until the throughput is known.
+        '''
+        if not self.throughput:
+            return None
+        return max(0, self.total_bytes - self.bytes_done) / self.throughput
+
+    def start_file(self, text_fp: Path, start_offset: int = 0,
+                   part: Optional[TextPart] = None) -> None:
+        '''
+        :param text_fp: File path to the text about to be tagged.
+        :param start_offset: Byte offset that tagging starts from, e.g. when
+                             resuming from a checkpoint. For a compressed
+                             text file the byte offset in the compressed
+                             file, see
+                             `hec_tagging.reader.ParagraphOffsets.input_offset`.
+        :param part: The part of the text file that is tagged, if only a part
+                     is tagged.
+        '''
+        self._part_offset = 0
+        self._file_size = text_stat(text_fp).size
+        if part is not None:
+            self._part_offset = part.start_offset
+            self._file_size = part.end_offset - part.start_offset
+        self._file_offset = start_offset - self._part_offset
+        self._skip(self._file_offset)
+
+    def update(self, text_offset: int) -> None:
+        '''
+        Logs the progress if it has not been logged in the last `interval`
+        seconds.
+
+        :param text_offset: Byte offset in the current text file after the
+                            paragraphs that have been tagged, in the
+                            compressed file for a compressed text file.
+        '''
+        self._file_offset = text_offset - self._part_offset
+        if time.perf_counter() - self._last_time >= self.interval:
+            self.report()
+
+    def finish_file(self) -> None:
+        '''
+        Marks the current text file as tagged.
+        '''
+        self._completed_bytes += self._file_size
+        self._file_size = 0
+        self._file_offset = 0
+
+    def abandon_file(self) -> None:
+        '''
+        Marks the current text file as not tagged, e.g. as another job has
+        taken it over, thus the bytes tagged of it no longer count as done.
+        '''
+        self._last_bytes -= self._file_offset
+        self._file_size = 0
+        self._file_offset = 0
+
+    def skip_file(self, text_fp: Path, part: Optional[TextPart] = None) -> None:
+        '''
+        :param text_fp: File path to a text that does not need tagging, e.g.
+                        it has already been tagged.
+        :param part: The part of the text file that does not need tagging, if
+                     only a part is tagged.
+        '''
+        if part is not None:
+            size = part.end_offset - part.start_offset
+        else:
+            size = text_stat(text_fp).size
+        self._completed_bytes += size
+        self._skip(size)
+
+    def _skip(self, number_bytes: int) -> None:
+        # Skipped bytes are excluded from the throughput.
+        self._last_bytes += number_bytes
+
+    def report(self) -> None:
+        '''
+        Updates the smoothed throughput and logs the progress and ETA.
+        '''
+        current_time = time.perf_counter()
+        elapsed = current_time - self._last_time
+        bytes_done = self.bytes_done
+        if elapsed > 0:
+            throughput = (bytes_done - self._last_bytes) / elapsed
+            if self.throughput is None:
+                self.throughput = throughput
+            else:
+                self.throughput = (self.smoothing * throughput
+                                   + (1 - self.smoothing) * self.throughput)
+        self._last_time = current_time
+        self._last_bytes = bytes_done
+        seconds_remaining = self.seconds_remaining
+        eta = 'unknown' if seconds_remaining is None \
+            else format_duration(seconds_remaining)
+        # (1024**2) converts it to MB from bytes
+        self.logger.info(f'Progress {100 * self.fraction_done:.2f}% '
+                         f'({bytes_done / (1024**2):.2f}MB of '
+                         f'{self.total_bytes / (1024**2):.2f}MB), '
+                         f'{(self.throughput or 0.0) / (1024**2):.2f}MB per '
+                         f'second, ETA {eta}')
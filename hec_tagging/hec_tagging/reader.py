@@ -0,0 +1,395 @@
+from array import array
+from bisect import bisect_left
+import codecs
+from collections import deque
+from contextlib import ExitStack, contextmanager
+import mmap
+from pathlib import Path
+import re
+from typing import BinaryIO, Deque, Iterable, Iterator, Optional, Tuple, Union
+
+from .archives import open_member, split_member_fp
+from .compression import decompress_stream, detect_compression
+
+# The UTF-8 encoding of each character that `str.strip` removes, other than
+# the new lines, thus a line that only contains these characters is blank.
+_WHITESPACE = (rb'(?:[\t\x0b\x0c\x1c-\x1f ]|\xc2[\x85\xa0]|\xe1\x9a\x80'
+               rb'|\xe2\x80[\x80-\x8a\xa8\xa9\xaf]|\xe2\x81\x9f|\xe3\x80\x80)')
+# A new line as read in text mode, `\r\n`, `\r`, or `\n`.
+_NEW_LINE = rb'(?:\r\n|\r(?!\n)|\n)'
+# A blank line, matched from the start of the line.
+_BLANK_LINE = re.compile(_WHITESPACE + rb'*(?:' + _NEW_LINE + rb'|\Z)')
+# The end of the last line of a paragraph followed by a blank line, the blank
+# line is the first group.
+_PARAGRAPH_END = re.compile(_NEW_LINE + rb'(' + _WHITESPACE
+                            + rb'*(?:' + _NEW_LINE + rb'|\Z))')
+
+_SUPPORTED_ENCODINGS = ('utf-8', 'utf-8-sig', 'ascii')
+# Number of bytes read at a time from a text that cannot be memory mapped.
+_STREAM_CHUNK_SIZE = 1024**2
+
+def _check_encoding(encoding: str) -> None:
+    '''
+    :raises ValueError: If the encoding is not UTF-8 or ASCII, as the blank
+                        lines are found in the encoded text.
+    '''
+    if codecs.lookup(encoding).name not in _SUPPORTED_ENCODINGS:
+        raise ValueError(f'The encoding has to be one of {_SUPPORTED_ENCODINGS}'
+                         f': {encoding}')
+
+@contextmanager
+def _open_stream(fp: Path) -> Iterator[Tuple[Optional[BinaryIO], Optional[BinaryIO]]]:
+    '''
+    :param fp: File path to a text, or to a member of a tar archive, see
+               `hec_tagging.archives.member_fp`.
+    :returns: For a compressed text file, a stream of the decompressed text
+              and the compressed file it is read from. For a member of a tar
+              archive, a stream of the member and None. Otherwise None and
+              None, as the text file can be memory mapped.
+    '''
+    archive_fp, member = split_member_fp(fp)
+    if member is not None:
+        with open_member(archive_fp, member) as member_file:
+            yield member_file, None
+        return
+    compression = detect_compression(fp)
+    if compression is None:
+        yield None, None
+        return
+    with fp.open('rb') as raw_file:
+        with decompress_stream(raw_file, compression) as stream:
+            yield stream, raw_file
+
+@contextmanager
+def _map_file(fp: Path, encoding: str) -> Iterator[Union[mmap.mmap, bytes]]:
+    '''
+    :param fp: File path to a text.
+    :param encoding: Encoding of the text.
+    :returns: The text file mapped into memory, read only.
+    :raises ValueError: If the encoding is not UTF-8 or ASCII.
+    '''
+    _check_encoding(encoding)
+    with fp.open('rb') as _file:
+        # An empty file cannot be mapped.
+        if not fp.stat().st_size:
+            yield b''
+            return
+        with mmap.mmap(_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield mapped
+
+@contextmanager
+def _read_text(fp: Path, encoding: str) -> Iterator[Union[mmap.mmap, bytes]]:
+    '''
+    :param fp: File path to a text, or to a member of a tar archive.
+    :param encoding: Encoding of the text.
+    :returns: The text file mapped into memory, or if it is compressed or a
+              member of a tar archive, the decompressed text.
+    :raises ValueError: If the encoding is not UTF-8 or ASCII.
+    '''
+    _check_encoding(encoding)
+    with _open_stream(fp) as (stream, _):
+        if stream is not None:
+            yield stream.read()
+            return
+    with _map_file(fp, encoding) as mapped:
+        yield mapped
+
+def _start_of_text(mapped: Union[mmap.mmap, bytes], encoding: str) -> int:
+    '''
+    :returns: Byte offset of the start of the text, which is after the Byte
+              Order Mark when the encoding removes it.
+    '''
+    if (codecs.lookup(encoding).name == 'utf-8-sig'
+            and mapped[:len(codecs.BOM_UTF8)] == codecs.BOM_UTF8):
+        return len(codecs.BOM_UTF8)
+    return 0
+
+def _paragraph_spans(mapped: Union[mmap.mmap, bytes], start_offset: int
+                     ) -> Iterable[Tuple[int, int, int]]:
+    '''
+    :param mapped: The encoded text.
+    :param start_offset: Byte offset of the start of a line to start from.
+    :returns: Yields the start and end byte offset of each paragraph, and the
+              byte offset after the blank line that ends the paragraph.
+    '''
+    size = len(mapped)
+    position = start_offset
+    while position < size:
+        blank_line = _BLANK_LINE.match(mapped, position)
+        if blank_line is not None:
+            position = blank_line.end()
+            continue
+        paragraph_end = _PARAGRAPH_END.search(mapped, position)
+        if paragraph_end is None:
+            yield position, size, size
+            return
+        yield position, paragraph_end.start(1), paragraph_end.end(1)
+        position = paragraph_end.end(1)
+
+def _stream_paragraph_spans(stream: BinaryIO, start_offset: int, encoding: str
+                            ) -> Iterable[Tuple[bytes, int, int]]:
+    '''
+    Same as `_paragraph_spans` for a text read as a stream, a chunk at a
+    time, thus only the current paragraph and one chunk are in memory.
+
+    :param stream: Binary stream of the encoded text from its start.
+    :param start_offset: Byte offset of the start of a line to start from.
+    :param encoding: Encoding of the text.
+    :returns: Yields each paragraph, its start byte offset, and the byte
+              offset after the blank line that ends the paragraph.
+    '''
+    # Byte offset in the text of the start of the buffer.
+    buffer_offset = 0
+    while buffer_offset < start_offset:
+        skipped = len(stream.read(min(_STREAM_CHUNK_SIZE, start_offset - buffer_offset)))
+        if not skipped:
+            return
+        buffer_offset += skipped
+    buffer = stream.read(_STREAM_CHUNK_SIZE)
+    at_end = not buffer
+    # The whole Byte Order Mark is needed to remove it.
+    while not at_end and len(buffer) < len(codecs.BOM_UTF8):
+        chunk = stream.read(_STREAM_CHUNK_SIZE)
+        at_end = not chunk
+        buffer += chunk
+    position = _start_of_text(buffer, encoding) if buffer_offset == 0 else 0
+    while True:
+        for start, end, next_offset in _paragraph_spans(buffer, position):
+            # The paragraph, or the blank line ending it, may continue in
+            # the next chunk.
+            if next_offset >= len(buffer) and not at_end:
+                break
+            yield buffer[start:end], buffer_offset + start, buffer_offset + next_offset
+            position = next_offset
+        if at_end:
+            return
+        chunk = stream.read(_STREAM_CHUNK_SIZE)
+        at_end = not chunk
+        buffer_offset += position
+        buffer = buffer[position:] + chunk
+        position = 0
+
+def _decode(paragraph: bytes) -> str:
+    text = paragraph.decode('utf-8')
+    # Same new line handling as reading the file in text mode.
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    return text
+
+def _yield_paragraphs(fp: Path, start_offset: int, encoding: str,
+                      end_offset: Optional[int]) -> Iterable[Tuple[str, int, int]]:
+    '''
+    Same as `yield_paragraph_offsets` but also yields the byte offset in the
+    file read from, which for a compressed text file is in the compressed
+    file, after reading each paragraph.
+    '''
+    _check_encoding(encoding)
+    with _open_stream(fp) as (stream, raw_file):
+        if stream is None:
+            with _map_file(fp, encoding) as mapped:
+                if isinstance(mapped, mmap.mmap) and hasattr(mapped, 'madvise'):
+                    mapped.madvise(mmap.MADV_SEQUENTIAL)
+                start_offset = max(start_offset, _start_of_text(mapped, encoding))
+                for start, end, next_offset in _paragraph_spans(mapped, start_offset):
+                    if end_offset is not None and start >= end_offset:
+                        return
+                    yield _decode(mapped[start:end]), next_offset, next_offset
+            return
+        for paragraph, start, next_offset in _stream_paragraph_spans(stream, start_offset,
+                                                                     encoding):
+            if end_offset is not None and start >= end_offset:
+                return
+            input_offset = next_offset if raw_file is None else raw_file.tell()
+            yield _decode(paragraph), next_offset, input_offset
+
+def yield_paragraph_offsets(fp: Path, start_offset: int = 0,
+                            encoding: str = 'utf-8-sig',
+                            end_offset: Optional[int] = None
+                            ) -> Iterable[Tuple[str, int]]:
+    '''
+    Same as `yield_paragraphs` but also yields the byte offset in the file
+    after each paragraph, reading from this offset with `start_offset`
+    yields the paragraphs after that paragraph.
+
+    :param fp: File path to a text, see `yield_paragraphs`.
+    :param start_offset: Byte offset in the file to start reading from,
+                         should be an offset yielded by this function. For a
+                         compressed text file the byte offsets are in the
+                         decompressed text.
+    :param encoding: Encoding of the text, UTF-8 (`utf-8` or `utf-8-sig`) or
+                     ASCII.
+    :param end_offset: If given, stops before the first paragraph that
+                       starts at or after this byte offset.
+    :returns: Yields tuples of paragraph and the byte offset after the
+              paragraph, in order from start of file to the end.
+    '''
+    for paragraph, next_offset, _ in _yield_paragraphs(fp, start_offset, encoding,
+                                                       end_offset):
+        yield paragraph, next_offset
+
+def yield_paragraphs(fp: Path, encoding: str = 'utf-8-sig',
+                     start_offset: int = 0) -> Iterable[str]:
+    '''
+    Given a file path to a text it will iteratively
+    yield each paragraph within the text until the end of the file.
+
+    A paragraph is defined as continuos block of text. As soon as a blank new
+    line exists a new paragraph is started and the old paragraph is yielded.
+
+    The file is memory mapped and each paragraph is decoded from one slice of
+    the file, thus the memory used does not depend on the size of the file.
+    A text file compressed by gzip, bz2, xz, or zstd, detected from the
+    bytes it starts with, and a member of a tar archive are instead
+    decompressed as they are read, a chunk at a time.
+
+    :param fp: File path to a text, or to a member of a tar archive, see
+               `hec_tagging.archives.member_fp`.
+    :param encoding: Encoding of the text. The default `utf-8-sig` removes
+                     the Byte Order Mark that starts the Project Gutenberg
+                     books, and reads UTF-8 files without one as normal.
+    :param start_offset: Byte offset in the file to start reading from, see
+                         `yield_paragraph_offsets`.
+    :returns: Yields paragraphs of text from the file in order from start of
+              file to the end.
+    '''
+    for paragraph, _ in yield_paragraph_offsets(fp, start_offset, encoding):
+        yield paragraph
+
+class ParagraphOffsets():
+    '''
+    Reads the paragraphs of a text file, see `yield_paragraph_offsets`, and
+    keeps the byte offset after each paragraph until it has been processed.
+    Thus the byte offset after the processed paragraphs is known even when
+    later paragraphs have already been read, e.g. batched ahead of time by a
+    `hec_tagging.parallel.TaggingPool`.
+    '''
+
+    def __init__(self, fp: Path, start_offset: int = 0,
+                 encoding: str = 'utf-8-sig',
+                 end_offset: Optional[int] = None) -> None:
+        '''
+        :param fp: File path to a text.
+        :param start_offset: Byte offset in the file to start reading from.
+        :param encoding: Encoding of the text.
+        :param end_offset: Byte offset in the file to stop reading at, see
+                           `yield_paragraph_offsets`.
+        '''
+        self.fp = fp
+        self.encoding = encoding
+        self.start_offset = start_offset
+        self.end_offset = end_offset
+        # Byte offset after the paragraphs that have been processed.
+        self.offset = start_offset
+        # Byte offset in the file read from after the paragraphs that have
+        # been processed, differs from `offset` for a compressed text file
+        # as it is in the compressed file, which is read from its start.
+        self.input_offset = start_offset
+        if (start_offset and split_member_fp(fp)[1] is None
+                and detect_compression(fp) is not None):
+            self.input_offset = 0
+        self._offsets: Deque[Tuple[int, int]] = deque()
+
+    def paragraphs(self) -> Iterable[str]:
+        '''
+        :returns: Yields the paragraphs from the start offset.
+        '''
+        for paragraph, offset, input_offset in _yield_paragraphs(self.fp, self.start_offset,
+                                                                 self.encoding,
+                                                                 self.end_offset):
+            self._offsets.append((offset, input_offset))
+            yield paragraph
+
+    def processed(self, number_paragraphs: int) -> int:
+        '''
+        :param number_paragraphs: Number of paragraphs that have been
+                                  processed, in the order they were read.
+        :returns: Byte offset after the processed paragraphs.
+        '''
+        for _ in range(number_paragraphs):
+            self.offset, self.input_offset = self._offsets.popleft()
+        return self.offset
+
+class ParagraphIndex():
+    '''
+    An index of the start and end byte offsets of every paragraph, see
+    `yield_paragraphs`, in a text file, built in one pass over the memory
+    mapped file. A compressed text file, or a member of a tar archive, cannot
+    be mapped and is instead decompressed into memory. The offsets are
+    stored in two arrays of 8 byte integers rather than storing the
+    paragraphs, allowing random access to any paragraph and splitting the
+    file into shards by byte offset.
+
+    The file stays mapped until `close` is called, can be used as a context
+    manager which closes the index on exit.
+    '''
+
+    def __init__(self, fp: Path, encoding: str = 'utf-8-sig') -> None:
+        '''
+        :param fp: File path to a text.
+        :param encoding: Encoding of the text, see `yield_paragraph_offsets`.
+        '''
+        self.fp = fp
+        self.encoding = encoding
+        self.starts = array('q')
+        self.ends = array('q')
+        self._exit_stack = ExitStack()
+        self._mapped: Optional[Union[mmap.mmap, bytes]] = \
+            self._exit_stack.enter_context(_read_text(fp, encoding))
+        start_of_text = _start_of_text(self._mapped, encoding)
+        for start, end, _ in _paragraph_spans(self._mapped, start_of_text):
+            self.starts.append(start)
+            self.ends.append(end)
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __getitem__(self, paragraph_number: int) -> str:
+        '''
+        :param paragraph_number: Number of the paragraph, starting from 0.
+        :returns: The paragraph.
+        '''
+        if self._mapped is None:
+            raise ValueError(f'The paragraph index of {self.fp} is closed')
+        start, end = self.span(paragraph_number)
+        return _decode(self._mapped[start:end])
+
+    def span(self, paragraph_number: int) -> Tuple[int, int]:
+        '''
+        :param paragraph_number: Number of the paragraph, starting from 0.
+        :returns: The start and end byte offset of the paragraph.
+        '''
+        return self.starts[paragraph_number], self.ends[paragraph_number]
+
+    def paragraphs(self, start: int = 0, stop: Optional[int] = None
+                   ) -> Iterable[str]:
+        '''
+        :param start: Number of the first paragraph.
+        :param stop: Number of the paragraph to stop before, if None all of
+                     the paragraphs after `start` are yielded.
+        :returns: Yields the paragraphs in order.
+        '''
+        for paragraph_number in range(*slice(start, stop).indices(len(self))):
+            yield self[paragraph_number]
+
+    def paragraph_range(self, start_offset: int, end_offset: int) -> range:
+        '''
+        :param start_offset: Start byte offset in the file.
+        :param end_offset: End byte offset in the file.
+        :returns: The numbers of the paragraphs that start within the byte
+                  offsets. Consecutive byte ranges that cover the file, e.g.
+                  the file split into shards of equal size, give paragraph
+                  ranges that cover every paragraph exactly once.
+        '''
+        return range(bisect_left(self.starts, start_offset),
+                     bisect_left(self.starts, end_offset))
+
+    def close(self) -> None:
+        if self._mapped is not None:
+            self._mapped = None
+            self._exit_stack.close()
+
+    def __enter__(self) -> 'ParagraphIndex':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
@@ -0,0 +1,334 @@
+import json
+import os
+from pathlib import Path
+import queue
+import socket
+import socketserver
+import struct
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from .backends import Entity, TaggingBackend
+from .utils import get_stdout_logger
+
+# Each message is a 4 byte big endian length followed by that many bytes of
+# UTF-8 JSON.
+_HEADER = struct.Struct('>I')
+
+def send_message(connection: socket.socket, message: Dict[str, Any]) -> None:
+    '''
+    :param connection: Connected socket.
+    :param message: JSON serialisable message to send.
+    '''
+    data = json.dumps(message, ensure_ascii=False).encode('utf-8')
+    connection.sendall(_HEADER.pack(len(data)) + data)
+
+def _receive_exactly(connection: socket.socket, number_bytes: int
+                     ) -> Optional[bytes]:
+    chunks: List[bytes] = []
+    remaining = number_bytes
+    while remaining:
+        chunk = connection.recv(min(remaining, 1024**2))
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b''.join(chunks)
+
+def receive_message(connection: socket.socket) -> Optional[Dict[str, Any]]:
+    '''
+    :param connection: Connected socket.
+    :returns: The next message, None if the other end closed the connection.
+    :raises ConnectionError: If the connection closed part way through a
+                             message.
+    '''
+    header = _receive_exactly(connection, _HEADER.size)
+    if header is None:
+        return None
+    data = _receive_exactly(connection, _HEADER.unpack(header)[0])
+    if data is None:
+        raise ConnectionError('The connection closed part way through a message')
+    return json.loads(data.decode('utf-8'))
+
+class _Request():
+    '''
+    Paragraphs sent by a client, waiting to be tagged by the dispatcher.
+    '''
+
+    def __init__(self, paragraphs: List[str]) -> None:
+        self.paragraphs = paragraphs
+        self.entities: List[List[Entity]] = []
+        self.error: Optional[str] = None
+        self.done = threading.Event()
+
+class _RequestHandler(socketserver.BaseRequestHandler):
+
+    def handle(self) -> None:
+        tagging_server: TaggingServer = self.server.tagging_server  # type: ignore
+        tagging_server.connection_opened()
+        try:
+            self._handle_messages(tagging_server)
+        finally:
+            tagging_server.connection_closed()
+
+    def _handle_messages(self, tagging_server: 'TaggingServer') -> None:
+        while True:
+            try:
+                message = receive_message(self.request)
+            except (ConnectionError, ValueError):
+                return
+            if message is None:
+                return
+            if 'paragraphs' in message:
+                request = _Request(message['paragraphs'])
+                tagging_server.submit(request)
+                request.done.wait()
+                if request.error is not None:
+                    send_message(self.request, {'error': request.error})
+                else:
+                    send_message(self.request,
+                                 {'entities': [[list(entity) for entity in entities]
+                                               for entities in request.entities]})
+            elif 'model_identity' in message:
+                send_message(self.request,
+                             {'model_identity': tagging_server.model_identity})
+            else:
+                send_message(self.request,
+                             {'error': f'Unknown request: {sorted(message)}'})
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def _socket_in_use(socket_fp: Path) -> bool:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as test_socket:
+        try:
+            test_socket.connect(str(socket_fp))
+        except OSError:
+            return False
+    return True
+
+class TaggingServer():
+    '''
+    Keeps a backend's model loaded and tags paragraphs sent by clients, see
+    `RemoteBackend`, over a Unix socket, thus many short tagging jobs on the
+    same node share one loaded model rather than each loading the model.
+
+    Each client connection is served by its own thread, while one
+    dispatcher thread tags with the model. The dispatcher merges requests
+    that arrive within `max_wait` seconds of each other, up to the batch
+    size, into one batch, thus clients sending small batches at the same
+    time still give the model large batches. With only one client connected
+    the dispatcher does not wait.
+
+    The socket is only accessible by the user running the server.
+    '''
+
+    def __init__(self, backend: TaggingBackend, socket_fp: Path,
+                 max_wait: float = 0.01) -> None:
+        '''
+        :param backend: Backend to tag with, loaded when the server starts.
+        :param socket_fp: File path of the Unix socket to listen on.
+        :param max_wait: Maximum seconds to wait for more requests to merge
+                         into a batch.
+        '''
+        self.backend = backend
+        self.socket_fp = socket_fp
+        self.max_wait = max_wait
+        self.model_identity = ''
+        self.number_requests = 0
+        self.number_paragraphs = 0
+        self.number_batches = 0
+        self._number_connections = 0
+        self._connections_lock = threading.Lock()
+        self._requests: 'queue.Queue[Optional[_Request]]' = queue.Queue()
+        self._server: Optional[_UnixServer] = None
+        self._dispatcher: Optional[threading.Thread] = None
+
+    def connection_opened(self) -> None:
+        with self._connections_lock:
+            self._number_connections += 1
+
+    def connection_closed(self) -> None:
+        with self._connections_lock:
+            self._number_connections -= 1
+
+    def submit(self, request: _Request) -> None:
+        self._requests.put(request)
+
+    def _next_batch(self, first_request: _Request) -> List[_Request]:
+        requests = [first_request]
+        number_paragraphs = len(first_request.paragraphs)
+        deadline = time.perf_counter() + self.max_wait
+        while number_paragraphs < self.backend.batch_size:
+            # Waiting for the client that sent the request is pointless.
+            timeout = deadline - time.perf_counter()
+            if self._number_connections < 2:
+                timeout = 0
+            try:
+                if timeout <= 0:
+                    request = self._requests.get_nowait()
+                else:
+                    request = self._requests.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if request is None:
+                # Stop after this batch.
+                self._requests.put(None)
+                break
+            requests.append(request)
+            number_paragraphs += len(request.paragraphs)
+        return requests
+
+    def _dispatch(self) -> None:
+        while True:
+            first_request = self._requests.get()
+            if first_request is None:
+                return
+            requests = self._next_batch(first_request)
+            paragraphs = [paragraph for request in requests
+                          for paragraph in request.paragraphs]
+            try:
+                batch_entities = self.backend.tag_batch(paragraphs)
+            except Exception as error:
+                for request in requests:
+                    request.error = repr(error)
+                    request.done.set()
+                continue
+            self.number_requests += len(requests)
+            self.number_paragraphs += len(paragraphs)
+            self.number_batches += 1
+            start = 0
+            for request in requests:
+                end = start + len(request.paragraphs)
+                request.entities = batch_entities[start:end]
+                request.done.set()
+                start = end
+
+    def start(self) -> None:
+        '''
+        Loads the model and starts listening on the socket in background
+        threads.
+
+        :raises ValueError: If another server is listening on the socket.
+        '''
+        if self.socket_fp.exists():
+            if _socket_in_use(self.socket_fp):
+                raise ValueError(f'A server is already listening on {self.socket_fp}')
+            # Left behind by a server that did not stop cleanly.
+            self.socket_fp.unlink()
+        if not self.backend.loaded:
+            self.backend.load()
+        self.model_identity = self.backend.model_identity()
+        self._dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+        self._dispatcher.start()
+        self.socket_fp.parent.mkdir(parents=True, exist_ok=True)
+        # Creates the socket with user only permissions.
+        previous_umask = os.umask(0o177)
+        try:
+            self._server = _UnixServer(str(self.socket_fp), _RequestHandler)
+        finally:
+            os.umask(previous_umask)
+        self._server.tagging_server = self  # type: ignore
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def stop(self) -> None:
+        '''
+        Stops listening, finishes the batch being tagged, and removes the
+        socket.
+        '''
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self._dispatcher is not None:
+            self._requests.put(None)
+            self._dispatcher.join()
+            self._dispatcher = None
+        if self.socket_fp.exists():
+            self.socket_fp.unlink()
+
+    def serve_forever(self) -> None:
+        '''
+        Starts the server and serves until the process is interrupted, e.g.
+        by Ctrl-C, `qdel`, or `kill`, then stops it.
+        '''
+        import signal
+
+        logger = get_stdout_logger(__name__)
+        # Stop on SIGTERM, as sent by `kill` and by SGE, like Ctrl-C.
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        self.start()
+        logger.info(f'Serving {self.model_identity} on {self.socket_fp}')
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+            logger.info(f'Served {self.number_requests} requests, '
+                        f'{self.number_paragraphs} paragraphs in '
+                        f'{self.number_batches} batches')
+
+    def __enter__(self) -> 'TaggingServer':
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.stop()
+
+class RemoteBackend(TaggingBackend):
+    '''
+    Tags paragraphs by sending them to a `TaggingServer`, thus no model is
+    loaded in this process. `load` connects to the server, and like the
+    other backends it can be given to the worker processes of a
+    `hec_tagging.parallel.TaggingPool`, each connecting to the server.
+    '''
+
+    name = 'remote'
+
+    def __init__(self, socket_fp: Path, batch_size: int) -> None:
+        '''
+        :param socket_fp: File path of the server's Unix socket.
+        :param batch_size: Number of paragraphs to send at a time.
+        '''
+        super().__init__(batch_size)
+        self.socket_fp = socket_fp
+        self._connection: Optional[socket.socket] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._connection is not None
+
+    def load(self) -> None:
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.connect(str(self.socket_fp))
+        self._connection = connection
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # A connection cannot be given to another process.
+        state = self.__dict__.copy()
+        state['_connection'] = None
+        return state
+
+    def _request(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        if not self.loaded:
+            self.load()
+        assert self._connection is not None
+        send_message(self._connection, message)
+        response = receive_message(self._connection)
+        if response is None:
+            raise ConnectionError(f'The server at {self.socket_fp} closed the connection')
+        if 'error' in response:
+            raise RuntimeError(f'The server at {self.socket_fp} failed to tag: '
+                               f'{response["error"]}')
+        return response
+
+    def tag_batch(self, paragraphs: List[str]) -> List[List[Entity]]:
+        response = self._request({'paragraphs': paragraphs})
+        return [[Entity(*entity) for entity in entities]
+                for entities in response['entities']]
+
+    def model_identity(self) -> str:
+        return self._request({'model_identity': True})['model_identity']
@@ -0,0 +1,150 @@
+import copy
+import re
+from typing import List, Tuple
+
+from .backends import Entity, TaggingBackend
+
+# Where a paragraph is split, in order of preference: after the end of a
+# sentence, at the end of a line, or at any white space. A paragraph is
+# split after the white space, thus each piece starts with text.
+_SPLIT_POINTS = (re.compile(r'[.!?]["\')\]’”]*\s+'),
+                 re.compile(r'\n\s*'),
+                 re.compile(r'\s+'))
+
+def _split_point(paragraph: str, start: int, max_chars: int) -> int:
+    '''
+    :returns: Character offset of the end of the piece of the paragraph
+              starting at `start`, at most `max_chars` characters after it.
+    '''
+    end = start + max_chars
+    if len(paragraph) <= end:
+        return len(paragraph)
+    # A split point in the second half of the piece is preferred to a better
+    # split point early on, which would give many small pieces.
+    for minimum_end in (start + max_chars // 2, start + 1):
+        for split_point in _SPLIT_POINTS:
+            last_end = None
+            for match in split_point.finditer(paragraph, start, end):
+                last_end = match.end()
+            if last_end is not None and last_end >= minimum_end:
+                return last_end
+    # No white space, e.g. a long URL or base64 data.
+    return end
+
+def split_paragraph(paragraph: str, max_chars: int) -> List[Tuple[int, str]]:
+    '''
+    Splits a paragraph into consecutive pieces of at most `max_chars`
+    characters, preferably after the end of a sentence, else at the end of a
+    line, else at white space, only splitting part way through a word when a
+    piece would contain no white space.
+
+    :param paragraph: The paragraph to split.
+    :param max_chars: Maximum number of characters in a piece.
+    :returns: The character offset in the paragraph of the start of each
+              piece and the piece, which joined together are the paragraph.
+              The paragraph itself if it is not longer than `max_chars`.
+    :raises ValueError: If `max_chars` is less than 1.
+    '''
+    if max_chars < 1:
+        raise ValueError(f'The maximum number of characters has to be at least 1: {max_chars}')
+    if len(paragraph) <= max_chars:
+        return [(0, paragraph)]
+    pieces: List[Tuple[int, str]] = []
+    start = 0
+    while start < len(paragraph):
+        end = _split_point(paragraph, start, max_chars)
+        pieces.append((start, paragraph[start:end]))
+        start = end
+    return pieces
+
+class SplittingBackend(TaggingBackend):
+    '''
+    Wraps a backend so that paragraphs longer than `max_paragraph_chars`,
+    e.g. the megabyte paragraphs of OCR output or text converted from HTML
+    without blank lines, are split into pieces, see `split_paragraph`,
+    before they are given to the model. The pieces are tagged in batches of
+    up to the batch size, thus the model is never given more than
+    `batch_size * max_paragraph_chars` characters at a time whatever the
+    text files contain, and the Named Entities' character offsets are moved
+    back to be relative to the start of the whole paragraph. A batch without
+    long paragraphs is given to the model as it is.
+
+    A Named Entity that crosses a split point is found as two Named Entities
+    or not at all, thus the limit should be far larger than a typical
+    paragraph, e.g. 10,000 characters.
+
+    Like the other backends it only stores its settings when created, thus
+    it can be given to the worker processes of a
+    `hec_tagging.parallel.TaggingPool`.
+    '''
+
+    def __init__(self, backend: TaggingBackend, max_paragraph_chars: int) -> None:
+        '''
+        :param backend: Backend that tags the paragraphs and pieces.
+        :param max_paragraph_chars: Maximum number of characters of a
+                                    paragraph given to the model.
+        :raises ValueError: If `max_paragraph_chars` is less than 1.
+        '''
+        if max_paragraph_chars < 1:
+            raise ValueError('The maximum number of characters of a paragraph '
+                             f'has to be at least 1: {max_paragraph_chars}')
+        self.backend = backend
+        self.max_paragraph_chars = max_paragraph_chars
+        self.name = backend.name
+        self.number_split = 0
+
+    @property
+    def batch_size(self) -> int:  # type: ignore[override]
+        return self.backend.batch_size
+
+    @batch_size.setter
+    def batch_size(self, batch_size: int) -> None:
+        self.backend.batch_size = batch_size
+
+    @property
+    def use_gpu(self) -> bool:  # type: ignore[override]
+        return self.backend.use_gpu
+
+    @property
+    def loaded(self) -> bool:
+        return self.backend.loaded
+
+    def load(self) -> None:
+        self.backend.load()
+
+    def __copy__(self) -> 'SplittingBackend':
+        # A copy, e.g. loaded for tuning, should not load the wrapped backend
+        # of the original.
+        copied = SplittingBackend(copy.copy(self.backend), self.max_paragraph_chars)
+        copied.number_split = self.number_split
+        return copied
+
+    def tag_batch(self, paragraphs: List[str]) -> List[List[Entity]]:
+        if all(len(paragraph) <= self.max_paragraph_chars for paragraph in paragraphs):
+            return self.backend.tag_batch(paragraphs)
+        # Each piece's paragraph index and character offset in the paragraph.
+        piece_origins: List[Tuple[int, int]] = []
+        pieces: List[str] = []
+        for paragraph_index, paragraph in enumerate(paragraphs):
+            paragraph_pieces = split_paragraph(paragraph, self.max_paragraph_chars)
+            if len(paragraph_pieces) > 1:
+                self.number_split += 1
+            for start_char, piece in paragraph_pieces:
+                piece_origins.append((paragraph_index, start_char))
+                pieces.append(piece)
+        batch_entities: List[List[Entity]] = [[] for _ in paragraphs]
+        batch_size = max(1, self.batch_size)
+        for batch_start in range(0, len(pieces), batch_size):
+            batch_end = batch_start + batch_size
+            pieces_entities = self.backend.tag_batch(pieces[batch_start:batch_end])
+            for (paragraph_index, start_char), entities in zip(piece_origins[batch_start:batch_end],
+                                                               pieces_entities):
+                batch_entities[paragraph_index].extend(
+                    Entity(entity.text, entity.label, entity.start_char + start_char,
+                           entity.end_char + start_char)
+                    for entity in entities)
+        return batch_entities
+
+    def model_identity(self) -> str:
+        return (f'{self.backend.model_identity()} '
+                f'max_paragraph_chars={self.max_paragraph_chars}')
@@ -0,0 +1,204 @@
+import json
+import os
+from pathlib import Path
+from resource import getrusage, RUSAGE_SELF
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from .utils import bytes_to_GB
+
+# Process statistics are read from /proc on Linux, e.g. the HEC.
+_PROC = Path('/proc')
+
+def telemetry_fp(output_fp: Path) -> Path:
+    '''
+    :param output_fp: File path, or directory, of the output.
+    :returns: File path of the telemetry time series next to the output.
+    '''
+    return output_fp.with_name(output_fp.name + '.telemetry.jsonl')
+
+def _child_process_ids(process_id: int) -> List[int]:
+    '''
+    :returns: The process ids of all of the descendants of the process, e.g.
+              the worker processes of a `hec_tagging.parallel.TaggingPool`.
+    '''
+    child_ids: List[int] = []
+    try:
+        for task_directory in Path(_PROC, str(process_id), 'task').iterdir():
+            children = Path(task_directory, 'children').read_text().split()
+            child_ids.extend(int(child_id) for child_id in children)
+    except OSError:
+        return child_ids
+    for child_id in list(child_ids):
+        child_ids.extend(_child_process_ids(child_id))
+    return child_ids
+
+def _process_usage(process_id: int) -> Optional[Tuple[int, float, int, int]]:
+    '''
+    :returns: The resident memory in bytes, the CPU time (user and system) in
+              seconds, and the number of bytes read from and written to
+              storage by the process. None if the process has exited. The
+              bytes read and written are 0 if they cannot be read.
+    '''
+    process_directory = Path(_PROC, str(process_id))
+    try:
+        resident_pages = int((process_directory / 'statm').read_text().split()[1])
+        # The command name, second field, can contain spaces.
+        stat = (process_directory / 'stat').read_text().rsplit(')', 1)[1].split()
+    except (OSError, IndexError):
+        return None
+    # utime and stime, the 14th and 15th fields, in clock ticks.
+    cpu_time = (int(stat[11]) + int(stat[12])) / os.sysconf('SC_CLK_TCK')
+    read_bytes = write_bytes = 0
+    try:
+        for line in (process_directory / 'io').read_text().splitlines():
+            name, value = line.split(':')
+            if name == 'read_bytes':
+                read_bytes = int(value)
+            elif name == 'write_bytes':
+                write_bytes = int(value)
+    except OSError:
+        pass
+    return (resident_pages * os.sysconf('SC_PAGE_SIZE'), cpu_time, read_bytes,
+            write_bytes)
+
+class TelemetrySampler():
+    '''
+    Samples the resources used by this process, and its child processes, on
+    a background thread at a fixed interval and writes each sample as a line
+    of JSON to a file, thus the tagging loop does not contain any monitoring
+    code. Each sample contains:
+
+    1. `time` -- seconds since the sampler started.
+    2. `rss_GB` -- resident memory (RAM) of the processes.
+    3. `max_rss_GB` -- peak resident memory of this process so far, from
+       `getrusage`, which includes peaks between samples.
+    4. `cpu_time` -- user and system CPU seconds used by the processes.
+    5. `read_bytes` and `write_bytes` -- bytes read from and written to
+       storage by the processes.
+    6. `number_processes` -- number of processes sampled.
+    7. `gpu_memory_GB` -- memory used on the first GPU, through NVML, only
+       when sampling the GPU.
+
+    Without /proc (not Linux) only this process is sampled through
+    `getrusage`, `rss_GB` is then the peak resident memory and the storage
+    counters are 0.
+
+    Can be used as a context manager, which starts and stops the sampler.
+    '''
+
+    def __init__(self, output_fp: Path, interval: float = 1.0,
+                 use_gpu: bool = False, include_children: bool = True) -> None:
+        '''
+        :param output_fp: File path to write the samples too, JSON lines.
+        :param interval: Seconds between samples.
+        :param use_gpu: Whether to sample the GPU memory, requires `pynvml`.
+        :param include_children: Whether to include the child processes, e.g.
+                                 worker processes, in each sample.
+        '''
+        self.output_fp = output_fp
+        self.interval = interval
+        self.use_gpu = use_gpu
+        self.include_children = include_children
+        self.peak_rss = 0.0
+        self.peak_gpu_memory = 0.0
+        self.number_samples = 0
+        self._gpu_handle = None
+        self._start_time = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._output_file = None
+
+    def sample(self) -> Dict[str, Any]:
+        '''
+        :returns: The current resource usage, see the class description.
+        '''
+        rusage = getrusage(RUSAGE_SELF)
+        # (1024**2) converts it to GB from KB
+        max_rss = rusage.ru_maxrss / (1024**2)
+        process_ids = [os.getpid()]
+        if self.include_children:
+            process_ids.extend(_child_process_ids(os.getpid()))
+        usages = [usage for usage in map(_process_usage, process_ids)
+                  if usage is not None]
+        if usages:
+            rss = bytes_to_GB(sum(usage[0] for usage in usages))
+            cpu_time = sum(usage[1] for usage in usages)
+            read_bytes = sum(usage[2] for usage in usages)
+            write_bytes = sum(usage[3] for usage in usages)
+        else:
+            rss = max_rss
+            cpu_time = rusage.ru_utime + rusage.ru_stime
+            read_bytes = write_bytes = 0
+        sample = {'time': round(time.perf_counter() - self._start_time, 3),
+                  'rss_GB': round(rss, 4), 'max_rss_GB': round(max_rss, 4),
+                  'cpu_time': round(cpu_time, 2), 'read_bytes': read_bytes,
+                  'write_bytes': write_bytes,
+                  'number_processes': max(1, len(usages))}
+        self.peak_rss = max(self.peak_rss, rss, max_rss)
+        if self.use_gpu:
+            from pynvml import nvmlDeviceGetMemoryInfo
+
+            gpu_memory = bytes_to_GB(nvmlDeviceGetMemoryInfo(self._gpu_handle).used)
+            sample['gpu_memory_GB'] = round(gpu_memory, 4)
+            self.peak_gpu_memory = max(self.peak_gpu_memory, gpu_memory)
+        return sample
+
+    def _write_sample(self) -> None:
+        assert self._output_file is not None
+        self._output_file.write(json.dumps(self.sample()) + '\n')
+        self._output_file.flush()
+        self.number_samples += 1
+
+    def _sample_until_stopped(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._write_sample()
+
+    def start(self) -> None:
+        if self.use_gpu:
+            from pynvml import nvmlInit, nvmlDeviceGetHandleByIndex
+
+            nvmlInit()
+            # Assuming we only have access to one GPU
+            self._gpu_handle = nvmlDeviceGetHandleByIndex(0)
+        self._stop.clear()
+        self._start_time = time.perf_counter()
+        self.output_fp.parent.mkdir(parents=True, exist_ok=True)
+        self._output_file = self.output_fp.open('w')
+        self._write_sample()
+        self._thread = threading.Thread(target=self._sample_until_stopped,
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        '''
+        Stops the sampler after taking a final sample.
+        '''
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self._write_sample()
+        assert self._output_file is not None
+        self._output_file.close()
+        if self.use_gpu:
+            from pynvml import nvmlShutdown
+
+            nvmlShutdown()
+
+    def __enter__(self) -> 'TelemetrySampler':
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.stop()
+
+def read_telemetry(telemetry_fp: Path) -> List[Dict[str, Any]]:
+    '''
+    :param telemetry_fp: File path of samples written by `TelemetrySampler`.
+    :returns: The samples in time order.
+    '''
+    with telemetry_fp.open('r') as telemetry_file:
+        return [json.loads(line) for line in telemetry_file if line.strip()]
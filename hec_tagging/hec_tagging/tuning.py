@@ -0,0 +1,171 @@
+from itertools import islice
+from pathlib import Path
+from resource import getrusage, RUSAGE_SELF
+from typing import Iterable, List, NamedTuple, Optional, Sequence
+
+from .backends import TaggingBackend
+from .engine import tag_batches
+from .reader import yield_paragraphs
+from .utils import bytes_to_GB, get_stdout_logger
+
+class BatchSizeMeasurement(NamedTuple):
+    '''
+    The throughput and peak memory of tagging with one batch size.
+    '''
+    batch_size: int
+    paragraphs_per_second: float
+    peak_memory: float
+
+class PeakMemory():
+    '''
+    Tracks the peak memory used in GB, either the peak RAM of this process
+    (through `getrusage`) or the peak memory used on the first GPU (through
+    NVML, requires `pynvml`).
+    '''
+
+    def __init__(self, use_gpu: bool = False) -> None:
+        '''
+        :param use_gpu: Whether to track the GPU memory rather than RAM.
+        '''
+        self.use_gpu = use_gpu
+        self._gpu_handle = None
+        self._peak_gpu_memory = 0.0
+        if use_gpu:
+            from pynvml import nvmlInit, nvmlDeviceGetHandleByIndex
+
+            nvmlInit()
+            # Assuming we only have access to one GPU
+            self._gpu_handle = nvmlDeviceGetHandleByIndex(0)
+
+    def sample(self) -> float:
+        '''
+        :returns: The peak memory used in GB up to now. The RAM peak is the
+                  peak of the whole process, the GPU peak is the peak of the
+                  samples taken, thus sample after each batch.
+        '''
+        if not self.use_gpu:
+            # (1024**2) converts it to GB from KB
+            return getrusage(RUSAGE_SELF).ru_maxrss / (1024**2)
+        from pynvml import nvmlDeviceGetMemoryInfo
+
+        gpu_info = nvmlDeviceGetMemoryInfo(self._gpu_handle)
+        self._peak_gpu_memory = max(self._peak_gpu_memory,
+                                    bytes_to_GB(gpu_info.used))
+        return self._peak_gpu_memory
+
+    def close(self) -> None:
+        if self.use_gpu:
+            from pynvml import nvmlShutdown
+
+            nvmlShutdown()
+
+def sample_paragraphs(text_fps: Iterable[Path], number_paragraphs: int
+                      ) -> List[str]:
+    '''
+    :param text_fps: File paths to texts.
+    :param number_paragraphs: Maximum number of paragraphs to sample.
+    :returns: The first paragraphs of the texts, in order of the files.
+    '''
+    paragraphs: List[str] = []
+    for text_fp in text_fps:
+        paragraphs.extend(islice(yield_paragraphs(text_fp),
+                                 number_paragraphs - len(paragraphs)))
+        if len(paragraphs) == number_paragraphs:
+            break
+    return paragraphs
+
+def candidate_batch_sizes(max_batch_size: int) -> List[int]:
+    '''
+    :param max_batch_size: Largest batch size to try.
+    :returns: Powers of 2 less than `max_batch_size` followed by
+              `max_batch_size`, in ascending order.
+    '''
+    batch_sizes: List[int] = []
+    batch_size = 1
+    while batch_size < max_batch_size:
+        batch_sizes.append(batch_size)
+        batch_size *= 2
+    batch_sizes.append(max_batch_size)
+    return batch_sizes
+
+def measure_batch_sizes(backend: TaggingBackend, paragraphs: List[str],
+                        batch_sizes: Sequence[int],
+                        memory_cap: Optional[float] = None
+                        ) -> List[BatchSizeMeasurement]:
+    '''
+    Tags the paragraphs with each batch size in turn, measuring the
+    throughput and the peak memory used. The batch sizes are tried in
+    ascending order and stop after the first batch size that uses more
+    memory than the memory cap, as larger batch sizes use more memory.
+
+    :param backend: Backend to measure, loaded if it has not been. The
+                    backend's batch size is restored afterwards. Setting
+                    the batch size of a loaded backend has to change the
+                    batch size of its model, e.g. `StanzaBackend` changes
+                    the batch size of its pipeline's processors.
+    :param paragraphs: Paragraphs to tag with each batch size, should be at
+                       least as many paragraphs as the largest batch size.
+    :param batch_sizes: Batch sizes to try in ascending order.
+    :param memory_cap: Maximum memory in GB, see `PeakMemory`.
+    :returns: The measurement of each batch size tried.
+    '''
+    if not backend.loaded:
+        backend.load()
+    original_batch_size = backend.batch_size
+    peak_memory = PeakMemory(backend.use_gpu)
+    measurements: List[BatchSizeMeasurement] = []
+    try:
+        # The first call of a model can include one off setup costs.
+        backend.tag_batch(paragraphs[:1])
+        for batch_size in batch_sizes:
+            backend.batch_size = batch_size
+            processing_time = 0.0
+            peak_batch_memory = 0.0
+            for tagged_batch in tag_batches(paragraphs, backend):
+                processing_time += tagged_batch.processing_time
+                peak_batch_memory = max(peak_batch_memory, peak_memory.sample())
+            paragraphs_per_second = len(paragraphs) / max(processing_time, 1e-9)
+            measurements.append(BatchSizeMeasurement(batch_size,
+                                                     paragraphs_per_second,
+                                                     peak_batch_memory))
+            if memory_cap is not None and peak_batch_memory > memory_cap:
+                break
+    finally:
+        backend.batch_size = original_batch_size
+        peak_memory.close()
+    return measurements
+
+def tune_batch_size(backend: TaggingBackend, paragraphs: List[str],
+                    max_batch_size: int, memory_cap: Optional[float] = None
+                    ) -> int:
+    '''
+    :param backend: Backend to tune, see `measure_batch_sizes`.
+    :param paragraphs: A sample of the paragraphs that will be tagged.
+    :param max_batch_size: Largest batch size to try, the batch sizes tried
+                           are from `candidate_batch_sizes`.
+    :param memory_cap: Maximum memory in GB, see `PeakMemory`. If None the
+                       memory used is not limited.
+    :returns: The batch size with the largest throughput that uses at most
+              `memory_cap` memory. If every batch size uses more memory, the
+              smallest batch size.
+    :raises ValueError: If there are no paragraphs to tune with.
+    '''
+    if not paragraphs:
+        raise ValueError('Tuning the batch size requires at least one paragraph')
+    logger = get_stdout_logger(__name__)
+    batch_sizes = candidate_batch_sizes(max(1, min(max_batch_size, len(paragraphs))))
+    measurements = measure_batch_sizes(backend, paragraphs, batch_sizes,
+                                       memory_cap)
+    for measurement in measurements:
+        logger.info(f'Batch size {measurement.batch_size}: '
+                    f'{measurement.paragraphs_per_second:.2f} paragraphs per '
+                    f'second, peak memory {measurement.peak_memory:.4f}GB')
+    under_cap = [measurement for measurement in measurements
+                 if memory_cap is None or measurement.peak_memory <= memory_cap]
+    if not under_cap:
+        logger.warning(f'Every batch size used more than {memory_cap:.4f}GB, '
+                       f'using batch size {batch_sizes[0]}')
+        return batch_sizes[0]
+    best = max(under_cap, key=lambda measurement: measurement.paragraphs_per_second)
+    logger.info(f'Chosen batch size {best.batch_size}')
+    return best.batch_size
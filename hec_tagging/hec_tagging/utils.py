@@ -0,0 +1,45 @@
+import logging
+import os
+from pathlib import Path
+import sys
+
+def file_path(argument_str: str) -> Path:
+    '''
+    :param argument_str: String from a given argument.
+    :returns: Converts argument String to Path type.
+    '''
+    return Path(argument_str).resolve()
+
+def available_cpus() -> int:
+    '''
+    :returns: Number of CPUs the job can use. On the HEC this is the number
+              of slots given to the job (`NSLOTS`), else the number of CPUs
+              this process can run on.
+    '''
+    if os.environ.get('NSLOTS', '').isdigit():
+        return int(os.environ['NSLOTS'])
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def bytes_to_GB(number_bytes: int) -> float:
+    '''
+    :param number_bytes: Number of bytes.
+    :returns: The number of bytes converted to GB.
+    '''
+    return number_bytes / (1024**3)
+
+def get_stdout_logger(name: str) -> logging.Logger:
+    '''
+    :param name: Name of the logger.
+    :returns: A logger set at the INFO level that logs to stdout, the 
+              standard output file of a HEC job.
+    '''
+    logger = logging.getLogger(name)
+    logger.setLevel(logging.INFO)
+    if not logger.handlers:
+        stdout_handler = logging.StreamHandler(stream=sys.stdout)
+        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        stdout_handler.setFormatter(formatter)
+        logger.addHandler(stdout_handler)
+    return logger
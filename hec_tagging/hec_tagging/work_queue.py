@@ -0,0 +1,346 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+import socket
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set
+import uuid
+
+from .archives import text_stat
+from .files import FilePair
+from .utils import get_stdout_logger
+
+class WorkQueue():
+    '''
+    A queue of text files to tag that is shared, through a directory on a
+    shared file system, by any number of jobs, e.g. the tasks of an SGE array
+    job. Each job takes the next text file that no other job has taken until
+    none remain, thus the jobs finish at about the same time however the
+    sizes of the text files are spread, rather than a job given the largest
+    text files finishing long after the others.
+
+    A job takes a text file by creating its claim file, `{key}.claim`, which
+    only one job can create, and marks it done by creating `{key}.done` once
+    the output file has been fully written. The claim is a lease, a
+    background thread renews the claims this job holds every quarter of the
+    `lease_time`, a claim that has not been renewed within `lease_time`
+    seconds is from a job that has died, e.g. it was killed for running out
+    of time, and the text file is taken by the next job to look for work.
+    A job that has only stalled, rather than died, finds its claim taken
+    when it next renews it and should stop tagging the text file, see
+    `lost`. The lease expiry uses the clocks of the nodes, which on a cluster are
+    kept in sync, thus `lease_time` should be much longer than any
+    difference between them.
+    '''
+
+    def __init__(self, queue_directory: Path, lease_time: float = 600.0,
+                 worker_id: Optional[str] = None) -> None:
+        '''
+        :param queue_directory: Directory of the claim and done files,
+                                created if it does not exist. Every job
+                                taking from the queue must be given the
+                                same directory and the same text files.
+        :param lease_time: Seconds after which a claim that has not been
+                           renewed expires.
+        :param worker_id: Identifies this job in its claim files, by default
+                          the host name, process ID, and a random suffix.
+        '''
+        self.queue_directory = queue_directory
+        self.lease_time = lease_time
+        if worker_id is None:
+            worker_id = f'{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}'
+        self.worker_id = worker_id
+        self.number_claimed = 0
+        self.number_expired = 0
+        self.number_lost = 0
+        queue_directory.mkdir(parents=True, exist_ok=True)
+        self._keys: Dict[FilePair, str] = {}
+        self._held: Dict[str, FilePair] = {}
+        self._lost: Set[str] = set()
+        self._held_lock = threading.Lock()
+        self._last_renewed = time.time()
+        self._stop_renewing = threading.Event()
+        self._renewer: Optional[threading.Thread] = None
+        self._logger = get_stdout_logger(__name__)
+
+    def key(self, file_pair: FilePair) -> str:
+        '''
+        :param file_pair: A text file and the file to output its Named
+                          Entities too.
+        :returns: Name of the file pair in the queue directory, from the file
+                  paths and the size and modified time of the text file,
+                  thus a text file that has changed since it was done is
+                  queued again.
+        '''
+        if file_pair not in self._keys:
+            stat = text_stat(file_pair.text_fp)
+            file_pair_hash = hashlib.blake2b(f'{file_pair.text_fp}\0{file_pair.output_fp}\0'
+                                             f'{stat.size}\0{stat.mtime_ns}'
+                                             .encode('utf-8'), digest_size=16)
+            self._keys[file_pair] = file_pair_hash.hexdigest()
+        return self._keys[file_pair]
+
+    def _claim_fp(self, key: str) -> Path:
+        return Path(self.queue_directory, f'{key}.claim')
+
+    def _done_fp(self, key: str) -> Path:
+        return Path(self.queue_directory, f'{key}.done')
+
+    def is_done(self, file_pair: FilePair) -> bool:
+        '''
+        :param file_pair: A file pair in the queue.
+        :returns: Whether any job has finished tagging the file pair.
+        '''
+        return self._done_fp(self.key(file_pair)).exists()
+
+    def _claim_expired(self, claim_fp: Path) -> bool:
+        try:
+            return time.time() - claim_fp.stat().st_mtime > self.lease_time
+        except FileNotFoundError:
+            # Released or done since it was looked for.
+            return False
+
+    @staticmethod
+    def _read_claim(claim_fp: Path) -> Optional[Dict[str, Any]]:
+        try:
+            with claim_fp.open('r') as claim_file:
+                return json.load(claim_file)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _take_expired(self, claim_fp: Path) -> bool:
+        '''
+        Removes the expired claim, unless another job has taken or renewed
+        it since it was found to be expired.
+
+        :returns: Whether the expired claim was removed.
+        '''
+        expired_claim = self._read_claim(claim_fp)
+        if expired_claim is None or not self._claim_expired(claim_fp):
+            return False
+        # Only one job can rename the claim, however another job may have
+        # replaced the expired claim with its own claim, or the job holding
+        # it renewed it, between checking and renaming.
+        expired_fp = claim_fp.with_name(f'{claim_fp.name}.expired-{self.worker_id}')
+        try:
+            os.rename(str(claim_fp), str(expired_fp))
+        except FileNotFoundError:
+            return False
+        if (self._read_claim(expired_fp) != expired_claim
+                or not self._claim_expired(expired_fp)):
+            # Put back without replacing a claim created since the rename,
+            # the job whose claim it was then stops when it renews it.
+            try:
+                os.link(str(expired_fp), str(claim_fp))
+            except FileExistsError:
+                pass
+            expired_fp.unlink()
+            return False
+        expired_fp.unlink()
+        return True
+
+    def claim(self, file_pair: FilePair) -> bool:
+        '''
+        :param file_pair: A file pair in the queue.
+        :returns: Whether this job now holds the claim to tag the file pair,
+                  False if it is done or another job holds an unexpired
+                  claim to it.
+        '''
+        key = self.key(file_pair)
+        if self._done_fp(key).exists():
+            return False
+        claim_fp = self._claim_fp(key)
+        if claim_fp.exists():
+            if not self._take_expired(claim_fp):
+                return False
+            self.number_expired += 1
+            self._logger.info(f'The claim to {file_pair.text_fp} expired, '
+                              'claiming it again')
+        try:
+            claim_fd = os.open(str(claim_fp), os.O_CREAT | os.O_EXCL | os.O_WRONLY,
+                               0o644)
+        except FileExistsError:
+            return False
+        with os.fdopen(claim_fd, 'w') as claim_file:
+            json.dump({'worker_id': self.worker_id,
+                       'text_fp': str(file_pair.text_fp),
+                       'output_fp': str(file_pair.output_fp),
+                       'claimed': time.time()}, claim_file)
+        # Done between checking and claiming.
+        if self._done_fp(key).exists():
+            claim_fp.unlink()
+            return False
+        with self._held_lock:
+            self._held[key] = file_pair
+            self._lost.discard(key)
+        self.number_claimed += 1
+        return True
+
+    def _holds(self, key: str) -> bool:
+        claim = self._read_claim(self._claim_fp(key))
+        return claim is not None and claim.get('worker_id') == self.worker_id
+
+    def lost(self, file_pair: FilePair) -> bool:
+        '''
+        Should be called between batches while tagging the file pair, it only
+        reads the claim file if the claims have not been renewed for half of
+        the `lease_time`, e.g. after this job stalled.
+
+        :param file_pair: A file pair claimed by this job.
+        :returns: Whether the claim expired and was taken by another job, in
+                  which case this job should stop tagging the file pair, and
+                  neither write more of its output file nor mark it done, as
+                  the other job is now writing the output file.
+        '''
+        key = self.key(file_pair)
+        if time.time() - self._last_renewed > self.lease_time / 2:
+            self.renew()
+        with self._held_lock:
+            return key in self._lost
+
+    def complete(self, file_pair: FilePair) -> None:
+        '''
+        Marks the file pair as done, its output file should be fully written,
+        and releases the claim.
+
+        :param file_pair: A file pair claimed by this job.
+        '''
+        key = self.key(file_pair)
+        with self._held_lock:
+            self._held.pop(key, None)
+        holds_claim = self._holds(key)
+        if not holds_claim:
+            self._logger.warning(f'The claim to {file_pair.text_fp} expired '
+                                 'while it was being tagged, it may have '
+                                 'been tagged by another job at the same time')
+        self._done_fp(key).touch()
+        if holds_claim:
+            self._claim_fp(key).unlink()
+
+    def release(self, file_pair: FilePair) -> None:
+        '''
+        Releases the claim without marking the file pair as done, thus
+        another job can take it straight away, e.g. after failing to tag it.
+
+        :param file_pair: A file pair claimed by this job.
+        '''
+        key = self.key(file_pair)
+        with self._held_lock:
+            self._held.pop(key, None)
+        if self._holds(key):
+            self._claim_fp(key).unlink()
+
+    def renew(self) -> None:
+        '''
+        Renews the claims this job holds, a claim that another job has taken
+        is no longer held and is marked as lost, see `lost`.
+        '''
+        with self._held_lock:
+            held = list(self._held.items())
+        current_time = time.time()
+        for key, file_pair in held:
+            if self._holds(key):
+                try:
+                    os.utime(str(self._claim_fp(key)), (current_time, current_time))
+                    continue
+                except FileNotFoundError:
+                    pass
+            self._logger.warning(f'The claim to {file_pair.text_fp} '
+                                 'expired and was taken by another job, '
+                                 'stopping tagging it')
+            with self._held_lock:
+                if self._held.pop(key, None) is not None:
+                    self._lost.add(key)
+                    self.number_lost += 1
+        self._last_renewed = current_time
+
+    def _renew_claims(self) -> None:
+        while not self._stop_renewing.wait(self.lease_time / 4):
+            self.renew()
+
+    def start(self) -> None:
+        '''
+        Starts renewing the claims this job holds on a background thread.
+        '''
+        self._stop_renewing.clear()
+        self._last_renewed = time.time()
+        self._renewer = threading.Thread(target=self._renew_claims, daemon=True)
+        self._renewer.start()
+
+    def stop(self) -> None:
+        '''
+        Stops renewing claims and releases the claims still held, e.g. when
+        tagging failed.
+        '''
+        if self._renewer is not None:
+            self._stop_renewing.set()
+            self._renewer.join()
+            self._renewer = None
+        with self._held_lock:
+            held = list(self._held.values())
+        for file_pair in held:
+            self.release(file_pair)
+
+    def __enter__(self) -> 'WorkQueue':
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.stop()
+
+    def claims(self, file_pairs: Iterable[FilePair],
+               on_done: Optional[Callable[[FilePair], None]] = None,
+               wait: bool = False) -> Iterator[FilePair]:
+        '''
+        Claims and yields the file pairs one at a time, in the given order,
+        each should be tagged and then marked done, see `complete`, before
+        the next is claimed. Once none can be claimed this stops, leaving
+        the file pairs claimed by other jobs to those jobs, thus an idle job
+        does not hold on to its resources.
+
+        :param file_pairs: File pairs in the queue, in the order to claim
+                           them, e.g. the largest text files first.
+        :param on_done: Called once with each file pair that another job has
+                        tagged, e.g. to count it towards the progress. A
+                        file pair claimed by another job is only found to be
+                        done when waiting for it.
+        :param wait: Rather than stopping, look at the file pairs claimed by
+                     other jobs again, every quarter of the `lease_time`,
+                     until they are done, claiming those whose claims
+                     expire, e.g. of a job that died, thus only stops when
+                     all of the file pairs are done.
+        :returns: Yields the file pairs claimed by this job.
+        '''
+        pending: List[FilePair] = []
+        for file_pair in file_pairs:
+            if self.claim(file_pair):
+                yield file_pair
+                # Its claim was lost while tagging it.
+                if not self.is_done(file_pair):
+                    pending.append(file_pair)
+            elif self.is_done(file_pair):
+                if on_done is not None:
+                    on_done(file_pair)
+            else:
+                pending.append(file_pair)
+        while pending and wait:
+            claimed: Optional[FilePair] = None
+            still_pending: List[FilePair] = []
+            for file_pair in pending:
+                if claimed is None and self.claim(file_pair):
+                    claimed = file_pair
+                elif self.is_done(file_pair):
+                    if on_done is not None:
+                        on_done(file_pair)
+                else:
+                    still_pending.append(file_pair)
+            pending = still_pending
+            if claimed is None:
+                if pending:
+                    time.sleep(self.lease_time / 4)
+                continue
+            yield claimed
+            if not self.is_done(claimed):
+                pending.append(claimed)
@@ -0,0 +1,344 @@
+import csv
+import io
+import os
+from pathlib import Path
+import queue
+import threading
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+
+from .backends import Entity
+from .compression import open_compressed
+
+# Size in bytes of the output file buffer, large writes suit the shared
+# network file systems of the HEC.
+OUTPUT_BUFFER_SIZE = 1024 * 1024
+
+class EntityWriter():
+    '''
+    Base class of all writers that store the Named Entities found in each
+    paragraph. Can be used as a context manager.
+    '''
+
+    name = ''
+    # File extension of the output files.
+    suffix = ''
+    # Whether the writer can append to an existing output file, required to
+    # resume from a checkpoint.
+    supports_append = False
+
+    def write(self, paragraph_number: int, entities: List[Entity]) -> None:
+        '''
+        :param paragraph_number: Number of the paragraph the entities are from.
+        :param entities: Named Entities found within the paragraph.
+        '''
+        raise NotImplementedError
+
+    def flush(self) -> int:
+        '''
+        Writes everything that has been buffered to the output file.
+
+        :returns: Size of the output file in bytes.
+        '''
+        raise NotImplementedError
+
+    def close(self) -> None:
+        raise NotImplementedError
+
+    def __enter__(self) -> 'EntityWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+class TSVWriter(EntityWriter):
+    '''
+    Writes each Named Entity as a row of a TSV file with the following
+    structure:
+    {paragraph_number}\t{entity text}\t{entity label}\t{start character offset}\t{end character offset}
+    '''
+
+    name = 'tsv'
+    suffix = '.tsv'
+    supports_append = True
+
+    def __init__(self, output_fp: Path, append: bool = False) -> None:
+        '''
+        :param output_fp: File path to output the Named Entities too.
+        :param append: Whether to append to the output file rather than
+                       overwrite it, used when resuming from a checkpoint.
+        '''
+        self.output_fp = output_fp
+        self._output_file = output_fp.open('a' if append else 'w+', newline='',
+                                           buffering=OUTPUT_BUFFER_SIZE)
+        self._tsv_writer = csv.writer(self._output_file, delimiter='\t')
+
+    def write(self, paragraph_number: int, entities: List[Entity]) -> None:
+        self._tsv_writer.writerows([paragraph_number, entity.text, entity.label,
+                                    entity.start_char, entity.end_char]
+                                   for entity in entities)
+
+    def flush(self) -> int:
+        self._output_file.flush()
+        os.fsync(self._output_file.fileno())
+        return os.fstat(self._output_file.fileno()).st_size
+
+    def close(self) -> None:
+        self._output_file.close()
+
+class CompressedTSVWriter(TSVWriter):
+    '''
+    Writes the same TSV file as `TSVWriter` compressed as it is written, see
+    `hec_tagging.compression.open_compressed`, a subclass for each
+    compression sets `compression`. A compressed file cannot be appended
+    too, thus it cannot be used when resuming from a checkpoint.
+    '''
+
+    supports_append = False
+    # Compression of the output file, one of the keys in
+    # `hec_tagging.compression.COMPRESSIONS`.
+    compression = ''
+
+    def __init__(self, output_fp: Path, append: bool = False) -> None:
+        '''
+        :param output_fp: File path to output the Named Entities too.
+        :param append: Has to be False, compressed files are not appended
+                       too.
+        :raises ValueError: If `append` is True.
+        '''
+        if append:
+            raise ValueError(f'Cannot append to the compressed file: {output_fp}')
+        self.output_fp = output_fp
+        self._output_file = io.TextIOWrapper(open_compressed(output_fp, self.compression,
+                                                             OUTPUT_BUFFER_SIZE),
+                                             encoding='utf-8', newline='')
+        self._tsv_writer = csv.writer(self._output_file, delimiter='\t')
+
+class GzipTSVWriter(CompressedTSVWriter):
+    '''
+    Writes a gzip compressed TSV file, see `CompressedTSVWriter`.
+    '''
+
+    name = 'tsv.gz'
+    suffix = '.tsv.gz'
+    compression = 'gzip'
+
+class Bz2TSVWriter(CompressedTSVWriter):
+    '''
+    Writes a bz2 compressed TSV file, see `CompressedTSVWriter`.
+    '''
+
+    name = 'tsv.bz2'
+    suffix = '.tsv.bz2'
+    compression = 'bz2'
+
+class XzTSVWriter(CompressedTSVWriter):
+    '''
+    Writes an xz compressed TSV file, see `CompressedTSVWriter`.
+    '''
+
+    name = 'tsv.xz'
+    suffix = '.tsv.xz'
+    compression = 'xz'
+
+class ZstdTSVWriter(CompressedTSVWriter):
+    '''
+    Writes a zstd compressed TSV file, see `CompressedTSVWriter`, requires
+    `zstandard`.
+    '''
+
+    name = 'tsv.zst'
+    suffix = '.tsv.zst'
+    compression = 'zstd'
+
+class ParquetWriter(EntityWriter):
+    '''
+    Writes the Named Entities to a Parquet file, requires `pyarrow`, with the
+    same columns as the TSV file of `TSVWriter`: `paragraph_number`, `text`,
+    `label`, `start_char`, and `end_char`. The labels are dictionary encoded
+    and the paragraph number and character offsets are integers, thus the
+    file is smaller than the TSV file and loads without parsing text, e.g.
+    `pandas.read_parquet`.
+
+    The Named Entities are buffered and written as a row group every
+    `row_group_paragraphs` paragraphs. A Parquet file cannot be appended
+    too, thus it cannot be used when resuming from a checkpoint.
+    '''
+
+    name = 'parquet'
+    suffix = '.parquet'
+
+    def __init__(self, output_fp: Path, append: bool = False,
+                 row_group_paragraphs: int = 10000,
+                 compression: str = 'snappy') -> None:
+        '''
+        :param output_fp: File path to output the Named Entities too.
+        :param append: Has to be False, Parquet files cannot be appended too.
+        :param row_group_paragraphs: Number of paragraphs in each row group.
+        :param compression: Parquet compression codec of the columns.
+        :raises ValueError: If `append` is True.
+        '''
+        if append:
+            raise ValueError(f'Cannot append to the Parquet file: {output_fp}')
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._pa = pa
+        self.output_fp = output_fp
+        self.row_group_paragraphs = row_group_paragraphs
+        self.schema = pa.schema([('paragraph_number', pa.int64()),
+                                 ('text', pa.string()),
+                                 ('label', pa.dictionary(pa.int32(), pa.string())),
+                                 ('start_char', pa.int64()),
+                                 ('end_char', pa.int64())])
+        self._parquet_writer = pq.ParquetWriter(str(output_fp), self.schema,
+                                                compression=compression)
+        self._number_paragraphs = 0
+        self._columns: Dict[str, List[Any]] = {field: [] for field in self.schema.names}
+
+    def write(self, paragraph_number: int, entities: List[Entity]) -> None:
+        for entity in entities:
+            self._columns['paragraph_number'].append(paragraph_number)
+            self._columns['text'].append(entity.text)
+            self._columns['label'].append(entity.label)
+            self._columns['start_char'].append(entity.start_char)
+            self._columns['end_char'].append(entity.end_char)
+        self._number_paragraphs += 1
+        if self._number_paragraphs >= self.row_group_paragraphs:
+            self._write_row_group()
+
+    def _write_row_group(self) -> None:
+        self._number_paragraphs = 0
+        if not self._columns['paragraph_number']:
+            return
+        pa = self._pa
+        arrays = [pa.array(self._columns['paragraph_number'], pa.int64()),
+                  pa.array(self._columns['text'], pa.string()),
+                  pa.array(self._columns['label'], pa.string()).dictionary_encode(),
+                  pa.array(self._columns['start_char'], pa.int64()),
+                  pa.array(self._columns['end_char'], pa.int64())]
+        self._parquet_writer.write_table(pa.Table.from_arrays(arrays,
+                                                              schema=self.schema))
+        self._columns = {field: [] for field in self.schema.names}
+
+    def flush(self) -> int:
+        self._write_row_group()
+        return self.output_fp.stat().st_size
+
+    def close(self) -> None:
+        self._write_row_group()
+        self._parquet_writer.close()
+
+WRITERS: Dict[str, Type[EntityWriter]] = {TSVWriter.name: TSVWriter,
+                                          GzipTSVWriter.name: GzipTSVWriter,
+                                          Bz2TSVWriter.name: Bz2TSVWriter,
+                                          XzTSVWriter.name: XzTSVWriter,
+                                          ZstdTSVWriter.name: ZstdTSVWriter,
+                                          ParquetWriter.name: ParquetWriter}
+
+def create_writer(name: str, output_fp: Path, **kwargs: Any) -> EntityWriter:
+    '''
+    :param name: Name of the output format, one of the keys in `WRITERS`.
+    :param output_fp: File path to output the Named Entities too.
+    :param kwargs: Keyword arguments given to the writer's constructor.
+    :returns: The writer.
+    :raises ValueError: If the output format is not known.
+    '''
+    if name not in WRITERS:
+        raise ValueError(f'Unknown output format: {name}, the known output '
+                         f'formats are: {sorted(WRITERS)}')
+    return WRITERS[name](output_fp, **kwargs)
+
+class BackgroundWriter(EntityWriter):
+    '''
+    Writes the Named Entities through another writer on a background thread,
+    thus tagging does not wait for the entities to be formatted and written
+    to the file system. The entities are sent to the thread in chunks of
+    paragraphs through a bounded queue, if the thread falls behind by more
+    than `max_chunks` chunks writing waits for it.
+
+    An error in the background thread is raised by the next call to `write`,
+    `flush`, or `close`.
+    '''
+
+    def __init__(self, writer: EntityWriter, chunk_size: int = 1000,
+                 max_chunks: int = 8) -> None:
+        '''
+        :param writer: The writer that writes the entities, it is only used
+                       by the background thread until this writer is closed.
+        :param chunk_size: Number of paragraphs sent to the thread at a time.
+        :param max_chunks: Maximum number of chunks waiting to be written.
+        '''
+        self.writer = writer
+        self.chunk_size = chunk_size
+        self._chunk: List[Tuple[int, List[Entity]]] = []
+        self._queue: 'queue.Queue[Optional[List[Tuple[int, List[Entity]]]]]' = \
+            queue.Queue(max_chunks)
+        self._error: Optional[BaseException] = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._write_chunks, daemon=True)
+        self._thread.start()
+
+    def _write_chunks(self) -> None:
+        while True:
+            chunk = self._queue.get()
+            try:
+                if chunk is None:
+                    return
+                if self._error is None:
+                    for paragraph_number, entities in chunk:
+                        self.writer.write(paragraph_number, entities)
+            except BaseException as error:
+                self._error = error
+            finally:
+                self._queue.task_done()
+
+    def _raise_error(self) -> None:
+        if self._error is not None:
+            raise self._error
+
+    def _send_chunk(self) -> None:
+        if self._chunk:
+            self._queue.put(self._chunk)
+            self._chunk = []
+
+    def write(self, paragraph_number: int, entities: List[Entity]) -> None:
+        self._raise_error()
+        self._chunk.append((paragraph_number, entities))
+        if len(self._chunk) >= self.chunk_size:
+            self._send_chunk()
+
+    def discard(self) -> None:
+        '''
+        Drops the entities that have not been written yet, e.g. as another
+        job has taken over the output file.
+        '''
+        self._chunk = []
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                return
+            self._queue.task_done()
+
+    def flush(self) -> int:
+        '''
+        Waits for the background thread to write everything, then flushes the
+        other writer.
+        '''
+        self._send_chunk()
+        self._queue.join()
+        self._raise_error()
+        return self.writer.flush()
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._send_chunk()
+            self._queue.put(None)
+            self._thread.join()
+            self._raise_error()
+        finally:
+            self.writer.close()
@@ -0,0 +1,23 @@
+from setuptools import setup, find_packages
+
+with open('README.md', 'r', encoding='utf-8') as readme_file:
+    long_description = readme_file.read()
+
+setup(name='hec_tagging',
+      version='0.1.0',
+      description=('Shared paragraph reader, NER tagging backends, and entity '
+                   'writers used by the HEC tagging examples.'),
+      long_description=long_description,
+      long_description_content_type='text/markdown',
+      url='https://github.com/UCREL/HEC',
+      license='Apache License 2.0',
+      packages=find_packages(),
+      python_requires='>=3.7',
+      install_requires=[],
+      extras_require={
+          'spacy': ['spacy>=2.3.5'],
+          'stanza': ['stanza>=1.1.1',
+                     'stanza-batch @ git+https://github.com/apmoore1/stanza-batch.git@main'],
+          'gpu': ['pynvml'],
+          'parquet': ['pyarrow>=1.0.0']
+      })